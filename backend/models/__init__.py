@@ -1,5 +1,5 @@
 # backend/models/__init__.py
-from sqlalchemy import String, Integer, ForeignKey, UniqueConstraint, Float, BigInteger, DateTime, Boolean, Index
+from sqlalchemy import String, Integer, ForeignKey, UniqueConstraint, Float, BigInteger, DateTime, Boolean, Index, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from ..db import Base
 from datetime import datetime, timezone
@@ -45,6 +45,10 @@ class Player(Base):
     price: Mapped[int | None] = mapped_column(Integer)
     price_updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
+    __table_args__ = (
+        Index("idx_players_price", "price", "id"),      # /pricing show keyset pages
+    )
+
 
 class Team(Base):
     __tablename__ = "teams"
@@ -70,8 +74,8 @@ class TeamPlayer(Base):
     team: Mapped["Team"] = relationship(back_populates="players")
     player: Mapped["Player"] = relationship()
 
-    effective_from_week: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
-    effective_to_week: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), index=True)
+    effective_from_week: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    effective_to_week: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
     team: Mapped["Team"] = relationship(back_populates="players")
     player: Mapped["Player"] = relationship()
@@ -82,7 +86,10 @@ class TeamPlayer(Base):
             "team_id", "player_id",
             unique=True,
             sqlite_where=(effective_to_week.is_(None)),
-        ),)
+        ),
+        # a team's intervals (roster cache, roster/transfer queries) without touching the table
+        Index("idx_team_players_team_weeks", "team_id", "effective_from_week", "effective_to_week", "player_id"),
+    )
 
 class ScoringConfig(Base):
     __tablename__ = "scoring_config"
@@ -169,6 +176,14 @@ class WeeklyPoints(Base):
 
     weekly_score = mapped_column(Float, default=0.0)
 
+    __table_args__ = (
+        # leaderboard refresh: one guild's week already in (score desc, user_id) rank order, covering
+        Index("idx_weekly_points_rank", "week_start", "guild_id", weekly_score.desc(), "user_id",
+              "computed_at", "sample_size"),
+        # one user's weeks (team card, history, optimizer projections)
+        Index("idx_weekly_points_user", "user_id", "guild_id", "week_start", "weekly_score"),
+    )
+
 
 class Match(Base):
     __tablename__ = "matches"
@@ -250,7 +265,8 @@ class PlayerGame(Base):
     __table_args__ = (
         UniqueConstraint("steam_id", "match_id", name="uq_playergame_steam_match"),
         Index("idx_playergames_user_week", "user_id", "finished_at"),
-        Index("idx_playergames_steam_week", "steam_id", "finished_at"),
+        # latest games for a steam id, covering for the last-100 rating average
+        Index("idx_playergames_steam_recent", "steam_id", "finished_at", "leetify_rating"),
     )
 
 
@@ -267,4 +283,144 @@ class TeamWeekState(Base):
 
     __table_args__ = (
     UniqueConstraint("guild_id", "team_id", "week_start"),
-    )
\ No newline at end of file
+    )
+
+
+class LeetifyProfileCache(Base):
+    """
+    Persisted copy of the in-memory Leetify profile cache (see services/profile_cache.py).
+    status is the HTTP status we got back, 404s are stored so we don't keep asking for missing profiles.
+    """
+    __tablename__ = "leetify_profile_cache"
+    steam_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    status: Mapped[int] = mapped_column(Integer)
+    payload: Mapped[str | None] = mapped_column(Text, nullable=True)  # raw profile JSON (200 only)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class GuildPlayerPrice(Base):
+    """Price of a player within one guild's pool (percentiles ranked only against that guild's players)."""
+    __tablename__ = "guild_player_prices"
+    guild_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    player_id: Mapped[int] = mapped_column(ForeignKey("players.id"), primary_key=True)
+
+    skill_score: Mapped[float | None] = mapped_column(Float)
+    percentile: Mapped[float | None] = mapped_column(Float)
+    price: Mapped[int | None] = mapped_column(Integer)
+    price_updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("idx_guild_player_prices_price", "guild_id", "price", "player_id"),
+    )
+
+
+class TeamWeekRoster(Base):
+    """
+    Immutable snapshot of every team's roster at a week's lock (see services/week_lock.py).
+    Written once per week, read with plain equality joins instead of effective_from/to overlaps.
+    """
+    __tablename__ = "team_week_roster"
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id"), primary_key=True)
+    week_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    player_id: Mapped[int] = mapped_column(ForeignKey("players.id"), primary_key=True)
+
+    guild_id: Mapped[int] = mapped_column(BigInteger)
+    role: Mapped[str | None] = mapped_column(String(16))
+    price_at_lock: Mapped[int | None] = mapped_column(Integer)
+
+    __table_args__ = (
+        # week first so the all-guild refresh / lock can range-read a week too
+        Index("idx_team_week_roster_week_guild", "week_start", "guild_id", "team_id", "player_id"),
+    )
+
+
+class WeekLock(Base):
+    """One row per week that has been snapshotted into team_week_roster."""
+    __tablename__ = "week_locks"
+    week_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    locked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class PlayerLeaderboard(Base):
+    """
+    Ranked weekly player scores per guild, rewritten after every scoring run (services/leaderboard.py).
+    /leaderboard player reads the first N ranks instead of ranking weekly_points itself.
+    prev_rank / prev_score are the rank and score before the last refresh that changed either.
+    """
+    __tablename__ = "player_leaderboard"
+    guild_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    week_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+
+    rank: Mapped[int] = mapped_column(Integer)
+    discord_id: Mapped[int] = mapped_column(BigInteger)
+    score: Mapped[float] = mapped_column(Float)
+    games: Mapped[int] = mapped_column(Integer, default=0)
+    prev_rank: Mapped[int | None] = mapped_column(Integer)
+    prev_score: Mapped[float | None] = mapped_column(Float)
+    refreshed_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("idx_player_leaderboard_week_rank", "week_start", "guild_id", "rank"),
+    )
+
+
+class GlobalLeaderboard(Base):
+    """
+    Ranked weekly player scores across every guild, one row per discord account (its most recently
+    computed weekly_points row), rewritten with the per-guild leaderboards. prev_* as above.
+    """
+    __tablename__ = "global_leaderboard"
+    week_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    discord_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+
+    rank: Mapped[int] = mapped_column(Integer)
+    score: Mapped[float] = mapped_column(Float)
+    games: Mapped[int] = mapped_column(Integer, default=0)
+    prev_rank: Mapped[int | None] = mapped_column(Integer)
+    prev_score: Mapped[float | None] = mapped_column(Float)
+    refreshed_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("idx_global_leaderboard_week_rank", "week_start", "rank"),
+    )
+
+
+class TeamLeaderboard(Base):
+    """Ranked weekly team totals per guild, rewritten after scoring runs and the weekly lock (prev_* as above)."""
+    __tablename__ = "team_leaderboard"
+    guild_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    week_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id"), primary_key=True)
+
+    rank: Mapped[int] = mapped_column(Integer)
+    team_name: Mapped[str] = mapped_column(String(64))
+    owner_discord_id: Mapped[int | None] = mapped_column(BigInteger)
+    points: Mapped[float] = mapped_column(Float, default=0.0)
+    prev_rank: Mapped[int | None] = mapped_column(Integer)
+    prev_points: Mapped[float | None] = mapped_column(Float)
+    refreshed_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("idx_team_leaderboard_week_rank", "week_start", "guild_id", "rank"),
+    )
+
+
+class WeekCache(Base):
+    """
+    Rendered leaderboard rows for a closed week (see services/week_cache.py), one JSON blob per
+    (kind, guild, week). version is a hash of the payload, so a rescored week gets a new one.
+    """
+    __tablename__ = "week_cache"
+    kind: Mapped[str] = mapped_column(String(16), primary_key=True)
+    guild_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    week_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+    version: Mapped[str] = mapped_column(String(16))
+    payload: Mapped[str] = mapped_column(Text)
+    built_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("idx_week_cache_week", "week_start", "guild_id"),     # invalidate_week
+    )
@@ -0,0 +1,42 @@
+# backend/services/db_retry.py
+"""
+Retry a whole write transaction when SQLite says "database is locked".
+
+SQLite allows one writer at a time. When two commands land together (e.g. everyone making
+transfers just before the Monday deadline) the loser gets SQLITE_BUSY once busy_timeout runs out.
+Re-running the transaction from the start in a fresh session is always safe: nothing was committed
+and every read is done again.
+"""
+import asyncio
+import os
+import random
+
+from sqlalchemy.exc import OperationalError
+
+from backend.db import SessionLocal
+
+DB_LOCK_RETRIES = int(os.getenv("DB_LOCK_RETRIES", "5"))
+DB_LOCK_BACKOFF = float(os.getenv("DB_LOCK_BACKOFF_SECONDS", "0.05"))
+
+
+def is_lock_error(exc: BaseException) -> bool:
+    return isinstance(exc, OperationalError) and "database is locked" in str(exc).lower()
+
+
+async def run_write(work, *, attempts: int = DB_LOCK_RETRIES, backoff: float = DB_LOCK_BACKOFF):
+    """
+    await work(session) inside `async with SessionLocal() as s, s.begin()` and return its result.
+    Lock errors are retried with jittered exponential backoff; anything else (including
+    market.MarketConflict) propagates straight away after the rollback.
+    """
+    for attempt in range(attempts):
+        try:
+            async with SessionLocal() as session:
+                async with session.begin():
+                    return await work(session)
+        except OperationalError as e:
+            if not is_lock_error(e) or attempt == attempts - 1:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            print(f"[db_retry] database is locked, retry {attempt + 1}/{attempts - 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,198 @@
+# backend/services/history.py
+"""
+Per-week roster + points history for a team.
+
+Locked weeks read the roster from the team_week_roster snapshot, the same rows the team
+leaderboard is ranked on, so /team history and /leaderboard teams agree. Weeks that aren't locked
+yet load the team's TeamPlayer intervals once (roster cache) and sweep the weeks in order keeping
+the active set up to date, instead of running the interval overlap query once per week. The
+WeeklyPoints of every player on any of those rosters come in one query for the whole span.
+
+points_series() is the same idea for users: the weekly points line of many users in one query,
+kept per (guild, user) until a newer computed_at shows up, for the /player graph and compare charts.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, and_, cast, BigInteger, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Team, Player, User, WeeklyPoints, WeekLock, TeamWeekRoster
+from backend.services.roster_cache import team_intervals
+
+RULESET_ID = 1
+SERIES_CACHE_SIZE = 1024        # (guild, user) points lines kept in memory
+
+# (guild_id, user_id) -> (latest computed_at, [(week_start, weekly_score), ...] oldest first)
+_series: "OrderedDict[tuple[int, int], tuple[datetime, list[tuple[datetime, float]]]]" = OrderedDict()
+
+
+@dataclass
+class WeekHistory:
+    week_start: datetime                              # UTC-naive week key (same as WeeklyPoints.week_start)
+    player_ids: list[int] = field(default_factory=list)
+    points: dict[int, float] = field(default_factory=dict)   # player_id -> weekly_score (only players with a score)
+
+    @property
+    def total(self) -> float:
+        return sum(self.points.values())
+
+
+def week_keys(n: int, *, until: datetime | None = None, tz: str = "Europe/London") -> list[datetime]:
+    """
+    The last n week keys (oldest first) up to and including the week containing `until` (default now).
+    Keys are local Monday 00:00 converted to UTC-naive, so they follow DST like week_bounds_naive_utc.
+    """
+    zone = ZoneInfo(tz)
+    if until is None:
+        until = datetime.now(timezone.utc)
+    elif until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)     # UTC-naive like the rest of the week keys
+    now_local = until.astimezone(zone)
+    monday = now_local.date() - timedelta(days=now_local.weekday())
+    keys = []
+    for k in range(n - 1, -1, -1):
+        d: date = monday - timedelta(weeks=k)
+        local = datetime.combine(d, time(0), tzinfo=zone)
+        keys.append(local.astimezone(timezone.utc).replace(tzinfo=None))
+    return keys
+
+
+def sweep_rosters(intervals, weeks: list[datetime]) -> list[list[int]]:
+    """
+    Roster at each week (sorted ascending) in one pass over the intervals:
+    a player is active at week w when from <= w and (to is None or to > w).
+    """
+    starts = sorted((frm, pid, i) for i, (pid, frm, _to) in enumerate(intervals) if frm is not None)
+    ends = sorted((to, i) for i, (_pid, _frm, to) in enumerate(intervals) if to is not None)
+    active: dict[int, int] = {}            # interval index -> player_id
+    si = ei = 0
+    out = []
+    for w in weeks:
+        while si < len(starts) and starts[si][0] <= w:
+            _, pid, i = starts[si]
+            active[i] = pid
+            si += 1
+        while ei < len(ends) and ends[ei][0] <= w:
+            active.pop(ends[ei][1], None)
+            ei += 1
+        out.append(sorted(set(active.values())))
+    return out
+
+
+async def team_history(session: AsyncSession, team_id: int, weeks: list[datetime]) -> list[WeekHistory]:
+    """
+    Roster and points for each of `weeks` (any order in, oldest first out): the snapshot for
+    locked weeks, the intervals for the rest. Four queries at most.
+    """
+    weeks = sorted(weeks)
+    if not weeks:
+        return []
+
+    guild_id = await session.scalar(select(Team.guild_id).where(Team.id == team_id))
+
+    # locked weeks (a locked week can have no rows for this team, hence the outer join)
+    locked: dict[datetime, list[int]] = {}
+    for week_start, pid in (await session.execute(
+        select(WeekLock.week_start, TeamWeekRoster.player_id)
+        .outerjoin(TeamWeekRoster, and_(TeamWeekRoster.team_id == team_id,
+                                        TeamWeekRoster.week_start == WeekLock.week_start))
+        .where(WeekLock.week_start.in_(weeks))
+    )).all():
+        roster = locked.setdefault(week_start, [])
+        if pid is not None:
+            roster.append(pid)
+
+    open_weeks = [w for w in weeks if w not in locked]
+    swept = {}
+    if open_weeks:
+        intervals = await team_intervals(session, team_id)
+        swept = dict(zip(open_weeks, sweep_rosters(intervals, open_weeks)))
+    rosters = [sorted(locked[w]) if w in locked else swept[w] for w in weeks]
+
+    player_ids = sorted({pid for roster in rosters for pid in roster})
+    scores: dict[tuple[int, datetime], float] = {}
+    if player_ids:
+        rows = await session.execute(
+            select(Player.id, WeeklyPoints.week_start, WeeklyPoints.weekly_score)
+            .join(User, and_(User.discord_id == cast(Player.handle, BigInteger), User.discord_guild_id == guild_id))
+            .join(WeeklyPoints, and_(WeeklyPoints.user_id == User.id, WeeklyPoints.guild_id == guild_id))
+            .where(
+                Player.id.in_(player_ids),
+                WeeklyPoints.week_start >= weeks[0],
+                WeeklyPoints.week_start <= weeks[-1],
+                WeeklyPoints.ruleset_id == RULESET_ID,
+                WeeklyPoints.weekly_score.isnot(None),
+            )
+        )
+        for pid, week_start, score in rows.all():
+            scores[(pid, week_start)] = float(score)
+
+    history = []
+    for w, roster in zip(weeks, rosters):
+        entry = WeekHistory(week_start=w, player_ids=roster)
+        for pid in roster:
+            if (pid, w) in scores:
+                entry.points[pid] = scores[(pid, w)]
+        history.append(entry)
+    return history
+
+
+async def points_series(session: AsyncSession, guild_id: int,
+                        user_ids: list[int]) -> dict[int, tuple[datetime, list[tuple[datetime, float]]]]:
+    """
+    {user_id: (latest computed_at, [(week_start, score), ...] oldest first)} for users with any score,
+    using each week's latest row. One query for the versions; lines that changed since they were
+    cached are loaded together in one more.
+    """
+    if not user_ids:
+        return {}
+    scored = and_(
+        WeeklyPoints.guild_id == guild_id,
+        WeeklyPoints.user_id.in_(user_ids),
+        WeeklyPoints.weekly_score.isnot(None),
+        WeeklyPoints.computed_at.isnot(None),
+    )
+    versions = dict((await session.execute(
+        select(WeeklyPoints.user_id, func.max(WeeklyPoints.computed_at)).where(scored).group_by(WeeklyPoints.user_id)
+    )).all())
+
+    out = {}
+    stale = []
+    for uid, version in versions.items():
+        hit = _series.get((guild_id, uid))
+        if hit is not None and hit[0] == version:
+            _series.move_to_end((guild_id, uid))
+            out[uid] = hit
+        else:
+            stale.append(uid)
+
+    if stale:
+        latest = (
+            select(WeeklyPoints.user_id, WeeklyPoints.week_start,
+                   func.max(WeeklyPoints.computed_at).label("latest_ts"))
+            .where(scored, WeeklyPoints.user_id.in_(stale))
+            .group_by(WeeklyPoints.user_id, WeeklyPoints.week_start)
+        ).subquery()
+        rows = await session.execute(
+            select(WeeklyPoints.user_id, WeeklyPoints.week_start, WeeklyPoints.weekly_score)
+            .join(latest, and_(
+                WeeklyPoints.user_id == latest.c.user_id,
+                WeeklyPoints.week_start == latest.c.week_start,
+                WeeklyPoints.computed_at == latest.c.latest_ts,
+            ))
+            .where(WeeklyPoints.guild_id == guild_id)
+        )
+        lines: dict[int, list[tuple[datetime, float]]] = {}
+        for uid, week_start, score in rows.all():
+            lines.setdefault(uid, []).append((week_start, float(score)))
+        for uid in stale:
+            entry = (versions[uid], sorted(lines.get(uid, [])))
+            _series[(guild_id, uid)] = entry
+            _series.move_to_end((guild_id, uid))
+            out[uid] = entry
+        while len(_series) > SERIES_CACHE_SIZE:
+            _series.popitem(last=False)
+    return out
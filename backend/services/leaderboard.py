@@ -1,14 +1,17 @@
 from __future__ import annotations
 from datetime import datetime, timezone, timedelta
 
-from typing import Optional
-from sqlalchemy import select, func, or_, and_, desc, literal_column, cast, BigInteger
+from typing import Optional, NamedTuple
+from sqlalchemy import select, func, or_, and_, desc, literal_column, cast, BigInteger, delete, insert, case, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models import Team, TeamPlayer, WeeklyPoints, User, Player
-from backend.services.leetify_api import week_start_london,  current_week_start_norm
-from bot.cogs.stats_refresh import week_bounds_naive_utc
+from backend.models import Team, TeamPlayer, WeeklyPoints, User, Player, TeamWeekRoster, PlayerLeaderboard, \
+    TeamLeaderboard, GlobalLeaderboard
+from backend.services.leetify_api import week_start_london,  current_week_start_norm, week_bounds_naive_utc
+from backend.services.week_lock import lock_week
+from backend.services.week_cache import cached_week, invalidate_week
 
 def resolve_weeks(at_time: Optional[datetime] = None,
                   week_norm: Optional[datetime] = None) -> tuple[datetime, datetime]:
@@ -46,129 +49,333 @@ def week_key_naive_utc(week_local):
     return (week_local.astimezone(timezone.utc)
                      .replace(minute=0, second=0, microsecond=0, tzinfo=None))
 
-async def get_team_leaderboard(
-    session: AsyncSession,
-    guild_id: int,
-    at_time: Optional[datetime] = None,
-    week_start_norm: Optional[datetime] = None,  # optional override (UTC-naive)
-    limit: int = 25,
-    offset: int = 0,
-):
-    print(f'at_time? {at_time}')
-    print('Provided week_start_norm:', week_start_norm)
-    # Using new week start function for dates
-    week_start_utc_naive, week_end_utc_naive = week_bounds_naive_utc("Europe/London")
-
-    # Make the week anchors exactly like /team show
-    # These ARE ONLY used for visuals, they DO NOT affect results
-    week_local, _ = resolve_weeks(at_time, week_start_norm)
-    week_norm_key = (week_start_norm.replace(minute=0, second=0, microsecond=0)
-                     if week_start_norm is not None
-                     else week_key_naive_utc(week_local))
-    print(f'Week Norm: {week_norm_key}')
-
-    U = aliased(User)
-
-    # Active roster for the selected week: carry team metadata + player's Discord ID
-    active_tp = (
+# Materialised leaderboards
+#
+# Scoring runs (/stats update_all, /scoring update_stats) and the weekly lock job rewrite the ranked
+# player_leaderboard / team_leaderboard / global_leaderboard rows for a week in bulk, so the
+# leaderboard commands are a range read on (week_start, [guild_id,] rank) instead of ranking
+# weekly_points on every call.
+#
+# The new ranking is upserted over the previous one rather than replacing it: a primary-key conflict
+# is the same entry as last time, so its old rank and score move into prev_* in the same statement
+# (only when one of them changed, so a no-op refresh doesn't wipe the movement). Entries that are no
+# longer ranked are the rows this refresh didn't stamp, and get deleted.
+
+async def _merge_ranks(session: AsyncSession, model, keys: list[str], columns: list[str], score: str,
+                       ranked, scope: list, stamp: datetime) -> int:
+    """Upsert `ranked` (keys + columns + stamp, in that order) over the previous snapshot in `scope`."""
+    stmt = sqlite_insert(model).from_select(keys + columns + ["refreshed_at"], ranked)
+    old, new = model.__table__.c, stmt.excluded
+    moved = or_(new.rank != old.rank, new[score] != old[score])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            "prev_rank": case((moved, old.rank), else_=old.prev_rank),
+            f"prev_{score}": case((moved, old[score]), else_=old[f"prev_{score}"]),
+            **{c: new[c] for c in columns + ["refreshed_at"]},
+        },
+    )
+    res = await session.execute(stmt)
+    await session.execute(delete(model).where(*scope, or_(model.refreshed_at.is_(None), model.refreshed_at != stamp)))
+    return res.rowcount or 0
+
+
+async def refresh_player_leaderboard(session: AsyncSession, week_start: datetime,
+                                     guild_ids: Optional[list[int]] = None) -> int:
+    """Re-rank the players for week_start (every guild, or just guild_ids). Returns rows written."""
+    scope = [PlayerLeaderboard.week_start == week_start]
+    if guild_ids is not None:
+        scope.append(PlayerLeaderboard.guild_id.in_(guild_ids))
+    await invalidate_week(session, week_start, guild_ids)
+    stamp = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    ranked = (
         select(
-            Team.id.label("team_id"),
-            Team.name.label("team_name"),
-            Team.owner_id.label("owner_id"),
-            cast(Player.handle, BigInteger).label("discord_id"),  # handle is the Discord ID string
+            WeeklyPoints.guild_id,
+            WeeklyPoints.week_start,
+            WeeklyPoints.user_id,
+            func.row_number().over(
+                partition_by=WeeklyPoints.guild_id,
+                order_by=(WeeklyPoints.weekly_score.desc(), WeeklyPoints.user_id.asc()),
+            ),
+            User.discord_id,
+            WeeklyPoints.weekly_score,
+            func.coalesce(WeeklyPoints.sample_size, 0),
+            literal(stamp),
         )
-        .join(TeamPlayer, TeamPlayer.team_id == Team.id)
-        .join(Player, Player.id == TeamPlayer.player_id)
+        .join(User, User.id == WeeklyPoints.user_id)
         .where(
-            Team.guild_id == guild_id,
-            TeamPlayer.effective_from_week < week_end_utc_naive,
-            or_(
-                TeamPlayer.effective_to_week.is_(None),
-                TeamPlayer.effective_to_week > week_start_utc_naive,
-            ),
+            WeeklyPoints.week_start == week_start,
+            WeeklyPoints.weekly_score.isnot(None),
+            WeeklyPoints.computed_at.isnot(None),
         )
-        .cte("active_tp")
     )
+    if guild_ids is not None:
+        ranked = ranked.where(WeeklyPoints.guild_id.in_(guild_ids))
+
+    return await _merge_ranks(session, PlayerLeaderboard, ["guild_id", "week_start", "user_id"],
+                              ["rank", "discord_id", "score", "games"], "score", ranked, scope, stamp)
+
 
-    # Totals per team (exact same week key equality as /team show)
-    totals_q = (
+async def refresh_global_leaderboard(session: AsyncSession, week_start: datetime) -> int:
+    """
+    Re-rank every discord account for week_start across all guilds. An account registered in several
+    guilds counts once, with its most recently computed score. Ties go to the lower discord id, like
+    the per-guild boards. Returns rows written.
+    """
+    stamp = datetime.now(timezone.utc).replace(tzinfo=None)
+    latest = (
         select(
-            active_tp.c.team_id,
-            active_tp.c.team_name,
-            active_tp.c.owner_id,
-            func.coalesce(func.sum(WeeklyPoints.weekly_score), 0).label("points"),
+            User.discord_id,
+            WeeklyPoints.weekly_score.label("score"),
+            func.coalesce(WeeklyPoints.sample_size, 0).label("games"),
+            func.row_number().over(
+                partition_by=User.discord_id,
+                order_by=WeeklyPoints.computed_at.desc(),
+            ).label("rn"),
         )
-        .join(U, and_(
-            U.discord_id == active_tp.c.discord_id,
-            U.discord_guild_id == guild_id,
-        ))
-        .join(
-            WeeklyPoints,
-            and_(
-                WeeklyPoints.user_id == U.id,
-                WeeklyPoints.guild_id == guild_id,
-                WeeklyPoints.week_start == week_start_utc_naive,
-            ),
-            isouter=True,
+        .join(User, User.id == WeeklyPoints.user_id)
+        .where(
+            WeeklyPoints.week_start == week_start,
+            WeeklyPoints.weekly_score.isnot(None),
+            WeeklyPoints.computed_at.isnot(None),
         )
-        .group_by(active_tp.c.team_id, active_tp.c.team_name, active_tp.c.owner_id)
-        .order_by(desc(literal_column("points")), active_tp.c.team_name.asc())
-        .limit(limit)
-        .offset(offset)
+        .subquery()
     )
-    totals = (await session.execute(totals_q)).all()
-    if not totals:
-        return []
+    ranked = (
+        select(
+            literal(week_start),
+            latest.c.discord_id,
+            func.row_number().over(order_by=(latest.c.score.desc(), latest.c.discord_id.asc())),
+            latest.c.score,
+            latest.c.games,
+            literal(stamp),
+        )
+        .where(latest.c.rn == 1)
+    )
+    return await _merge_ranks(session, GlobalLeaderboard, ["week_start", "discord_id"],
+                              ["rank", "score", "games"], "score", ranked,
+                              [GlobalLeaderboard.week_start == week_start], stamp)
+
+
+async def refresh_team_leaderboard(session: AsyncSession, week_start: datetime,
+                                   guild_ids: Optional[list[int]] = None) -> int:
+    """
+    Re-rank the teams for week_start from the locked roster snapshot, locking the week first if
+    the Monday job hasn't. Returns rows written.
+    """
+    if week_start > week_bounds_naive_utc("Europe/London")[0]:
+        return 0        # future week, nothing to rank yet
+    await lock_week(session, week_start)
 
-    team_ids = [r.team_id for r in totals]
+    scope = [TeamLeaderboard.week_start == week_start]
+    if guild_ids is not None:
+        scope.append(TeamLeaderboard.guild_id.in_(guild_ids))
+    await invalidate_week(session, week_start, guild_ids)
+    stamp = datetime.now(timezone.utc).replace(tzinfo=None)
 
-    # Per-team breakdown (optional, matches the mapping above)
-    breakdown_q = (
+    owner = aliased(User)
+    member = aliased(User)
+    points = func.coalesce(func.sum(WeeklyPoints.weekly_score), 0)
+    ranked = (
         select(
-            active_tp.c.team_id,
-            U.id.label("user_id"),
-            func.coalesce(WeeklyPoints.weekly_score, 0).label("points"),
-        )
-        .select_from(active_tp)
-        .join(U, and_(
-            U.discord_id == active_tp.c.discord_id,
-            U.discord_guild_id == guild_id,
-        ))
-        .join(
-            WeeklyPoints,
-            and_(
-                WeeklyPoints.user_id == U.id,
-                WeeklyPoints.guild_id == guild_id,
-                WeeklyPoints.week_start == week_start_utc_naive,
+            TeamWeekRoster.guild_id,
+            TeamWeekRoster.week_start,
+            Team.id,
+            func.row_number().over(
+                partition_by=TeamWeekRoster.guild_id,
+                order_by=(points.desc(), Team.name.asc()),
             ),
-            isouter=True,
+            Team.name,
+            owner.discord_id,
+            points,
+            literal(stamp),
         )
-        .where(active_tp.c.team_id.in_(team_ids))
+        .select_from(TeamWeekRoster)
+        .join(Team, Team.id == TeamWeekRoster.team_id)
+        .join(owner, owner.id == Team.owner_id)
+        .join(Player, Player.id == TeamWeekRoster.player_id)
+        .join(member, and_(member.discord_id == cast(Player.handle, BigInteger),
+                           member.discord_guild_id == TeamWeekRoster.guild_id))
+        .outerjoin(WeeklyPoints, and_(
+            WeeklyPoints.user_id == member.id,
+            WeeklyPoints.guild_id == TeamWeekRoster.guild_id,
+            WeeklyPoints.week_start == TeamWeekRoster.week_start,
+        ))
+        .where(TeamWeekRoster.week_start == week_start)
+        .group_by(TeamWeekRoster.guild_id, TeamWeekRoster.week_start, Team.id, Team.name, owner.discord_id)
+    )
+    if guild_ids is not None:
+        ranked = ranked.where(TeamWeekRoster.guild_id.in_(guild_ids))
+
+    return await _merge_ranks(session, TeamLeaderboard, ["guild_id", "week_start", "team_id"],
+                              ["rank", "team_name", "owner_discord_id", "points"], "points", ranked, scope, stamp)
+
+
+async def refresh_leaderboards(session: AsyncSession, week_start: datetime,
+                               guild_ids: Optional[list[int]] = None) -> tuple[int, int]:
+    """
+    Call after writing WeeklyPoints for week_start. Returns (player rows, team rows).
+    The cross-guild ranking is always redone, any guild's scores can move it.
+    """
+    players = await refresh_player_leaderboard(session, week_start, guild_ids)
+    teams = await refresh_team_leaderboard(session, week_start, guild_ids)
+    accounts = await refresh_global_leaderboard(session, week_start)
+    print(f"[leaderboard] refreshed {week_start}: {players} player rows, {teams} team rows, "
+          f"{accounts} global rows")
+    return players, teams
+
+
+async def read_player_leaderboard(session: AsyncSession, guild_id: int, week_start: datetime,
+                                  limit: Optional[int] = 10, after_rank: int = 0) -> list[PlayerLeaderboard]:
+    """
+    `limit` players (None = all) ranked after `after_rank` (keyset: rank is the row's place in (score desc, user_id)
+    order, so any page is one index range read). Empty until a scoring run has ranked the week.
+    """
+    stmt = (
+        select(PlayerLeaderboard)
+        .where(PlayerLeaderboard.guild_id == guild_id, PlayerLeaderboard.week_start == week_start,
+               PlayerLeaderboard.rank > after_rank)
+        .order_by(PlayerLeaderboard.rank.asc())
+        .limit(limit)
+    )
+    return list((await session.scalars(stmt)).all())
+
+
+async def read_team_leaderboard(session: AsyncSession, guild_id: int, week_start: datetime,
+                                limit: Optional[int] = 10, after_rank: int = 0) -> list[TeamLeaderboard]:
+    """`limit` teams (None = all) ranked after `after_rank` (keyset on rank). Empty until the week is ranked."""
+    stmt = (
+        select(TeamLeaderboard)
+        .where(TeamLeaderboard.guild_id == guild_id, TeamLeaderboard.week_start == week_start,
+               TeamLeaderboard.rank > after_rank)
+        .order_by(TeamLeaderboard.rank.asc())
+        .limit(limit)
+    )
+    return list((await session.scalars(stmt)).all())
+
+
+async def read_global_leaderboard(session: AsyncSession, week_start: datetime,
+                                  limit: Optional[int] = 10, after_rank: int = 0) -> list[GlobalLeaderboard]:
+    """`limit` accounts ranked after `after_rank` across every guild (keyset on rank). Empty until the week is ranked."""
+    stmt = (
+        select(GlobalLeaderboard)
+        .where(GlobalLeaderboard.week_start == week_start, GlobalLeaderboard.rank > after_rank)
+        .order_by(GlobalLeaderboard.rank.asc())
+        .limit(limit)
     )
-    b_rows = (await session.execute(breakdown_q)).all()
-    players_by_team: dict[int, list[tuple[int, float]]] = {}
-    for team_id, user_id, pts in b_rows:
-        players_by_team.setdefault(team_id, []).append((user_id, float(pts or 0)))
-
-    # Owners (for mentions)
-    owner_map = dict(
-        (await session.execute(
-            select(Team.id, User.discord_id)
-            .join(User, User.id == Team.owner_id)
-            .where(Team.id.in_(team_ids))
-        )).all()
+    return list((await session.scalars(stmt)).all())
+
+
+async def read_team_page(session: AsyncSession, guild_id: int, week_start: datetime,
+                         limit: Optional[int] = 10, after_rank: int = 0, top: int = 0) -> list[TeamRow]:
+    """
+    Same page as read_team_leaderboard with each team's best `top` players, in one query: the page of
+    ranked teams joined to their roster's points numbered per team (row_number), cut at `top`.
+    """
+    page = (
+        select(TeamLeaderboard.rank, TeamLeaderboard.team_id, TeamLeaderboard.team_name,
+               TeamLeaderboard.owner_discord_id, TeamLeaderboard.points, TeamLeaderboard.prev_rank)
+        .where(TeamLeaderboard.guild_id == guild_id, TeamLeaderboard.week_start == week_start,
+               TeamLeaderboard.rank > after_rank)
+        .order_by(TeamLeaderboard.rank.asc())
+        .limit(limit)
+        .cte("page")
     )
+    if top > 0:
+        pts = func.coalesce(WeeklyPoints.weekly_score, 0)
+        contrib = (
+            select(
+                TeamWeekRoster.team_id,
+                User.discord_id,
+                pts.label("points"),
+                func.row_number().over(
+                    partition_by=TeamWeekRoster.team_id, order_by=(pts.desc(), User.discord_id.asc())
+                ).label("pos"),
+            )
+            .join(Player, Player.id == TeamWeekRoster.player_id)
+            .join(User, and_(User.discord_id == cast(Player.handle, BigInteger), User.discord_guild_id == guild_id))
+            .outerjoin(WeeklyPoints, and_(
+                WeeklyPoints.user_id == User.id,
+                WeeklyPoints.guild_id == guild_id,
+                WeeklyPoints.week_start == week_start,
+            ))
+            .where(TeamWeekRoster.team_id.in_(select(page.c.team_id)),     # only this page's teams
+                   TeamWeekRoster.week_start == week_start)
+            .subquery("contrib")
+        )
+        stmt = (
+            select(page, contrib.c.discord_id, contrib.c.points.label("contrib_points"))
+            .outerjoin(contrib, and_(contrib.c.team_id == page.c.team_id, contrib.c.pos <= top))
+            .order_by(page.c.rank, contrib.c.pos)
+        )
+    else:
+        stmt = select(page).order_by(page.c.rank)
+
+    rows = (await session.execute(stmt)).mappings().all()
+
+    out: list[TeamRow] = []
+    for r in rows:
+        if not out or out[-1].team_id != r["team_id"]:
+            out.append(TeamRow(r["rank"], r["team_id"], r["team_name"], r["owner_discord_id"],
+                               float(r["points"] or 0), [], r["prev_rank"]))
+        if top > 0 and r["discord_id"] is not None:
+            out[-1].top.append((r["discord_id"], float(r["contrib_points"] or 0)))
+    return out
+
+
+# Closed weeks
+#
+# A past week's ranks never change unless it's rescored, so the whole ranked list (with each team's
+# top contributors) is kept in week_cache and pages are slices of it. Ranks run 1..n per guild, so
+# the page after `after_rank` starts at index after_rank.
+
+CACHED_CONTRIBUTORS = 5     # /leaderboard teams shows at most this many per team
+# week_cache kinds; bump the suffix whenever the cached row shape changes so old blobs aren't read
+PLAYERS_KIND = "players.2"
+TEAMS_KIND = "teams.2"
+
+
+class PlayerRow(NamedTuple):
+    rank: int
+    discord_id: int
+    score: float
+    games: int
+    prev_rank: Optional[int] = None
+
+
+class TeamRow(NamedTuple):
+    rank: int
+    team_id: int
+    team_name: str
+    owner_discord_id: Optional[int]
+    points: float
+    top: list           # [(discord_id, points), ...] best CACHED_CONTRIBUTORS players
+    prev_rank: Optional[int] = None
+
+
+def is_closed_week(week_start: datetime) -> bool:
+    return week_start < week_bounds_naive_utc("Europe/London")[0]
+
+
+async def read_closed_player_leaderboard(session: AsyncSession, guild_id: int, week_start: datetime,
+                                         limit: int = 10, after_rank: int = 0) -> list[PlayerRow]:
+    """Same page as read_player_leaderboard, for a week that's over, from the closed-week cache."""
+    async def build():
+        rows = await read_player_leaderboard(session, guild_id, week_start, limit=None)
+        return [[r.rank, r.discord_id, r.score, r.games, r.prev_rank] for r in rows]
+
+    rows = await cached_week(session, PLAYERS_KIND, guild_id, week_start, build)
+    return [PlayerRow(*r) for r in rows[after_rank:after_rank + limit]]
+
+
+async def read_closed_team_leaderboard(session: AsyncSession, guild_id: int, week_start: datetime,
+                                       limit: int = 10, after_rank: int = 0) -> list[TeamRow]:
+    """Same page as read_team_leaderboard plus each team's top contributors, from the closed-week cache."""
+    async def build():
+        rows = await read_team_page(session, guild_id, week_start, limit=None, top=CACHED_CONTRIBUTORS)
+        return [[r.rank, r.team_id, r.team_name, r.owner_discord_id, r.points,
+                 [list(t) for t in r.top], r.prev_rank] for r in rows]
 
-    out = []
-    for r in totals:
-        out.append({
-            "team_id": r.team_id,
-            "team_name": r.team_name,
-            "owner_id": r.owner_id,
-            "owner_discord_id": owner_map.get(r.team_id),
-            "points": float(r.points or 0),
-            "players": sorted(players_by_team.get(r.team_id, []), key=lambda x: -x[1]),
-            "week_start_local": week_start_utc_naive,
-            "week_start_norm": week_norm_key,
-        })
-    return out
\ No newline at end of file
+    rows = await cached_week(session, TEAMS_KIND, guild_id, week_start, build)
+    return [TeamRow(*r) for r in rows[after_rank:after_rank + limit]]
@@ -35,6 +35,23 @@ def current_week_start_norm(now: datetime | None = None) -> datetime:
 def next_week_start_norm(now: datetime | None = None) -> datetime:
     return current_week_start_norm(now) + timedelta(days=7)
 
+def week_bounds_naive_utc(tz_name="Europe/London", now: datetime | None = None):
+    """
+    (this week's key, next week's key) as UTC-naive datetimes, for `now` (default: the current time).
+    Next week's key is an hour before next Monday 00:00 local; queued transfers and resets are
+    written at it, so rosters for this week end strictly before it.
+    """
+    now_local = datetime.now(ZoneInfo(tz_name)) if now is None else now.astimezone(ZoneInfo(tz_name))
+    start_local = (now_local - timedelta(days=now_local.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    end_local = start_local + timedelta(days=7)
+    start_utc = start_local.astimezone(timezone.utc).replace(tzinfo=None)
+    end_utc   = end_local.astimezone(timezone.utc).replace(tzinfo=None)
+    end_utc = end_utc - timedelta(hours=1)
+    return start_utc, end_utc
+
+
 
 
 async def fetch_recent_matches(steam_id: str, limit: int = 100) -> List[Dict[str, Any]]:
@@ -216,14 +233,27 @@ def aggregate_player_stats(matches: List[Dict[str, Any]],
     }
 
 
-async def fetch_profile(steam64_id: str) -> dict | None:
-    """Return the Leetify public profile JSON or None on 404/private."""
+async def fetch_profile_status(steam64_id: str) -> tuple[int | None, dict | None]:
+    """
+    Returns (status_code, profile_json):
+      (200, {...}) -> profile found
+      (404, None)  -> no Leetify profile for this steam id
+      (other/None, None) -> private, rate limited or network error (status None)
+    """
     timeout = httpx.Timeout(10.0, read=10.0)
     async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(LEETIFY_PROFILE_URL, params={"steam64_id": steam64_id}, headers=HEADERS)
-        if r.status_code == 200:
-            return r.json()
-        return None
+        try:
+            r = await client.get(LEETIFY_PROFILE_URL, params={"steam64_id": steam64_id}, headers=HEADERS)
+        except httpx.HTTPError:
+            return None, None
+    if r.status_code == 200:
+        return 200, r.json()
+    return r.status_code, None
+
+async def fetch_profile(steam64_id: str) -> dict | None:
+    """Return the Leetify public profile JSON or None on 404/private."""
+    _, profile = await fetch_profile_status(steam64_id)
+    return profile
 
 def extract_ranks(profile: dict) -> dict:
     """Safely get the ranks"""
@@ -1,15 +1,37 @@
 from __future__ import annotations
+import os
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, date, timedelta
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, func, or_, and_, exists, cast, update, delete, insert, literal, null, true, \
+    except_, union_all, BigInteger, Integer, DateTime, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 
-from backend.models import Team, TeamPlayer, Player, TeamWeekState
-from backend.services.leetify_api import current_week_start_london, next_week_start_london, current_week_start_norm, next_week_start_norm
-from bot.cogs.stats_refresh import week_bounds_naive_utc
+from backend.models import Team, TeamPlayer, Player, TeamWeekState, GuildPlayerPrice, User
+from backend.services.leetify_api import current_week_start_london, next_week_start_london, current_week_start_norm, next_week_start_norm, \
+    week_bounds_naive_utc
+from backend.services.roster_cache import cached_roster_for_week, mark_team_dirty, team_intervals, roster_at
 # config
 INITIAL_BUDGET = 30000
 TRANSFERS_PER_WEEK = 1
+MAX_TEAM_SIZE = 5  # 5 and a sub
+# Which price the market charges: 'global' = one pool across every server (Player.price),
+# 'guild' = each server's own pool (guild_player_prices, falls back to global if not priced yet)
+PRICE_POOL = os.getenv("PRICE_POOL", "global")
+
+
+class MarketConflict(Exception):
+    """
+    A write-time guard failed because another command changed the team first
+    (budget spent, transfer used, roster filled). The transaction should be rolled back.
+    problem uses the same codes as TransferValidation.problem.
+    """
+    def __init__(self, problem: str):
+        super().__init__(problem)
+        self.problem = problem
 
 
 # Helpers
@@ -17,6 +39,22 @@ TRANSFERS_PER_WEEK = 1
 async def get_global_player_price(session: AsyncSession, player_id: int) -> float | None:
     return await session.scalar(select(Player.price).where(Player.id == player_id))
 
+async def get_guild_player_price(session: AsyncSession, guild_id: int, player_id: int) -> float | None:
+    return await session.scalar(
+        select(GuildPlayerPrice.price).where(
+            GuildPlayerPrice.guild_id == guild_id,
+            GuildPlayerPrice.player_id == player_id,
+        )
+    )
+
+async def get_player_price(session: AsyncSession, guild_id: int, player_id: int) -> float | None:
+    """Price the market should charge in this guild, honouring PRICE_POOL."""
+    if PRICE_POOL == "guild":
+        price = await get_guild_player_price(session, guild_id, player_id)
+        if price is not None:
+            return price
+    return await get_global_player_price(session, player_id)
+
 async def get_or_create_team_week_state(
         session: AsyncSession, guild_id: int, team_id: int, week_start: datetime
 ) -> TeamWeekState:
@@ -24,7 +62,9 @@ async def get_or_create_team_week_state(
     print(f'Week start is {week_start}')
     altered = week_start - timedelta(hours=1)
     print(f' Altered week start is {altered}')
-    row = await session.scalar(
+    # INSERT OR IGNORE first so two commands creating the same week can't race on the unique key
+    await ensure_team_week_state(session, guild_id, team_id, week_start)
+    return await session.scalar(
         select(TeamWeekState).where(
             TeamWeekState.guild_id == guild_id,
             TeamWeekState.team_id == team_id,
@@ -32,24 +72,53 @@ async def get_or_create_team_week_state(
         )
     )
 
-    if row is None:
-        last = await session.scalar(
-            select(TeamWeekState).where(
-                TeamWeekState.guild_id == guild_id,
-                TeamWeekState.team_id == team_id
-            ).order_by(TeamWeekState.week_start.desc())
-        )
-        start_budget = last.budget_remaining if last else INITIAL_BUDGET
-        row = TeamWeekState(
-            guild_id=guild_id,
-            team_id=team_id,
-            week_start=week_start,
-            budget_remaining=start_budget,
-            transfers_used=0
-        )
-        session.add(row)
-        await session.flush()
-    return row
+
+async def ensure_team_week_state(session: AsyncSession, guild_id: int, team_id: int, week_start: datetime) -> None:
+    """Create the week's state (budget carried from the latest week) if it doesn't exist, in one statement."""
+    stmt = sqlite_insert(TeamWeekState).from_select(
+        ["guild_id", "team_id", "week_start", "budget_remaining", "transfers_used"],
+        select(
+            literal(guild_id, BigInteger),
+            literal(team_id, Integer),
+            literal(week_start, DateTime),
+            budget_for_week_expr(guild_id, team_id, week_start),
+            literal(0, Integer),
+        ).where(true()),  # SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT
+    ).on_conflict_do_nothing(index_elements=["guild_id", "team_id", "week_start"])
+    await session.execute(stmt)
+
+
+async def adjust_team_week_state(
+        session: AsyncSession, guild_id: int, team_id: int, week_start: datetime, *,
+        budget_delta: float = 0, transfers_delta: int = 0,
+        min_budget: float | None = None, max_transfers: int | None = None,
+) -> bool:
+    """
+    Atomic compare-and-set on a TeamWeekState row (created first if missing):
+    budget += budget_delta, transfers_used += transfers_delta, but only if the result stays
+    >= min_budget / <= max_transfers. The check and the write are one UPDATE, so two commands
+    racing on the same team can't both spend the same budget. Returns False if the guard failed.
+    """
+    await ensure_team_week_state(session, guild_id, team_id, week_start)
+
+    budget = func.coalesce(TeamWeekState.budget_remaining, 0)
+    transfers = func.coalesce(TeamWeekState.transfers_used, 0)
+    conds = [
+        TeamWeekState.guild_id == guild_id,
+        TeamWeekState.team_id == team_id,
+        TeamWeekState.week_start == week_start,
+    ]
+    if min_budget is not None:
+        conds.append(budget + budget_delta >= min_budget)
+    if max_transfers:
+        conds.append(transfers + transfers_delta <= max_transfers)
+
+    res = await session.execute(
+        update(TeamWeekState).where(*conds)
+        .values(budget_remaining=budget + budget_delta, transfers_used=transfers + transfers_delta)
+        .execution_options(synchronize_session="fetch")
+    )
+    return res.rowcount == 1
 
 
 async def roster_count(session: AsyncSession, team_id: int) -> int:
@@ -65,6 +134,380 @@ async def already_on_team(session: AsyncSession, team_id: int, player_id: int) -
     return bool(n)
 
 
+@dataclass
+class TransferValidation:
+    """Everything /team add needs to decide on a buy, read in one query by validate_transfer_in()."""
+    guild_id: int
+    this_week: datetime
+    next_week: datetime
+    owner_id: int | None = None
+    team_id: int | None = None
+    target_user_id: int | None = None
+    target_steam_id: str | None = None
+    player_id: int | None = None
+    price: float | None = None
+    budget_this: float = INITIAL_BUDGET         # this week's state (or what it would be created with)
+    budget_next: float = INITIAL_BUDGET         # next week's state (or what it would be created with)
+    transfers_used: int = 0                     # this week
+    next_roster_size: int = 0
+    in_next_roster: bool = False
+    in_this_roster: bool = False
+    post_first_lock: bool = False               # team already has players active this week
+
+    @property
+    def counts_as_transfer(self) -> bool:
+        # Only after the first lock, and only if the player isn't already playing for us this week
+        return self.post_first_lock and not self.in_this_roster
+
+    @property
+    def problem(self) -> str | None:
+        """First failed check (same order as the old /team add), or None if the buy is allowed."""
+        if self.team_id is None:
+            return "no_team"
+        if self.target_user_id is None or not self.target_steam_id:
+            return "not_registered"
+        if self.price is None:
+            return "no_price"
+        if self.in_next_roster:
+            return "already_queued"
+        if self.next_roster_size >= MAX_TEAM_SIZE:
+            return "team_full"
+        if self.budget_next < self.price:
+            return "budget"
+        if self.counts_as_transfer and TRANSFERS_PER_WEEK and self.transfers_used >= TRANSFERS_PER_WEEK:
+            return "transfer_cap"
+        return None
+
+
+def _owner_team_cte(guild_id: int, owner_discord_id: int):
+    """(owner_id, team_id) of the caller's team in this guild, zero rows if they have none."""
+    owner = aliased(User)
+    return (
+        select(owner.id.label("owner_id"), Team.id.label("team_id"))
+        .join(Team, and_(Team.owner_id == owner.id, Team.guild_id == guild_id))
+        .where(owner.discord_id == owner_discord_id, owner.discord_guild_id == guild_id)
+        .cte("owner_team")
+    )
+
+def _state_value(col, guild_id: int, team_id, week: datetime):
+    return select(col).where(
+        TeamWeekState.guild_id == guild_id,
+        TeamWeekState.team_id == team_id,
+        TeamWeekState.week_start == week,
+    ).scalar_subquery()
+
+def budget_for_week_expr(guild_id: int, team_id, week: datetime):
+    """
+    SQL expression for a team's budget in `week`, without creating the state row:
+    the week's own state, else what get_or_create_team_week_state would start it with.
+    team_id can be a literal or a column to correlate with.
+    """
+    # what get_or_create_team_week_state would start a missing week with
+    carried = (
+        select(TeamWeekState.budget_remaining)
+        .where(TeamWeekState.guild_id == guild_id, TeamWeekState.team_id == team_id)
+        .order_by(TeamWeekState.week_start.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return func.coalesce(_state_value(TeamWeekState.budget_remaining, guild_id, team_id, week), carried, INITIAL_BUDGET)
+
+def _week_state_columns(guild_id: int, team_id, this_week: datetime, next_week: datetime) -> list:
+    """budget_this / budget_next / transfers_used as scalar subqueries, without creating any state rows."""
+    return [
+        budget_for_week_expr(guild_id, team_id, this_week).label("budget_this"),
+        budget_for_week_expr(guild_id, team_id, next_week).label("budget_next"),
+        func.coalesce(_state_value(TeamWeekState.transfers_used, guild_id, team_id, this_week), 0).label("transfers_used"),
+    ]
+
+
+async def ensure_players(session: AsyncSession, guild_id: int, discord_ids: list[int]) -> None:
+    """
+    Player rows for the registered users (steam linked in this guild) among discord_ids that don't
+    have one yet, like ensure_player_for_user but in one INSERT OR IGNORE. A new row has no price
+    until the next /pricing update, which is what prices it.
+    """
+    stmt = sqlite_insert(Player).from_select(
+        ["handle"],
+        select(cast(User.discord_id, String)).distinct().where(
+            User.discord_id.in_(discord_ids),
+            User.discord_guild_id == guild_id,
+            User.steam_id.is_not(None),
+        ),
+    ).on_conflict_do_nothing(index_elements=["handle"])
+    await session.execute(stmt)
+
+
+async def validate_transfer_in(
+        session: AsyncSession, *, guild_id: int, owner_discord_id: int, target_discord_id: int,
+        this_week: datetime, next_week: datetime,
+) -> TransferValidation:
+    """
+    Collect owner, team, target, price, both week states and both rosters in a single SELECT.
+    The only write is the target's Player row if they're registered and don't have one yet
+    (ensure_players); missing week states are reported with the budget they'd start with.
+    """
+    await ensure_players(session, guild_id, [target_discord_id])
+    target = aliased(User)
+    handle = str(target_discord_id)
+
+    owner_team = _owner_team_cte(guild_id, owner_discord_id)
+    team_id = owner_team.c.team_id
+
+    player_id = select(Player.id).where(Player.handle == handle).scalar_subquery()
+    price = select(Player.price).where(Player.handle == handle).scalar_subquery()
+    if PRICE_POOL == "guild":
+        guild_price = (
+            select(GuildPlayerPrice.price)
+            .where(GuildPlayerPrice.guild_id == guild_id, GuildPlayerPrice.player_id == player_id)
+            .scalar_subquery()
+        )
+        price = func.coalesce(guild_price, price)
+
+    def active(week):
+        return and_(
+            TeamPlayer.team_id == team_id,
+            TeamPlayer.effective_from_week <= week,
+            or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > week),
+        )
+
+    stmt = select(
+        owner_team.c.owner_id,
+        team_id,
+        select(target.id).where(target.discord_id == target_discord_id, target.discord_guild_id == guild_id)
+            .scalar_subquery().label("target_user_id"),
+        select(target.steam_id).where(target.discord_id == target_discord_id, target.discord_guild_id == guild_id)
+            .scalar_subquery().label("target_steam_id"),
+        player_id.label("player_id"),
+        price.label("price"),
+        *_week_state_columns(guild_id, team_id, this_week, next_week),
+        select(func.count()).select_from(TeamPlayer).where(active(next_week))
+            .scalar_subquery().label("next_roster_size"),
+        exists().where(active(next_week), TeamPlayer.player_id == player_id).label("in_next_roster"),
+        exists().where(active(this_week), TeamPlayer.player_id == player_id).label("in_this_roster"),
+        exists().where(active(this_week)).label("post_first_lock"),
+    )
+
+    v = TransferValidation(guild_id=guild_id, this_week=this_week, next_week=next_week)
+    row = (await session.execute(stmt)).mappings().first()
+    if row is None:
+        return v  # no owner / no team in this guild
+
+    for key, value in row.items():
+        if value is not None:
+            setattr(v, key, bool(value) if key in ("in_next_roster", "in_this_roster", "post_first_lock") else value)
+    return v
+
+
+async def apply_transfer_in(session: AsyncSession, v: TransferValidation, *, role: str | None = None) -> tuple[float, int]:
+    """
+    Write side of a validated buy: queue the player for next week, charge next week's budget
+    and count the transfer on this week's state. Returns (budget_remaining_next, transfers_used_this).
+    """
+    # This week's state first, so a new one carries the budget from before this buy
+    await ensure_team_week_state(session, v.guild_id, v.team_id, v.this_week)
+
+    # Every check is repeated inside the write itself, validate_transfer_in's read may be stale by now
+    active_next = and_(
+        TeamPlayer.team_id == v.team_id,
+        TeamPlayer.effective_from_week <= v.next_week,
+        or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > v.next_week),
+    )
+    res = await session.execute(
+        insert(TeamPlayer).from_select(
+            ["team_id", "player_id", "role", "effective_from_week", "effective_to_week"],
+            select(
+                literal(v.team_id, Integer), literal(v.player_id, Integer), literal(role, String),
+                literal(v.next_week, DateTime), null(),
+            ).where(
+                select(func.count()).select_from(TeamPlayer).where(active_next).scalar_subquery() < MAX_TEAM_SIZE,
+                ~exists().where(active_next, TeamPlayer.player_id == v.player_id),
+            )
+        )
+    )
+    if res.rowcount != 1:
+        queued = v.player_id in await roster_for_week(session, v.team_id, v.next_week)
+        raise MarketConflict("already_queued" if queued else "team_full")
+    mark_team_dirty(session, v.team_id)
+
+    # Budget applies to next-week's state (FPL-style)
+    if not await adjust_team_week_state(session, v.guild_id, v.team_id, v.next_week,
+                                        budget_delta=-v.price, min_budget=0):
+        raise MarketConflict("budget")
+
+    transfers_used = v.transfers_used
+    if v.counts_as_transfer:
+        if not await adjust_team_week_state(session, v.guild_id, v.team_id, v.this_week,
+                                            transfers_delta=1, max_transfers=TRANSFERS_PER_WEEK):
+            raise MarketConflict("transfer_cap")
+        transfers_used += 1
+
+    await session.flush()
+    budget_after = await session.scalar(
+        select(TeamWeekState.budget_remaining).where(
+            TeamWeekState.guild_id == v.guild_id,
+            TeamWeekState.team_id == v.team_id,
+            TeamWeekState.week_start == v.next_week,
+        )
+    )
+    return budget_after, transfers_used
+
+
+@dataclass
+class TransferBatch:
+    """Result of apply_transfers(). problem is None when the batch was applied."""
+    guild_id: int
+    this_week: datetime
+    next_week: datetime
+    sells: list[int]                            # discord ids
+    buys: list[int]                             # discord ids
+    team_id: int | None = None
+    prices: dict[int, float] = field(default_factory=dict)     # discord id -> price
+    budget_before: float = INITIAL_BUDGET       # next week's budget before the batch
+    budget_after: float = INITIAL_BUDGET
+    transfers_used: int = 0                     # this week, after the batch
+    problem: str | None = None
+    problem_member: int | None = None           # discord id the problem is about, if any
+
+    def reject(self, problem: str, member: int | None = None) -> "TransferBatch":
+        self.problem, self.problem_member = problem, member
+        return self
+
+
+async def apply_transfers(
+        session: AsyncSession, *, guild_id: int, owner_discord_id: int,
+        sells: list[int], buys: list[int], this_week: datetime, next_week: datetime,
+) -> TransferBatch:
+    """
+    Sell and buy several players at once (all queued for next week).
+    Budget, MAX_TEAM_SIZE and TRANSFERS_PER_WEEK are checked once against the *final* roster,
+    so e.g. selling an expensive player can pay for the buys in the same batch.
+    Either every change is written or none is (caller owns the transaction).
+
+    The market's one rule for budget and transfers (/team add and /team remove go through the
+    same): every refund and charge goes to next week's state, and a transfer is counted for each
+    bought player that isn't in this week's roster, once the team has had its first lock. Sells
+    themselves don't count, a sell + buy pair is one transfer.
+    """
+    sells, buys = list(dict.fromkeys(sells)), list(dict.fromkeys(buys))
+    batch = TransferBatch(guild_id=guild_id, this_week=this_week, next_week=next_week, sells=sells, buys=buys)
+    if not sells and not buys:
+        return batch.reject("empty")
+    both = set(sells) & set(buys)
+    if both:
+        return batch.reject("sell_and_buy", next(iter(both)))
+
+    # Read 1: team + both week states
+    owner_team = _owner_team_cte(guild_id, owner_discord_id)
+    row = (await session.execute(
+        select(owner_team.c.team_id, *_week_state_columns(guild_id, owner_team.c.team_id, this_week, next_week))
+    )).mappings().first()
+    if row is None:
+        return batch.reject("no_team")
+    batch.team_id = team_id = row["team_id"]
+    batch.budget_before = row["budget_next"]
+    transfers_before = row["transfers_used"]
+
+    # Read 2: every target's player id, steam link and price (registered buys get a Player row first)
+    if buys:
+        await ensure_players(session, guild_id, buys)
+    price = Player.price
+    if PRICE_POOL == "guild":
+        price = func.coalesce(GuildPlayerPrice.price, Player.price)
+    targets = (await session.execute(
+        select(Player.handle, User.steam_id, Player.id.label("player_id"), price.label("price"))
+        .select_from(Player)
+        .outerjoin(User, and_(cast(Player.handle, BigInteger) == User.discord_id, User.discord_guild_id == guild_id))
+        .outerjoin(GuildPlayerPrice, and_(GuildPlayerPrice.player_id == Player.id, GuildPlayerPrice.guild_id == guild_id))
+        .where(Player.handle.in_([str(d) for d in sells + buys]))
+    )).all()
+    by_handle = {int(t.handle): t for t in targets}
+
+    # Rosters from the interval cache
+    intervals = await team_intervals(session, team_id)
+    this_ids = set(roster_at(intervals, this_week))
+    next_ids = set(roster_at(intervals, next_week))
+
+    sell_pids, buy_pids = [], []
+    for d in sells:
+        t = by_handle.get(d)
+        # only players still on next week's roster can be sold: one already scheduled out
+        # (this week but not next) was refunded when that sell was made
+        if t is None or t.player_id not in next_ids:
+            return batch.reject("not_on_team", d)
+        sell_pids.append(t.player_id)
+        batch.prices[d] = t.price or 0
+    for d in buys:
+        t = by_handle.get(d)
+        if t is None or not t.steam_id:
+            return batch.reject("not_registered", d)
+        if t.price is None:
+            return batch.reject("no_price", d)
+        if t.player_id in next_ids:
+            return batch.reject("already_queued", d)
+        buy_pids.append(t.player_id)
+        batch.prices[d] = t.price
+
+    # Validate the final state once
+    final_next = (next_ids - set(sell_pids)) | set(buy_pids)
+    if len(final_next) > MAX_TEAM_SIZE:
+        return batch.reject("team_full")
+
+    batch.budget_after = batch.budget_before + sum(batch.prices[d] for d in sells) - sum(batch.prices[d] for d in buys)
+    if batch.budget_after < 0:
+        return batch.reject("budget")
+
+    post_first_lock = bool(this_ids)
+    new_transfers = len(set(buy_pids) - this_ids) if post_first_lock else 0
+    batch.transfers_used = transfers_before + new_transfers
+    if new_transfers and TRANSFERS_PER_WEEK and batch.transfers_used > TRANSFERS_PER_WEEK:
+        return batch.reject("transfer_cap")
+
+    # Write: sells (cancel queued buys, close active intervals), buys, then both week states
+    await ensure_team_week_state(session, guild_id, team_id, this_week)
+    if sell_pids:
+        await session.execute(
+            delete(TeamPlayer).where(
+                TeamPlayer.team_id == team_id,
+                TeamPlayer.player_id.in_(sell_pids),
+                TeamPlayer.effective_from_week == next_week,
+                TeamPlayer.effective_to_week.is_(None),
+            )
+        )
+        await session.execute(
+            update(TeamPlayer).where(
+                TeamPlayer.team_id == team_id,
+                TeamPlayer.player_id.in_(sell_pids),
+                TeamPlayer.effective_from_week < next_week,
+                or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > next_week),
+            ).values(effective_to_week=next_week)
+        )
+    if buy_pids:
+        try:
+            await session.execute(insert(TeamPlayer), [
+                {"team_id": team_id, "player_id": pid, "effective_from_week": next_week, "effective_to_week": None}
+                for pid in buy_pids
+            ])
+        except IntegrityError:
+            # someone queued one of these players between our read and this write
+            raise MarketConflict("already_queued")
+
+    mark_team_dirty(session, team_id)
+
+    # Re-check the final state under the write lock, the reads above may be stale
+    if len(await roster_for_week(session, team_id, next_week)) > MAX_TEAM_SIZE:
+        raise MarketConflict("team_full")
+    delta = batch.budget_after - batch.budget_before
+    if not await adjust_team_week_state(session, guild_id, team_id, next_week, budget_delta=delta, min_budget=0):
+        raise MarketConflict("budget")
+    if not await adjust_team_week_state(session, guild_id, team_id, this_week, transfers_delta=new_transfers,
+                                        max_transfers=TRANSFERS_PER_WEEK if new_transfers else None):
+        raise MarketConflict("transfer_cap")
+
+    await session.flush()
+    return batch
+
+
 async def buy_player(session, team_id: int, player_id: int, now: datetime):
     next_week = next_week_start_norm(now)
     exists_next = await session.scalar(
@@ -84,6 +527,7 @@ async def buy_player(session, team_id: int, player_id: int, now: datetime):
         effective_to_week=None,
     ))
     await session.flush()
+    mark_team_dirty(session, team_id)
 
 
 async def sell_player(session, team_id: int, player_id: int, now: datetime) -> str | None:
@@ -109,6 +553,7 @@ async def sell_player(session, team_id: int, player_id: int, now: datetime) -> s
     if queued:
         await session.delete(queued)
         await session.flush()
+        mark_team_dirty(session, team_id)
         return "cancel_queued_buy"
 
     # OR active interval that spans next week -> close interval at next_week
@@ -124,39 +569,75 @@ async def sell_player(session, team_id: int, player_id: int, now: datetime) -> s
     if active:
         active.effective_to_week = next_week
         await session.flush()
+        mark_team_dirty(session, team_id)
         return "scheduled_removal"
 
     # No interval to cancel or close
     return None
 
 async def roster_for_week(session, team_id: int, week_start: datetime) -> list[int]:
-    rows = await session.scalars(
-        select(TeamPlayer.player_id).where(
-            TeamPlayer.team_id == team_id,
-            TeamPlayer.effective_from_week <= week_start,
-            or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > week_start),
+    """Player ids active at week_start (from <= week < to), served from the roster cache."""
+    return await cached_roster_for_week(session, team_id, week_start)
+
+
+@dataclass
+class TransferDiffRow:
+    kind: str               # "buy" (in next week, not this week) or "sell" (this week, not next week)
+    team_id: int
+    team_name: str
+    player_id: int
+    handle: str
+    price: float | None
+
+
+async def transfer_diff(
+        session: AsyncSession, *, guild_id: int, this_week: datetime, next_week: datetime,
+        team_id: int | None = None,
+) -> list[TransferDiffRow]:
+    """
+    Buys and sells between this week's and next week's rosters for one team (team_id)
+    or every team in the guild, as one query: (next EXCEPT this) UNION ALL (this EXCEPT next).
+    """
+    def roster(week):
+        q = (
+            select(TeamPlayer.team_id, TeamPlayer.player_id)
+            .join(Team, Team.id == TeamPlayer.team_id)
+            .where(
+                Team.guild_id == guild_id,
+                TeamPlayer.effective_from_week <= week,
+                or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > week),
+            )
         )
-    )
-    return list(rows)
+        return q.where(TeamPlayer.team_id == team_id) if team_id is not None else q
 
+    buys = except_(roster(next_week), roster(this_week)).subquery("buys")
+    sells = except_(roster(this_week), roster(next_week)).subquery("sells")
+    diff = union_all(
+        select(literal("buy").label("kind"), buys.c.team_id, buys.c.player_id),
+        select(literal("sell").label("kind"), sells.c.team_id, sells.c.player_id),
+    ).subquery("diff")
 
-async def transfer_count_for_next_week(session, team_id: int, now: datetime) -> int:
+    price = Player.price
+    if PRICE_POOL == "guild":
+        price = func.coalesce(GuildPlayerPrice.price, Player.price)
+    rows = (await session.execute(
+        select(diff.c.kind, diff.c.team_id, Team.name, diff.c.player_id, Player.handle, price)
+        .join(Team, Team.id == diff.c.team_id)
+        .join(Player, Player.id == diff.c.player_id)
+        .outerjoin(GuildPlayerPrice, and_(GuildPlayerPrice.player_id == Player.id, GuildPlayerPrice.guild_id == guild_id))
+        .order_by(Team.name.asc(), diff.c.kind.asc(), Player.handle.asc())
+    )).all()
+    return [TransferDiffRow(*r) for r in rows]
 
-    this_week, next_week = week_bounds_naive_utc
-    current_ids = set(await roster_for_week(session, team_id, this_week))
-    next_ids    = set(await roster_for_week(session, team_id, next_week))
-    buys  = len(next_ids - current_ids)
-    sells = len(current_ids - next_ids)
-    return buys + sells
+
+async def transfer_count_for_next_week(session, team_id: int, now: datetime | None = None) -> int:
+    """Buys + sells queued between the roster of the week containing `now` (default: current time) and the next."""
+    this_week, next_week = week_bounds_naive_utc("Europe/London", now=now)
+    guild_id = await session.scalar(select(Team.guild_id).where(Team.id == team_id))
+    rows = await transfer_diff(session, guild_id=guild_id, team_id=team_id, this_week=this_week, next_week=next_week)
+    return len(rows)
 
 
 async def team_has_active_this_week(session, team_id: int, this_week: datetime) -> bool:
     """True if any rows are active for this_week => post-first-lock."""
-    n = await session.scalar(
-        select(func.count()).select_from(TeamPlayer).where(
-            TeamPlayer.team_id == team_id,
-            TeamPlayer.effective_from_week <= this_week,
-            or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > this_week),
-        )
-    )
-    return (n or 0) > 0
+    return len(await cached_roster_for_week(session, team_id, this_week)) > 0
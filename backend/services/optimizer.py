@@ -0,0 +1,283 @@
+# backend/services/optimizer.py
+"""
+Best affordable roster / best transfers for a team.
+
+The problem is a knapsack with a cardinality limit: pick at most MAX_TEAM_SIZE players, total price
+within budget, maximising projected points, changing at most `max_changes` players after the first
+lock. Two steps keep it fast on a 10k-player pool:
+
+  1. k-dominance pruning. A player is dropped if at least k other (non-rostered) players are
+     both no more expensive and no worse. Any roster using them could swap in one of those k
+     instead, so they're never needed. What survives is a few dozen players, not thousands.
+  2. Branch and bound over the survivors. The bound is Lagrangian: price is folded into the
+     objective as points - lam * price (lam picked once at the root), so a branch is cut when
+     points so far + lam * money left + the best remaining reduced values can't beat the best
+     roster found. That still works when price and points rise together and nothing is dominated.
+"""
+import bisect
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, and_, cast, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Player, User, WeeklyPoints, GuildPlayerPrice
+from backend.services.market import (
+    MAX_TEAM_SIZE, TRANSFERS_PER_WEEK, PRICE_POOL, roster_for_week, _week_state_columns,
+)
+
+RECENT_WEEKS = 4        # "recent" projection = average weekly score over this many weeks
+RULESET_ID = 1
+MAX_STEPS = 100_000     # search budget; past it the best roster found so far is returned (optimal=False)
+
+
+@dataclass(frozen=True)
+class Candidate:
+    player_id: int
+    handle: str
+    price: int
+    points: float           # projected points
+
+
+@dataclass
+class Solution:
+    player_ids: list[int] = field(default_factory=list)
+    cost: int = 0
+    points: float = 0.0
+    optimal: bool = True        # False if the search hit MAX_STEPS before proving it
+
+
+def k_skyline(cands: list[Candidate], k: int) -> list[Candidate]:
+    """Drop every candidate that k others beat or match on both price and points."""
+    if k <= 0:
+        return []
+    # cheapest first; at equal price the better one first so it counts as a dominator
+    ordered = sorted(cands, key=lambda c: (c.price, -c.points))
+    best: list[float] = []      # min-heap of the k best points seen at <= this price
+    kept = []
+    for c in ordered:
+        if len(best) < k or best[0] < c.points:
+            kept.append(c)
+        if len(best) < k:
+            heapq.heappush(best, c.points)
+        elif c.points > best[0]:
+            heapq.heapreplace(best, c.points)
+    return kept
+
+
+def _reduced(c: Candidate, lam: float) -> float:
+    return c.points - lam * c.price
+
+
+def _best_multiplier(pool: list[Candidate], budget: float, size: int, iters: int = 40) -> float:
+    """
+    Price multiplier lam >= 0 minimising the Lagrangian bound
+        lam * budget + sum of the `size` largest (points - lam * price), positives only
+    which is convex in lam, so a ternary search finds it. Any lam gives a valid bound, this one the tightest.
+    """
+    def bound(lam: float) -> float:
+        top = heapq.nlargest(size, (_reduced(c, lam) for c in pool))
+        return lam * budget + sum(r for r in top if r > 0)
+
+    hi = max((c.points / c.price for c in pool if c.price > 0 and c.points > 0), default=0.0)
+    lo = 0.0
+    for _ in range(iters):
+        a, b = lo + (hi - lo) / 3, hi - (hi - lo) / 3
+        if bound(a) <= bound(b):
+            hi = b
+        else:
+            lo = a
+    return lo
+
+
+class _OutOfSteps(Exception):
+    pass
+
+
+def _greedy(pool: list[Candidate], *, budget: float, size: int, current: frozenset[int],
+            max_changes: int | None) -> Solution:
+    """Take players in pool order while they fit; a starting point so the search can cut early."""
+    sol = Solution()
+    money, changes = budget, max_changes
+    for c in pool:
+        if len(sol.player_ids) == size:
+            break
+        is_change = c.player_id not in current
+        if c.price > money or (is_change and changes == 0):
+            continue
+        sol.player_ids.append(c.player_id)
+        sol.cost += c.price
+        sol.points += c.points
+        money -= c.price
+        if is_change and changes is not None:
+            changes -= 1
+    return sol
+
+
+def solve(cands: list[Candidate], *, budget: float, size: int = MAX_TEAM_SIZE,
+          current: frozenset[int] = frozenset(), max_changes: int | None = None,
+          max_steps: int = MAX_STEPS) -> Solution:
+    """
+    Max total points with <= size players, total price <= budget and at most max_changes players
+    that aren't in `current` (None = unlimited). Current players are never pruned.
+    Exact unless the pool is so flat (points almost a straight line in price) that the search runs
+    past max_steps, then it's the best roster found and optimal=False.
+    """
+    k = size if max_changes is None else min(size, max_changes)
+    keep = [c for c in cands if c.player_id in current]
+    others = [c for c in cands if c.player_id not in current and c.points > 0]
+    pool = [c for c in keep + k_skyline(others, k) if c.points > 0]
+
+    # Order by reduced value so "the next `slots` players" are the best the bound can use.
+    # bound = points so far + lam * money left + best `slots` reduced values still available
+    lam = _best_multiplier(pool, budget, size)
+    pool.sort(key=lambda c: -_reduced(c, lam))
+    red = [max(0.0, _reduced(c, lam)) for c in pool]
+
+    n = len(pool)
+    kept_at = [j for j, c in enumerate(pool) if c.player_id in current]   # once the changes run out
+    best = _greedy(pool, budget=budget, size=size, current=current, max_changes=max_changes)
+    chosen: list[Candidate] = []
+    steps = 0
+
+    def dfs(i: int, slots: int, changes_left: int | None, money: float, pts: float):
+        nonlocal best, steps
+        if pts > best.points:
+            best = Solution([c.player_id for c in chosen], sum(c.price for c in chosen), pts)
+        if slots == 0 or i >= n:
+            return
+        order = range(i, n) if changes_left != 0 else kept_at[bisect.bisect_left(kept_at, i):]
+        for j in order:
+            steps += 1
+            if steps > max_steps:
+                raise _OutOfSteps
+            if pts + lam * money + sum(red[j:j + slots]) <= best.points:
+                break
+            c = pool[j]
+            is_change = c.player_id not in current
+            if c.price > money or (is_change and changes_left == 0):
+                continue
+            chosen.append(c)
+            dfs(j + 1, slots - 1,
+                None if changes_left is None else changes_left - (1 if is_change else 0),
+                money - c.price, pts + c.points)
+            chosen.pop()
+
+    try:
+        dfs(0, size, max_changes, budget, 0.0)
+    except _OutOfSteps:
+        best.optimal = False
+    return best
+
+
+async def load_candidates(session: AsyncSession, guild_id: int | None, *, source: str = "recent",
+                          since: datetime | None = None) -> list[Candidate]:
+    """
+    Every priced player who can be bought (registered with a steam id, in this guild unless
+    guild_id is None) with a projected-points figure:
+      recent: average weekly_score since `since` (default the last RECENT_WEEKS weeks)
+      l100:   Player.leetify_l100_avg, shifted so the weakest candidate is 0 (ratings go negative,
+              and a below-average player still beats an empty slot)
+    """
+    price = Player.price
+    if guild_id is not None and PRICE_POOL == "guild":
+        price = func.coalesce(GuildPlayerPrice.price, Player.price)
+
+    user_join = and_(User.discord_id == cast(Player.handle, BigInteger), User.steam_id.isnot(None))
+    if guild_id is not None:
+        user_join = and_(user_join, User.discord_guild_id == guild_id)
+
+    if source == "l100":
+        stmt = (
+            select(Player.id, Player.handle, price.label("price"), Player.leetify_l100_avg.label("points"))
+            .join(User, user_join)
+        )
+    else:
+        since = since or (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(weeks=RECENT_WEEKS))
+        wp_join = and_(
+            WeeklyPoints.user_id == User.id,
+            WeeklyPoints.week_start >= since,
+            WeeklyPoints.ruleset_id == RULESET_ID,
+        )
+        if guild_id is not None:
+            wp_join = and_(wp_join, WeeklyPoints.guild_id == guild_id)
+        stmt = (
+            select(Player.id, Player.handle, price.label("price"),
+                   func.avg(WeeklyPoints.weekly_score).label("points"))
+            .join(User, user_join)
+            .outerjoin(WeeklyPoints, wp_join)
+            .group_by(Player.id, Player.handle, price)
+        )
+
+    if guild_id is not None and PRICE_POOL == "guild":
+        stmt = stmt.outerjoin(GuildPlayerPrice, and_(GuildPlayerPrice.player_id == Player.id,
+                                                     GuildPlayerPrice.guild_id == guild_id))
+    if guild_id is None:
+        stmt = stmt.distinct()
+
+    rows = [r for r in (await session.execute(stmt.where(Player.price.isnot(None)))).all() if r[2] is not None]
+    shift = 0.0
+    if source == "l100":
+        shift = -min((float(pts) for *_, pts in rows if pts is not None), default=0.0)
+    return [Candidate(pid, handle, int(p), float(pts) + shift if pts is not None else 0.0)
+            for pid, handle, p, pts in rows]
+
+
+@dataclass
+class Suggestion:
+    roster: list[Candidate]         # suggested roster for next week
+    buys: list[Candidate]
+    sells: list[Candidate]
+    budget: float                   # next week's budget before any change
+    budget_after: float
+    points_before: float            # projected points of the current next-week roster
+    points_after: float
+    max_changes: int | None         # None = build phase, unlimited
+    optimal: bool = True            # False = best found within the solver's search budget
+
+
+async def suggest_for_team(session: AsyncSession, *, guild_id: int, team_id: int,
+                           this_week: datetime, next_week: datetime, source: str = "recent") -> Suggestion:
+    """
+    Best next-week roster for the team. Before the first lock anything goes (build phase);
+    after it, at most the remaining transfers this week may be brought in.
+    """
+    cands = await load_candidates(session, guild_id, source=source)
+    by_id = {c.player_id: c for c in cands}
+
+    this_ids = set(await roster_for_week(session, team_id, this_week))
+    next_ids = set(await roster_for_week(session, team_id, next_week))
+    state = (await session.execute(
+        select(*_week_state_columns(guild_id, team_id, this_week, next_week))
+    )).mappings().one()
+    budget, transfers_used = float(state["budget_next"]), int(state["transfers_used"])
+
+    # selling refunds the current price, so the money available is budget + next roster's value
+    total = budget + sum(by_id[p].price for p in next_ids if p in by_id)
+
+    if this_ids and TRANSFERS_PER_WEEK:
+        max_changes = max(0, TRANSFERS_PER_WEEK - transfers_used)
+        # this week's players and already-queued buys (already paid for in transfers) are free to keep
+        current = frozenset(this_ids | next_ids)
+    else:
+        max_changes, current = None, frozenset(next_ids)
+
+    sol = solve(cands, budget=total, current=current, max_changes=max_changes)
+    # never suggest something worse than standing pat
+    points_before = sum(by_id[p].points for p in next_ids if p in by_id)
+    if sol.points <= points_before:
+        sol = Solution(sorted(next_ids), 0, points_before, sol.optimal)
+
+    chosen = set(sol.player_ids)
+    return Suggestion(
+        roster=sorted((by_id[p] for p in chosen if p in by_id), key=lambda c: -c.points),
+        buys=[by_id[p] for p in chosen - next_ids if p in by_id],
+        sells=[by_id[p] for p in next_ids - chosen if p in by_id],
+        budget=budget,
+        budget_after=total - sum(by_id[p].price for p in chosen if p in by_id),
+        points_before=points_before,
+        points_after=sol.points,
+        max_changes=max_changes,
+        optimal=sol.optimal,
+    )
@@ -1,13 +1,17 @@
 # backend/services/pricing.py
+import heapq
 from datetime import datetime, timezone
 
-from sqlalchemy import select
+from sqlalchemy import select, delete, insert, update, cast, and_, BigInteger, tuple_
 
 from typing import List, Dict
 
-from backend.models import User, Player
-from backend.services.repo import leetify_l100_avg, upsert_player_ratings_and_l100
-from backend.services.leetify_api import fetch_profile, extract_ranks
+from backend.db import SessionLocal
+from backend.models import User, Player, GuildPlayerPrice
+from backend.services.db_retry import run_write
+from backend.services.repo import leetify_l100_avg_for_steam, upsert_player_ratings_and_l100
+from backend.services.leetify_api import extract_ranks
+from backend.services.profile_cache import get_cached_profile, get_profile_entry, warm_profiles, save_profiles
 
 # Pricing config
 
@@ -15,12 +19,17 @@ P_MIN = 1_000            # floor price
 P_MAX = 11_000           # ceiling price
 GAMMA = 2             # makes top players expensive
 
+GLOBAL_POOL = 0       # pool key for the all-guilds market (Player.price)
+REFRESH_WRITE_BATCH = 50    # steam ids written per transaction by refresh_all_players
+
 # feature weights into a single skill score
 W_LEETIFY = 0.50
 W_FACEIT  = 0.25
 W_PREMIER = 0.20
 W_RENOWN  = 0.05
 
+DEFAULT_WEIGHTS = {"leetify": W_LEETIFY, "faceit": W_FACEIT, "premier": W_PREMIER, "renown": W_RENOWN}
+
 # scaling assumptions (clip to bounds)
 FACEIT_MIN, FACEIT_MAX   = 400, 3800 # Max is gonna be 3.8k elo (for the moment)
 PREMIER_MIN, PREMIER_MAX = 1000, 33000 # prem capped at 33k
@@ -44,41 +53,207 @@ def _norm_leetify(v: float | None) -> float:
     # map [-5, +5] -> [0,1]
     return _norm(v, LEETIFY_MIN, LEETIFY_MAX)
 
-def _price_from_percentile(p: float) -> int:
+def _price_from_percentile(p: float, gamma: float = GAMMA) -> int:
     p = _clip(p, 0.0, 1.0)
     # top-heavy curve
-    return int(round(P_MIN + (P_MAX - P_MIN) * (p ** GAMMA)))
+    return int(round(P_MIN + (P_MAX - P_MIN) * (p ** gamma)))
+
+
+async def _ratings_for_steam(session, steam_id: str) -> dict:
+    """Ranks (from the shared profile cache) + l100 average for one Steam account."""
+    profile = await get_cached_profile(steam_id, session=session)
+    ranks = extract_ranks(profile) if profile else {
+        "renown_elo": None, "premier_elo": None, "faceit_elo": None
+    }
+    l100 = await leetify_l100_avg_for_steam(session, steam_id)
+    return {**ranks, "leetify_l100_avg": l100}
 
 
 async def refresh_one_player(session, discord_id: str) -> dict:
     print(f' Discord ID being used: {discord_id}')
-    u = await session.scalar(select(User).where(User.discord_id == str(discord_id)))
+    # A discord id can have a User row per guild, pick one that actually has a steam linked
+    u = await session.scalar(
+        select(User)
+        .where(User.discord_id == str(discord_id), User.steam_id.is_not(None))
+        .order_by(User.id.asc())
+        .limit(1)
+    )
     if not u:
         print(f' Failed for Discord ID: {discord_id}')
         return {"discord_id": discord_id, "ok": False, "reason": "no_user"}
 
     print(f' Steam ID being used: {u.steam_id}')
-    profile = await fetch_profile(u.steam_id)
-    ranks = extract_ranks(profile) if profile else {
-        "renown_elo": None, "premier_elo": None, "faceit_elo": None
-    }
-    print(ranks)
-
-    l100 = await leetify_l100_avg(session, u.id)
-
-    print(l100)
+    r = await _ratings_for_steam(session, u.steam_id)
+    print(r)
 
     ok = await upsert_player_ratings_and_l100(
         session, str(discord_id),
-        renown_elo=ranks["renown_elo"],
-        premier_elo=ranks["premier_elo"],
-        faceit_elo=ranks["faceit_elo"],
-        l100=l100
+        renown_elo=r["renown_elo"],
+        premier_elo=r["premier_elo"],
+        faceit_elo=r["faceit_elo"],
+        l100=r["leetify_l100_avg"]
+    )
+    return {"discord_id": discord_id, "ok": ok, **r}
+
+
+async def refresh_all_players() -> List[Dict]:
+    """
+    Refresh ratings for every Player, fetching each Steam account exactly once.
+
+    Resolves the distinct steam ids behind all Player rows in one query (a player can have
+    several per-guild User rows), fetches each profile once and writes the result back to every
+    Player row that maps to that steam id. Works in three phases so no write lock is held across
+    the network: a read-only session for the player map, cached profiles and l100s; the Leetify
+    fetches with no session at all; then the writes in short transactions of REFRESH_WRITE_BATCH
+    steam ids (retried on "database is locked" like any other write). A steam id whose fetch
+    fails (an exception, or any answer but 200 / 404) is reported and skipped, so its Player rows
+    keep their stored ranks; the rest are still written. A 404 clears the ranks (no Leetify account).
+    Returns one result per Player (same shape as refresh_one_player).
+    """
+    async with SessionLocal() as session:
+        rows = (await session.execute(
+            select(Player.id, Player.handle, User.steam_id)
+            .join(User, and_(
+                cast(Player.handle, BigInteger) == User.discord_id,  # handle == discord_id
+                User.steam_id.is_not(None),
+            ), isouter=True)
+            .distinct()
+        )).all()
+
+        players_by_steam: Dict[str, Dict[int, str]] = {}  # steam_id -> {player_id: handle}
+        linked: set[int] = set()
+        handles: Dict[int, str] = {}
+        for pid, handle, steam_id in rows:
+            handles[pid] = handle
+            if steam_id is None:
+                continue
+            players_by_steam.setdefault(str(steam_id), {})[pid] = handle
+            linked.add(pid)
+
+        await warm_profiles(session, list(players_by_steam))
+        l100s = {steam_id: await leetify_l100_avg_for_steam(session, steam_id) for steam_id in players_by_steam}
+
+    results: List[Dict] = [
+        {"discord_id": handles[pid], "ok": False, "reason": "no_user"}
+        for pid in handles if pid not in linked
+    ]
+
+    # Network, outside any transaction: fresh cache entries come from memory, the rest from the API
+    started = datetime.now(timezone.utc)
+    ratings: Dict[str, dict] = {}
+    for steam_id, players in players_by_steam.items():
+        try:
+            status, profile = await get_profile_entry(steam_id)
+        except Exception as e:
+            results.extend({"discord_id": h, "ok": False, "reason": str(e)} for h in players.values())
+            continue
+        if status not in (200, 404):
+            # private, rate limited or unreachable: keep the stored ranks rather than blanking them
+            reason = f"leetify_status_{status}" if status is not None else "leetify_unreachable"
+            results.extend({"discord_id": h, "ok": False, "reason": reason} for h in players.values())
+            continue
+        ranks = extract_ranks(profile) if profile else {"renown_elo": None, "premier_elo": None, "faceit_elo": None}
+        ratings[steam_id] = {**ranks, "leetify_l100_avg": l100s[steam_id]}
+
+    steam_ids = list(ratings)
+    for start in range(0, len(steam_ids), REFRESH_WRITE_BATCH):
+        batch = steam_ids[start:start + REFRESH_WRITE_BATCH]
+
+        async def work(session):
+            for steam_id in batch:
+                r = ratings[steam_id]
+                await session.execute(
+                    update(Player)
+                    .where(Player.id.in_(list(players_by_steam[steam_id])))
+                    .values(
+                        renown_elo=r["renown_elo"],
+                        premier_elo=r["premier_elo"],
+                        faceit_elo=r["faceit_elo"],
+                        leetify_l100_avg=r["leetify_l100_avg"],
+                        price_updated_at=started,
+                    )
+                )
+            await save_profiles(session, batch, since=started)
+
+        await run_write(work)
+        for steam_id in batch:
+            results.extend({"discord_id": h, "ok": True, **ratings[steam_id]}
+                           for h in players_by_steam[steam_id].values())
+
+    print(f'Refreshed {len(ratings)}/{len(players_by_steam)} unique steam ids for {len(linked)} players')
+    return results
+
+
+def _skill_score(faceit, premier, renown, l100, weights: Dict[str, float] | None = None) -> float:
+    w = weights or DEFAULT_WEIGHTS
+    leetify_norm = _norm_leetify(l100)
+    faceit_norm  = _norm(faceit,  FACEIT_MIN,  FACEIT_MAX)
+    premier_norm = _norm(premier, PREMIER_MIN, PREMIER_MAX)
+    renown_norm  = _norm(renown,  RENOWN_MIN,  RENOWN_MAX)
+
+    return (
+        w["leetify"] * leetify_norm +
+        w["faceit"]  * faceit_norm  +
+        w["premier"] * premier_norm +
+        w["renown"]  * renown_norm
     )
-    return {"discord_id": discord_id, "ok": ok, **ranks, "leetify_l100_avg": l100}
 
+def _price_row(pid: int, handle: str, score: float, p: float, gamma: float, old_price: int | None) -> Dict:
+    price = _price_from_percentile(p, gamma)
+    return {
+        "player_id": pid,
+        "handle": handle,
+        "score": round(score, 6),
+        "percentile": round(p, 4),
+        "price": price,
+        "old_price": old_price,
+        "delta": (price - old_price) if old_price is not None else None,
+    }
+
+def _pool_percentiles(entries: List[tuple[int, float, int]]) -> Dict[tuple[int, int], float]:
+    """
+    entries are (pool_key, score, player_id).
+    One sort on (pool_key, score) puts every pool in a contiguous run, so percentiles
+    for all pools come out of a single walk instead of one sort/query per guild.
+    Returns {(pool_key, player_id): percentile}
+    """
+    entries.sort(key=lambda t: (t[0], t[1]))
+    out: Dict[tuple[int, int], float] = {}
+
+    start = 0
+    total = len(entries)
+    while start < total:
+        pool = entries[start][0]
+        end = start
+        while end < total and entries[end][0] == pool:
+            end += 1
+        n = end - start
+        for i in range(n):
+            _, _, pid = entries[start + i]
+            out[(pool, pid)] = 0.5 if n <= 1 else (i / (n - 1))
+        start = end
+    return out
+
+
+async def compute_and_persist_prices(
+    session,
+    *,
+    dry_run: bool = False,
+    gamma: float | None = None,
+    weights: Dict[str, float] | None = None,
+) -> List[Dict]:
+    """
+    Recomputes prices for the global pool (Player.price) and for every guild pool
+    (guild_player_prices) in one pass. A player is in a guild's pool if they have a
+    User row in that guild.
+    Returns the global pool rows (same shape as before, plus old_price/delta).
+
+    dry_run=True computes candidate global prices against the current inputs and writes nothing,
+    gamma/weights override the config so curve changes can be previewed (see price_diff_pages).
+    """
+    gamma = GAMMA if gamma is None else gamma
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
 
-async def compute_and_persist_prices(session) -> List[Dict]:
     result = await session.execute(
         select(
             Player.id,
@@ -86,79 +261,142 @@ async def compute_and_persist_prices(session) -> List[Dict]:
             Player.faceit_elo,
             Player.premier_elo,
             Player.renown_elo,
-            Player.leetify_l100_avg
+            Player.leetify_l100_avg,
+            Player.price,
+            User.discord_guild_id,
         )
+        .join(User, cast(Player.handle, BigInteger) == User.discord_id, isouter=True)  # handle == discord_id
     )
     rows = result.all()
     if not rows:
         return []
 
-    # build skill scores
-    scored: List[tuple[int, float, str]] = []  # (player_id, score, handle)
-    for pid, handle, faceit, premier, renown, l100 in rows:
-        leetify_norm = _norm_leetify(l100)
-        faceit_norm  = _norm(faceit,  FACEIT_MIN,  FACEIT_MAX)
-        premier_norm = _norm(premier, PREMIER_MIN, PREMIER_MAX)
-        renown_norm  = _norm(renown,  RENOWN_MIN,  RENOWN_MAX)
-
-        score = (
-            W_LEETIFY * leetify_norm +
-            W_FACEIT  * faceit_norm  +
-            W_PREMIER * premier_norm +
-            W_RENOWN  * renown_norm
-        )
-        scored.append((pid, score, handle))
-
-    # convert to percentiles (across the whole pool)
-    scored.sort(key=lambda t: t[1])
-    n = len(scored)
-    percentiles: Dict[int, float] = {}
-    for i, (pid, _, _) in enumerate(scored):
-        p = 0.5 if n <= 1 else (i / (n - 1))
-        percentiles[pid] = p
+    # build skill scores (once per player, even if they're in several guilds)
+    scores: Dict[int, tuple[float, str]] = {}  # player_id -> (score, handle)
+    old_prices: Dict[int, int | None] = {}
+    guild_members: List[tuple[int, int]] = []  # (guild_id, player_id)
+    for pid, handle, faceit, premier, renown, l100, old_price, guild_id in rows:
+        if pid not in scores:
+            scores[pid] = (_skill_score(faceit, premier, renown, l100, weights), handle)
+            old_prices[pid] = old_price
+        if guild_id is not None and not dry_run:
+            guild_members.append((guild_id, pid))
+
+    # global pool + every guild pool, ranked in one grouped sort
+    entries = [(GLOBAL_POOL, score, pid) for pid, (score, _) in scores.items()]
+    entries += [(guild_id, scores[pid][0], pid) for guild_id, pid in guild_members]
+    percentiles = _pool_percentiles(entries)
+
+    if dry_run:
+        return [
+            _price_row(pid, handle, score, percentiles[(GLOBAL_POOL, pid)], gamma, old_prices[pid])
+            for pid, (score, handle) in scores.items()
+        ]
 
     # persist updates
     updated: List[Dict] = []
     now = datetime.now(timezone.utc)
 
-    has_price         = hasattr(Player, "price")
-    has_skill_score   = hasattr(Player, "skill_score")
-    has_percentile    = hasattr(Player, "percentile")
-    has_price_updated = hasattr(Player, "price_updated_at")
-
-    ids = [pid for pid, _, _ in scored]
     players = (
         await session.execute(
-            select(Player).where(Player.id.in_(ids))   # <-- in_()
+            select(Player).where(Player.id.in_(list(scores.keys())))
         )
     ).scalars().all()
     pmap = {p.id: p for p in players}
 
-    for pid, score, handle in scored:
-        p = percentiles[pid]
-        price = _price_from_percentile(p)
+    for pid, (score, handle) in scores.items():
+        p = percentiles[(GLOBAL_POOL, pid)]
+        price = _price_from_percentile(p, gamma)
 
         obj = pmap.get(pid)
         if not obj:
             continue
 
-        if has_price:
-            obj.price = price
-        if has_skill_score:
-            obj.skill_score = score
-        if has_percentile:
-            obj.percentile = p
-        if has_price_updated:
-            obj.price_updated_at = now
+        obj.price = price
+        obj.skill_score = score
+        obj.percentile = p
+        obj.price_updated_at = now
+
+        updated.append(_price_row(pid, handle, score, p, gamma, old_prices[pid]))
 
-        updated.append({
+    # guild pools: replace the whole table so players who left a guild drop out of its pool
+    guild_rows = [
+        {
+            "guild_id": guild_id,
             "player_id": pid,
-            "handle": handle,
-            "score": round(score, 6),
-            "percentile": round(p, 4),
-            "price": price,
-        })
+            "skill_score": scores[pid][0],
+            "percentile": percentiles[(guild_id, pid)],
+            "price": _price_from_percentile(percentiles[(guild_id, pid)], gamma),
+            "price_updated_at": now,
+        }
+        for guild_id, pid in guild_members
+    ]
+    await session.execute(delete(GuildPlayerPrice))
+    if guild_rows:
+        await session.execute(insert(GuildPlayerPrice), guild_rows)
 
     # return once, after processing everyone
     return updated
 
+
+async def price_diff_pages(
+    session,
+    *,
+    gamma: float | None = None,
+    weights: Dict[str, float] | None = None,
+    page_size: int = 25,
+    pages: int = 1,
+) -> List[List[Dict]]:
+    """
+    Dry-run compute_and_persist_prices and return the first `pages` pages of price changes,
+    biggest movers first (unpriced players count as moving from 0). Nothing is written.
+
+    Candidate prices only exist in memory (each one is a percentile of the whole pool), so the
+    whole pool is priced either way; only the movers that are shown get ranked (heapq), not all.
+    """
+    page_size = max(1, page_size)
+    rows = await compute_and_persist_prices(session, dry_run=True, gamma=gamma, weights=weights)
+    movers = heapq.nsmallest(
+        page_size * max(1, pages),
+        (r for r in rows if r["old_price"] != r["price"]),
+        key=lambda r: (-abs(r["price"] - (r["old_price"] or 0)), r["player_id"]),
+    )
+    return [movers[start:start + page_size] for start in range(0, len(movers), page_size)]
+
+
+async def price_page(
+    session,
+    *,
+    guild_id: int | None = None,
+    guild_pool: bool = False,
+    after: tuple[int, int] | None = None,
+    limit: int = 20,
+) -> List[tuple[int, str, int]]:
+    """
+    One page of (player_id, handle, price), most expensive first.
+
+    Keyset pagination on (price, player_id): `after` is the last row of the previous page, so
+    every page is a single index range read (no OFFSET). Scope:
+      guild_pool=True   -> guild_id's own pool (GuildPlayerPrice)
+      guild_id          -> Player.price for players registered in that guild
+      neither           -> Player.price for every registered player
+    """
+    if guild_pool:
+        price, pid = GuildPlayerPrice.price, GuildPlayerPrice.player_id
+        stmt = (
+            select(pid, Player.handle, price)
+            .join(Player, Player.id == pid)
+            .where(GuildPlayerPrice.guild_id == guild_id, price.is_not(None))
+        )
+    else:
+        price, pid = Player.price, Player.id
+        # EXISTS, not a join, so a player registered in several guilds is listed once
+        registered = select(User.id).where(User.discord_id == cast(Player.handle, BigInteger))
+        if guild_id is not None:
+            registered = registered.where(User.discord_guild_id == guild_id)
+        stmt = select(pid, Player.handle, price).where(price.is_not(None), registered.exists())
+
+    if after is not None:
+        stmt = stmt.where(tuple_(price, pid) < tuple_(*after))
+    rows = await session.execute(stmt.order_by(price.desc(), pid.desc()).limit(limit))
+    return [tuple(r) for r in rows.all()]
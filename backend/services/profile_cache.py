@@ -0,0 +1,126 @@
+# backend/services/profile_cache.py
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import LeetifyProfileCache
+from backend.services.leetify_api import fetch_profile_status
+from backend.services.repo import _as_utc
+
+# Ranks barely move day to day so we don't need to hit Leetify on every /pricing update
+PROFILE_TTL = timedelta(hours=float(os.getenv("LEETIFY_PROFILE_TTL_HOURS", "12")))
+# How long we remember "no Leetify profile" (404) before asking again
+PROFILE_NEGATIVE_TTL = timedelta(hours=float(os.getenv("LEETIFY_PROFILE_404_TTL_HOURS", "6")))
+
+IN_CHUNK = 500          # ids per IN (...) list
+
+# steam_id -> (fetched_at, status, profile)
+_profiles: dict[str, tuple[datetime, int, dict | None]] = {}
+
+
+def _is_fresh(fetched_at: datetime, status: int, now: datetime) -> bool:
+    ttl = PROFILE_TTL if status == 200 else PROFILE_NEGATIVE_TTL
+    return (now - _as_utc(fetched_at)) < ttl
+
+async def _load_persisted(session: AsyncSession, steam_id: str) -> tuple[datetime, int, dict | None] | None:
+    row = await session.scalar(
+        select(LeetifyProfileCache).where(LeetifyProfileCache.steam_id == steam_id)
+    )
+    if not row:
+        return None
+    profile = json.loads(row.payload) if row.payload else None
+    return _as_utc(row.fetched_at), row.status, profile
+
+async def _persist(session: AsyncSession, steam_id: str, status: int, profile: dict | None, fetched_at: datetime):
+    payload = json.dumps(profile) if profile is not None else None
+    stmt = sqlite_insert(LeetifyProfileCache).values(
+        steam_id=steam_id, status=status, payload=payload, fetched_at=fetched_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["steam_id"],
+        set_={"status": stmt.excluded.status, "payload": stmt.excluded.payload, "fetched_at": stmt.excluded.fetched_at},
+    )
+    await session.execute(stmt)
+
+
+async def get_profile_entry(steam64_id: str | int, *, session: AsyncSession | None = None,
+                            force: bool = False) -> tuple[int | None, dict | None]:
+    """
+    Cached version of fetch_profile_status().
+    Checks memory, then the leetify_profile_cache table (if a session is given), then the API.
+    Only 200s and 404s are cached, anything else (private, rate limit, network) is returned but not stored.
+    """
+    steam_id = str(steam64_id)
+    now = datetime.now(timezone.utc)
+
+    if not force:
+        hit = _profiles.get(steam_id)
+        if hit and _is_fresh(hit[0], hit[1], now):
+            return hit[1], hit[2]
+
+        if session is not None:
+            hit = await _load_persisted(session, steam_id)
+            if hit and _is_fresh(hit[0], hit[1], now):
+                _profiles[steam_id] = hit
+                return hit[1], hit[2]
+
+    status, profile = await fetch_profile_status(steam_id)
+    if status in (200, 404):
+        _profiles[steam_id] = (now, status, profile)
+        if session is not None:
+            await _persist(session, steam_id, status, profile, now)
+    return status, profile
+
+async def get_cached_profile(steam64_id: str | int, *, session: AsyncSession | None = None,
+                             force: bool = False) -> dict | None:
+    """Drop-in for fetch_profile(): profile JSON or None."""
+    _, profile = await get_profile_entry(steam64_id, session=session, force=force)
+    return profile
+
+async def cached_profile_exists(steam64_id: str | int, *, session: AsyncSession | None = None) -> bool | None:
+    """
+    Same contract as leetify_profile_exists():
+      True -> profile found, False -> 404, None -> couldn't tell right now
+    """
+    status, _ = await get_profile_entry(steam64_id, session=session)
+    if status == 200:
+        return True
+    if status == 404:
+        return False
+    return None
+
+async def warm_profiles(session: AsyncSession, steam_ids: list[str]) -> int:
+    """
+    Load the still-fresh persisted entries for steam_ids into memory in one query (per 500 ids),
+    so later get_profile_entry(session=None) calls only go to the API for the rest. Returns how many.
+    """
+    now = datetime.now(timezone.utc)
+    loaded = 0
+    for start in range(0, len(steam_ids), IN_CHUNK):
+        rows = await session.scalars(
+            select(LeetifyProfileCache).where(LeetifyProfileCache.steam_id.in_(steam_ids[start:start + IN_CHUNK]))
+        )
+        for row in rows.all():
+            if _is_fresh(row.fetched_at, row.status, now):
+                profile = json.loads(row.payload) if row.payload else None
+                _profiles[row.steam_id] = (_as_utc(row.fetched_at), row.status, profile)
+                loaded += 1
+    return loaded
+
+async def save_profiles(session: AsyncSession, steam_ids: list[str], *, since: datetime) -> None:
+    """Persist the in-memory entries of steam_ids fetched at or after `since` (fetched with session=None)."""
+    for steam_id in steam_ids:
+        hit = _profiles.get(str(steam_id))
+        if hit and _as_utc(hit[0]) >= since:
+            await _persist(session, str(steam_id), hit[1], hit[2], hit[0])
+
+def invalidate_profile(steam64_id: str | int | None = None) -> None:
+    """Forget one steam id (or everything) from the in-memory cache."""
+    if steam64_id is None:
+        _profiles.clear()
+    else:
+        _profiles.pop(str(steam64_id), None)
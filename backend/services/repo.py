@@ -5,8 +5,11 @@ from datetime import datetime, timedelta, timezone
 from sqlalchemy import select, func, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.services.leetify_api import current_week_start_london
+from backend.services.leetify_api import current_week_start_london, week_bounds_naive_utc
 from backend.services.faceit_api import get_faceit_player_by_steam
+from backend.services.roster_cache import mark_team_dirty
+from backend.services.week_lock import week_is_locked, relock_teams
+from backend.services.leaderboard import refresh_team_leaderboard
 from ..models import User, Team, Player, TeamPlayer, ScoringConfig, PlayerStats, PlayerGame
 
 
@@ -152,8 +155,8 @@ async def remove_user_steam_id(
     if player_ids:
         if guild_id is not None:
             # Find TeamPlayer rows for those players within this guild
-            tp_ids = (await session.scalars(
-                select(TeamPlayer.id)
+            tp_rows = (await session.execute(
+                select(TeamPlayer.id, TeamPlayer.team_id)
                 .join(Team, Team.id == TeamPlayer.team_id)
                 .where(
                     Team.guild_id == guild_id,
@@ -162,13 +165,25 @@ async def remove_user_steam_id(
             )).all()
         else:
             # All guilds
-            tp_ids = (await session.scalars(
-                select(TeamPlayer.id).where(TeamPlayer.player_id.in_(player_ids))
+            tp_rows = (await session.execute(
+                select(TeamPlayer.id, TeamPlayer.team_id).where(TeamPlayer.player_id.in_(player_ids))
             )).all()
 
-        if tp_ids:
-            await session.execute(delete(TeamPlayer).where(TeamPlayer.id.in_(tp_ids)))
+        if tp_rows:
+            await session.execute(delete(TeamPlayer).where(TeamPlayer.id.in_([r.id for r in tp_rows])))
             await session.flush()
+            team_ids = list({r.team_id for r in tp_rows})
+            for team_id in team_ids:
+                mark_team_dirty(session, team_id)
+
+            # this week's locked roster (and the team ranks built on it) drop the player too
+            this_week = week_bounds_naive_utc("Europe/London")[0]
+            if await week_is_locked(session, this_week):
+                await relock_teams(session, this_week, team_ids)
+                guild_ids = (await session.scalars(
+                    select(Team.guild_id).where(Team.id.in_(team_ids)).distinct()
+                )).all()
+                await refresh_team_leaderboard(session, this_week, list(guild_ids))
 
     # Optionally purge cached stats
     if purge_stats:
@@ -203,6 +218,7 @@ async def add_player_by_handle(session: AsyncSession, team: Team, handle: str, r
     tp = TeamPlayer(team_id=team.id, player_id=player.id, role=role)
     session.add(tp)
     await session.flush()
+    mark_team_dirty(session, team.id)
     return tp
 
 async def remove_player(session: AsyncSession, team: Team, handle: str) -> bool:
@@ -215,6 +231,7 @@ async def remove_player(session: AsyncSession, team: Team, handle: str) -> bool:
     tp = res.scalar_one_or_none()
     if tp:
         await session.delete(tp)
+        mark_team_dirty(session, team.id)
         return True
     return False
 
@@ -368,6 +385,11 @@ async def leetify_l100_avg(session, user_id: int):
     )
     if not steam:
         return None
+    return await leetify_l100_avg_for_steam(session, steam)
+
+async def leetify_l100_avg_for_steam(session, steam_id: str | int):
+    """Average Leetify rating over the last 100 games for a steam account (shared by all its User rows)."""
+    steam = str(steam_id)
 
     q = (
         select(PlayerGame.leetify_rating)
@@ -375,7 +397,7 @@ async def leetify_l100_avg(session, user_id: int):
         .order_by(PlayerGame.finished_at.desc())
         .limit(100)
     )
-    #print('User ID being used:', user_id)
+    #print('Steam ID being used:', steam)
     result = await session.execute(q)
 
     #print(f'Result: {result}')
@@ -387,7 +409,7 @@ async def leetify_l100_avg(session, user_id: int):
     # fallback if no leetify_rat1
     q2 = (
         select(PlayerGame.ct_leetify_rating, PlayerGame.t_leetify_rating)
-        .where(PlayerGame.user_id == user_id)
+        .where(PlayerGame.steam_id == steam)
         .order_by(PlayerGame.finished_at.desc())
         .limit(100)
     )
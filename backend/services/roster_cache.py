@@ -0,0 +1,90 @@
+# backend/services/roster_cache.py
+"""
+In-memory cache of each team's TeamPlayer intervals.
+
+A team's roster only changes through the market (buy/sell, /team add/remove, season reset),
+so we keep its [effective_from_week, effective_to_week) intervals in memory and answer
+"who is on team X at week W" without another interval query.
+
+Write paths call mark_team_dirty(session, team_id) after touching TeamPlayer. That drops the
+cached intervals straight away, makes later reads in the *same* session go to the DB (they need
+to see the uncommitted changes) and drops them again once the session commits or rolls back,
+so nothing uncommitted ever ends up cached.
+
+Every invalidation also bumps a generation counter (per team, plus one for "every team"). A reader
+notes the generations before it loads and only stores what it loaded if neither moved meanwhile,
+so a load that raced a commit from another session is used once but never cached.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+
+from backend.models import TeamPlayer
+
+ALL_TEAMS = -1          # dirty marker for "every team" (season reset etc)
+_DIRTY_KEY = "roster_cache_dirty"
+
+# team_id -> [(player_id, effective_from_week, effective_to_week)]
+_intervals: dict[int, list[tuple[int, datetime, datetime | None]]] = {}
+# team_id -> times it was invalidated; ALL_TEAMS counts whole-cache invalidations
+_generation: dict[int, int] = {}
+
+
+def _dirty(session) -> set[int]:
+    return session.info.setdefault(_DIRTY_KEY, set())
+
+def invalidate_team(team_id: int | None = None) -> None:
+    """Forget one team's intervals (or every team's)."""
+    if team_id is None or team_id == ALL_TEAMS:
+        _intervals.clear()
+        team_id = ALL_TEAMS
+    else:
+        _intervals.pop(team_id, None)
+    _generation[team_id] = _generation.get(team_id, 0) + 1
+
+def _generations(team_id: int) -> tuple[int, int]:
+    return _generation.get(team_id, 0), _generation.get(ALL_TEAMS, 0)
+
+def mark_team_dirty(session, team_id: int | None = None) -> None:
+    """Call after changing TeamPlayer rows for team_id (None = every team) in this session."""
+    team_id = ALL_TEAMS if team_id is None else team_id
+    _dirty(session).add(team_id)
+    invalidate_team(team_id)
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _drop_dirty(session):
+    for team_id in session.info.pop(_DIRTY_KEY, ()):
+        invalidate_team(team_id)
+
+
+async def _load_intervals(session, team_id: int) -> list[tuple[int, datetime, datetime | None]]:
+    rows = await session.execute(
+        select(TeamPlayer.player_id, TeamPlayer.effective_from_week, TeamPlayer.effective_to_week)
+        .where(TeamPlayer.team_id == team_id)
+    )
+    return [tuple(r) for r in rows.all()]
+
+async def team_intervals(session, team_id: int) -> list[tuple[int, datetime, datetime | None]]:
+    dirty = _dirty(session)
+    if team_id in dirty or ALL_TEAMS in dirty:
+        return await _load_intervals(session, team_id)
+
+    hit = _intervals.get(team_id)
+    if hit is None:
+        before = _generations(team_id)
+        hit = await _load_intervals(session, team_id)
+        if _generations(team_id) == before:     # nobody invalidated it while we were loading
+            _intervals[team_id] = hit
+    return hit
+
+def roster_at(intervals, week_start: datetime) -> list[int]:
+    """Same predicate as roster_for_week: from <= week < to (to NULL = open)."""
+    return [
+        pid for pid, start, end in intervals
+        if start <= week_start and (end is None or end > week_start)
+    ]
+
+async def cached_roster_for_week(session, team_id: int, week_start: datetime) -> list[int]:
+    return roster_at(await team_intervals(session, team_id), week_start)
@@ -0,0 +1,63 @@
+# backend/services/schema.py
+"""
+Schema upkeep that create_all doesn't do.
+
+create_all only creates missing tables; a column or index added to a model later never reaches a
+database whose table already exists. ensure_schema() adds those (nullable columns only, which is
+all SQLite's ALTER TABLE ADD COLUMN can do without a default) and drops the indexes a composite
+index has replaced, so a deployed bot picks up schema changes on its next start.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend import models  # noqa: F401  (registers every table on Base.metadata)
+from backend.db import Base, engine
+
+# indexes of released versions superseded by a composite index on the model, dropped where they still exist
+RETIRED_INDEXES = (
+    "ix_team_players_effective_from_week",     # -> idx_team_players_team_weeks
+    "ix_team_players_effective_to_week",       # -> idx_team_players_team_weeks
+    "idx_playergames_steam_week",              # -> idx_playergames_steam_recent
+)
+
+
+def _upgrade(sync_conn) -> list[str]:
+    insp = inspect(sync_conn)
+    tables = set(insp.get_table_names())
+    dialect = sync_conn.dialect
+    changes = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        have_cols = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have_cols:
+                continue
+            if not col.nullable:
+                print(f"[schema] can't add NOT NULL column {table.name}.{col.name} to an existing table")
+                continue
+            sync_conn.exec_driver_sql(
+                f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=dialect)}"
+            )
+            changes.append(f"{table.name}.{col.name}")
+
+        have_ix = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in have_ix:
+                index.create(sync_conn, checkfirst=True)
+                changes.append(index.name)
+    for name in RETIRED_INDEXES:
+        sync_conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    return changes
+
+
+async def ensure_schema(conn: AsyncConnection | None = None) -> list[str]:
+    """Add the model columns/indexes the database is missing and drop RETIRED_INDEXES. Returns what was added."""
+    if conn is None:
+        async with engine.begin() as conn:
+            changes = await conn.run_sync(_upgrade)
+    else:
+        changes = await conn.run_sync(_upgrade)
+    if changes:
+        print(f"[schema] added: {', '.join(changes)}")
+    return changes
@@ -0,0 +1,146 @@
+# backend/services/team_card.py
+"""
+Read model for /team show: the whole team card in two queries.
+
+  1. owner -> team -> budget -> roster -> each player's user row + cached PlayerStats
+  2. latest WeeklyPoints per roster player, preferring this guild and falling back
+     to any guild the same discord account is registered in (window function)
+
+Nothing is created here, a missing TeamWeekState is reported with the budget it would start with.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import select, func, or_, and_, cast, BigInteger, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from backend.models import Team, TeamPlayer, TeamWeekRoster, Player, User, PlayerStats, WeeklyPoints
+from backend.services.market import budget_for_week_expr
+from backend.services.week_lock import week_end_of
+
+RULESET_ID = 1
+
+
+@dataclass
+class TeamCardPlayer:
+    player_id: int
+    handle: str
+    role: str | None
+    discord_id: int | None           # None if the handle isn't a discord id
+    user_id: int | None              # this guild's user row
+    db_name: str | None              # display/username stored on the user row
+    avg_rating: float | None = None
+    games: int = 0
+    points: float | None = None
+
+
+@dataclass
+class TeamCard:
+    found_user: bool
+    team_id: int | None = None
+    team_name: str | None = None
+    budget: float | None = None
+    players: list[TeamCardPlayer] = field(default_factory=list)
+
+    @property
+    def total(self) -> float:
+        return sum(float(p.points) for p in self.players if p.points is not None)
+
+
+async def load_team_card(session: AsyncSession, *, guild_id: int, discord_id: int,
+                         week_start: datetime, locked: bool) -> TeamCard:
+    """
+    locked=True reads the roster from the team_week_roster snapshot (equality join),
+    otherwise from TeamPlayer intervals overlapping the week (what the snapshot will hold).
+    """
+    owner = aliased(User)
+    member = aliased(User)
+
+    if locked:
+        roster_join = and_(TeamWeekRoster.team_id == Team.id, TeamWeekRoster.week_start == week_start)
+        roster, role = TeamWeekRoster, TeamWeekRoster.role
+    else:
+        roster_join = and_(
+            TeamPlayer.team_id == Team.id,
+            TeamPlayer.effective_from_week < week_end_of(week_start),
+            or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > week_start),
+        )
+        roster, role = TeamPlayer, TeamPlayer.role
+
+    # Query 1: header + roster + stats
+    rows = (await session.execute(
+        select(
+            Team.id.label("team_id"),
+            Team.name.label("team_name"),
+            budget_for_week_expr(guild_id, Team.id, week_start).label("budget"),
+            Player.id.label("player_id"),
+            Player.handle,
+            role.label("role"),
+            member.id.label("user_id"),
+            func.coalesce(member.discord_display_name, member.discord_username).label("db_name"),
+            PlayerStats.avg_leetify_rating,
+            PlayerStats.sample_size,
+        )
+        .select_from(owner)
+        .outerjoin(Team, and_(Team.owner_id == owner.id, Team.guild_id == guild_id))
+        .outerjoin(roster, roster_join)
+        .outerjoin(Player, Player.id == roster.player_id)
+        .outerjoin(member, and_(member.discord_id == cast(Player.handle, BigInteger),
+                                member.discord_guild_id == guild_id))
+        .outerjoin(PlayerStats, and_(PlayerStats.user_id == member.id, PlayerStats.guild_id == guild_id))
+        .where(owner.discord_id == discord_id, owner.discord_guild_id == guild_id)
+        .order_by(Player.handle.asc())
+    )).all()
+
+    if not rows:
+        return TeamCard(found_user=False)
+    head = rows[0]
+    card = TeamCard(found_user=True, team_id=head.team_id, team_name=head.team_name,
+                    budget=float(head.budget) if head.team_id is not None else None)
+    for r in rows:
+        if r.player_id is None:
+            continue
+        card.players.append(TeamCardPlayer(
+            player_id=r.player_id,
+            handle=r.handle,
+            role=r.role,
+            discord_id=int(r.handle) if str(r.handle).isdigit() else None,
+            user_id=r.user_id,
+            db_name=r.db_name,
+            avg_rating=r.avg_leetify_rating,
+            games=r.sample_size or 0,
+        ))
+
+    discord_ids = [p.discord_id for p in card.players if p.discord_id is not None and p.user_id is not None]
+    if not discord_ids:
+        return card
+
+    # Query 2: latest points per discord id; this guild's own row first, then any other guild
+    here = and_(User.discord_guild_id == guild_id, WeeklyPoints.guild_id == guild_id)
+    ranked = (
+        select(
+            User.discord_id,
+            WeeklyPoints.weekly_score,
+            func.row_number().over(
+                partition_by=User.discord_id,
+                order_by=(case((here, 0), else_=1), WeeklyPoints.computed_at.desc()),
+            ).label("rn"),
+        )
+        .join(User, User.id == WeeklyPoints.user_id)
+        .where(
+            User.discord_id.in_(discord_ids),
+            WeeklyPoints.weekly_score.isnot(None),
+            WeeklyPoints.computed_at.isnot(None),
+            WeeklyPoints.ruleset_id == RULESET_ID,
+        )
+        .subquery()
+    )
+    points = dict((await session.execute(
+        select(ranked.c.discord_id, ranked.c.weekly_score).where(ranked.c.rn == 1)
+    )).tuples().all())
+
+    for p in card.players:
+        if p.user_id is not None and p.discord_id in points:
+            p.points = points[p.discord_id]
+    return card
@@ -0,0 +1,84 @@
+# backend/services/week_cache.py
+"""
+Cache for closed weeks.
+
+Once a week is over its WeeklyPoints and locked rosters don't change, so the rendered leaderboard
+rows for (kind, guild, week) are built once and kept in two places:
+
+  - the week_cache table: the rows as a JSON blob plus a version (hash of the blob)
+  - memory: (kind, guild_id, week_start) -> (version, rows), least recently used dropped first
+
+A read is one primary-key lookup of the version; if memory holds that version the rows come from
+memory, otherwise from the blob, otherwise they're built. Nothing expires. Rescoring a week
+(refresh_player_leaderboard / refresh_team_leaderboard on it) calls invalidate_week(), which
+deletes the blobs; the next read rebuilds them and gets a new version, so stale copies held in
+memory, by this process or another, are never served.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import WeekCache
+
+MEMORY_SIZE = 256       # (kind, guild, week) entries kept in memory
+
+_Key = tuple[str, int, datetime]
+_memory: "OrderedDict[_Key, tuple[str, list]]" = OrderedDict()
+
+
+def _remember(key: _Key, version: str, rows: list) -> None:
+    _memory[key] = (version, rows)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_SIZE:
+        _memory.popitem(last=False)
+
+
+async def cached_week(session: AsyncSession, kind: str, guild_id: int, week_start: datetime,
+                      build: Callable[[], Awaitable[list[Any]]]) -> list:
+    """Rows for a closed week; `build()` runs only when nothing is stored (JSON-able lists only)."""
+    key = (kind, guild_id, week_start)
+    where = (WeekCache.kind == kind, WeekCache.guild_id == guild_id, WeekCache.week_start == week_start)
+
+    hit = _memory.get(key)
+    if hit is not None:
+        version = await session.scalar(select(WeekCache.version).where(*where))
+        if version == hit[0]:
+            _memory.move_to_end(key)
+            return hit[1]
+    row = (await session.execute(select(WeekCache.version, WeekCache.payload).where(*where))).first()
+    if row is not None:
+        rows = json.loads(row.payload)
+        _remember(key, row.version, rows)
+        return rows
+
+    rows = await build()
+    payload = json.dumps(rows, separators=(",", ":"))
+    version = hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+    stmt = sqlite_insert(WeekCache).values(
+        kind=kind, guild_id=guild_id, week_start=week_start, version=version, payload=payload,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["kind", "guild_id", "week_start"],
+        set_={"version": stmt.excluded.version, "payload": stmt.excluded.payload,
+              "built_at": stmt.excluded.built_at},
+    )
+    await session.execute(stmt)
+    _remember(key, version, rows)
+    return rows
+
+
+async def invalidate_week(session: AsyncSession, week_start: datetime,
+                          guild_ids: list[int] | None = None) -> None:
+    """Forget every cached kind for week_start (every guild, or just guild_ids). Call when rescoring it."""
+    stmt = delete(WeekCache).where(WeekCache.week_start == week_start)
+    if guild_ids is not None:
+        stmt = stmt.where(WeekCache.guild_id.in_(guild_ids))
+    await session.execute(stmt)
+    for key in [k for k in _memory if k[2] == week_start and (guild_ids is None or k[1] in guild_ids)]:
+        del _memory[key]
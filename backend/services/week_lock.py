@@ -0,0 +1,141 @@
+# backend/services/week_lock.py
+"""
+Weekly lock: at the Monday boundary every team's roster is copied into team_week_roster
+(team_id, week_start, player_id, price_at_lock) in one INSERT ... SELECT.
+
+The roster of week W is every TeamPlayer interval overlapping [W, next week's key), the same rule
+/team show used before the snapshot existed. Next week's key is the one the market queues buys
+at (week_bounds_naive_utc, an hour before next Monday), so a queued buy isn't in this week. Transfers only ever affect next week, so after the
+lock "who was on team X in week W" is an equality join on the snapshot and past weeks never
+need their effective_from/to intervals re-evaluated.
+
+Only writers lock: jobs/weekly_rollup.py on Monday, and refresh_team_leaderboard() after a
+scoring run (so a missed job run doesn't matter). Readers ask week_is_locked() and read the
+intervals until the snapshot exists. The admin paths that rewrite rosters mid-week
+(/util reset_teams, removing a steam id) call relock_teams() so the current week's snapshot
+follows them; earlier weeks keep the roster they were scored with.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, func, or_, and_, event, literal, delete, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.models import Team, TeamPlayer, Player, GuildPlayerPrice, TeamWeekRoster, WeekLock
+from backend.services.market import PRICE_POOL
+from backend.services.leetify_api import week_bounds_naive_utc
+
+_PENDING_KEY = "week_locks_pending"
+
+# weeks we know are locked (only filled after the lock has been committed)
+_locked_weeks: set[datetime] = set()
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_locked(session):
+    _locked_weeks.update(session.info.pop(_PENDING_KEY, ()))
+
+@event.listens_for(Session, "after_rollback")
+def _drop_locked(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def week_end_of(week_start: datetime) -> datetime:
+    """
+    Exclusive end of the week keyed week_start: the next-week key transfers and resets write
+    (week_bounds_naive_utc's second value for that week), not the following Monday itself.
+    A week's keys fall between Sunday 23:00 and Monday 00:00 local, so +12h is always inside it.
+    """
+    inside = week_start.replace(tzinfo=timezone.utc) + timedelta(hours=12)
+    return week_bounds_naive_utc("Europe/London", now=inside)[1]
+
+
+def _snapshot(week_start: datetime):
+    """(team_id, week_start, player_id, guild_id, role, price) for every interval overlapping the week."""
+    price = Player.price
+    if PRICE_POOL == "guild":
+        price = func.coalesce(GuildPlayerPrice.price, Player.price)
+
+    return (
+        select(
+            TeamPlayer.team_id,
+            literal(week_start).label("week_start"),
+            TeamPlayer.player_id,
+            Team.guild_id,
+            TeamPlayer.role,
+            price,
+        )
+        .join(Team, Team.id == TeamPlayer.team_id)
+        .join(Player, Player.id == TeamPlayer.player_id)
+        .outerjoin(GuildPlayerPrice, and_(GuildPlayerPrice.player_id == Player.id,
+                                          GuildPlayerPrice.guild_id == Team.guild_id))
+        .where(
+            TeamPlayer.effective_from_week < week_end_of(week_start),
+            or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > week_start),
+        )
+    )
+
+
+async def _insert_snapshot(session: AsyncSession, snapshot) -> int:
+    stmt = sqlite_insert(TeamWeekRoster).from_select(
+        ["team_id", "week_start", "player_id", "guild_id", "role", "price_at_lock"], snapshot
+    ).on_conflict_do_nothing()
+    res = await session.execute(stmt)
+    return res.rowcount or 0
+
+
+async def lock_week(session: AsyncSession, week_start: datetime) -> int:
+    """
+    Snapshot every team's roster for the week (intervals overlapping [week_start, week end)).
+    Idempotent: a week that already has a week_locks row is left alone. Returns rows written.
+    """
+    if await session.scalar(select(WeekLock.week_start).where(WeekLock.week_start == week_start)):
+        return 0
+
+    rows = await _insert_snapshot(session, _snapshot(week_start))
+    await session.execute(
+        sqlite_insert(WeekLock).values(week_start=week_start, rows=rows).on_conflict_do_nothing()
+    )
+    session.info.setdefault(_PENDING_KEY, set()).add(week_start)
+    print(f"[week_lock] locked {week_start}: {rows} roster rows")
+    return rows
+
+
+async def week_is_locked(session: AsyncSession, week_start: datetime) -> bool:
+    """
+    True if week_start has a committed (or this session's) snapshot to read. Never writes: when
+    it's False, read the week from the TeamPlayer intervals instead.
+    """
+    if week_start in _locked_weeks or week_start in session.info.get(_PENDING_KEY, ()):
+        return True
+    if await session.scalar(select(WeekLock.week_start).where(WeekLock.week_start == week_start)):
+        _locked_weeks.add(week_start)   # not pending in this session, so it's committed
+        return True
+    return False
+
+
+async def relock_teams(session: AsyncSession, week_start: datetime,
+                       team_ids: Optional[list[int]] = None) -> int:
+    """
+    Re-snapshot week_start for team_ids (None = every team) from their current intervals, after
+    an admin change to a roster the week was already locked with. Nothing to do for a week that
+    isn't locked yet. Returns rows written.
+    """
+    if not await week_is_locked(session, week_start):
+        return 0
+
+    scope = [TeamWeekRoster.week_start == week_start]
+    snapshot = _snapshot(week_start)
+    if team_ids is not None:
+        scope.append(TeamWeekRoster.team_id.in_(team_ids))
+        snapshot = snapshot.where(TeamPlayer.team_id.in_(team_ids))
+    removed = (await session.execute(delete(TeamWeekRoster).where(*scope))).rowcount or 0
+    rows = await _insert_snapshot(session, snapshot)
+    await session.execute(
+        update(WeekLock).where(WeekLock.week_start == week_start)
+        .values(rows=WeekLock.rows - removed + rows)
+    )
+    print(f"[week_lock] relocked {week_start}: {removed} roster rows replaced by {rows}")
+    return rows
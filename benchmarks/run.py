@@ -0,0 +1,234 @@
+# benchmarks/run.py
+"""
+Pricing / scoring micro-benchmarks against a synthetic SQLite pool.
+
+    python -m benchmarks.run --scales 1000,10000 --out bench.json
+    python -m benchmarks.run --scales 1000 --baseline bench.json   # compare with an older report
+
+Each scale gets a fresh database (in --workdir), filled by benchmarks.synthetic, then every
+service function below is timed. The report is plain JSON so two commits can be diffed.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend.db import Base
+from backend.models import Team
+from backend.services.pricing import compute_and_persist_prices
+from backend.services.repo import leetify_l100_avg
+from backend.services.leaderboard import refresh_leaderboards, read_team_leaderboard, read_player_leaderboard, \
+    read_team_page, read_closed_team_leaderboard, read_global_leaderboard
+from backend.services.optimizer import load_candidates, solve, suggest_for_team
+from backend.services.leetify_api import week_bounds_naive_utc
+from bot.cogs.stats_refresh import aggregate_week_from_db
+from benchmarks.synthetic import Scale, build_pool
+
+# name -> async fn(session, pool, i) timed once per call; i is the call number
+BENCHMARKS = {}
+
+
+def benchmark(name: str, calls: int = 50, rollback: bool = False):
+    """Register a benchmark. rollback=True undoes any writes after every call."""
+    def deco(fn):
+        BENCHMARKS[name] = (fn, calls, rollback)
+        return fn
+    return deco
+
+
+@benchmark("compute_and_persist_prices", calls=3, rollback=True)
+async def _bench_prices(session, pool, i):
+    await compute_and_persist_prices(session)
+    await session.flush()
+
+@benchmark("leetify_l100_avg", calls=200)
+async def _bench_l100(session, pool, i):
+    uid = pool.user_ids[(i * 7919) % len(pool.user_ids)]
+    await leetify_l100_avg(session, uid)
+
+@benchmark("aggregate_week_from_db", calls=200)
+async def _bench_aggregate(session, pool, i):
+    steam = pool.steam_ids[(i * 7919) % len(pool.steam_ids)]
+    await aggregate_week_from_db(session, steam_id=int(steam), week_start_utc=pool.week_start)
+
+@benchmark("refresh_leaderboards", calls=3, rollback=True)
+async def _bench_refresh_leaderboards(session, pool, i):
+    await refresh_leaderboards(session, pool.week_start)
+
+@benchmark("read_team_leaderboard", calls=200)
+async def _bench_read_team_leaderboard(session, pool, i):
+    guild_id = pool.guild_ids[i % len(pool.guild_ids)]
+    await read_team_leaderboard(session, guild_id, pool.week_start, limit=25)
+
+@benchmark("read_team_page", calls=200)
+async def _bench_read_team_page(session, pool, i):
+    # the /leaderboard teams page: ranks plus top 3 contributors per team
+    guild_id = pool.guild_ids[i % len(pool.guild_ids)]
+    await read_team_page(session, guild_id, pool.week_start, limit=25, top=3)
+
+@benchmark("read_player_leaderboard", calls=200)
+async def _bench_read_player_leaderboard(session, pool, i):
+    guild_id = pool.guild_ids[i % len(pool.guild_ids)]
+    await read_player_leaderboard(session, guild_id, pool.week_start, limit=25)
+
+@benchmark("read_global_leaderboard", calls=200)
+async def _bench_read_global_leaderboard(session, pool, i):
+    await read_global_leaderboard(session, pool.week_start, limit=25, after_rank=25 * (i % 4))
+
+@benchmark("read_closed_team_leaderboard", calls=200)
+async def _bench_read_closed_team_leaderboard(session, pool, i):
+    # last week; the first call per guild builds the cache entry, the rest are hits
+    guild_id = pool.guild_ids[i % len(pool.guild_ids)]
+    await read_closed_team_leaderboard(session, guild_id, pool.week_start - timedelta(days=7), limit=25)
+
+_candidates = {}
+
+@benchmark("optimizer_solve", calls=50)
+async def _bench_optimizer_solve(session, pool, i):
+    # whole pool across every guild (~scale.players candidates), loaded once and not timed after that
+    if pool.scale.players not in _candidates:
+        _candidates[pool.scale.players] = await load_candidates(session, None, source="l100")
+    cands = _candidates[pool.scale.players]
+    current = frozenset(c.player_id for c in cands[i:i + 5])
+    solve(cands, budget=30_000 + 100 * i, current=current, max_changes=None if i % 2 else 1)
+
+@benchmark("suggest_for_team", calls=20)
+async def _bench_suggest(session, pool, i):
+    team_id = pool.team_ids[(i * 7919) % len(pool.team_ids)]
+    guild_id = await session.scalar(select(Team.guild_id).where(Team.id == team_id))
+    week_start, next_week = week_bounds_naive_utc("Europe/London")
+    await suggest_for_team(session, guild_id=guild_id, team_id=team_id,
+                           this_week=week_start, next_week=next_week)
+
+
+def _summary(samples: list[float]) -> dict:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "calls": len(ms),
+        "total_s": round(sum(ms) / 1000, 4),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+async def run_scale(scale: Scale, workdir: str, only: list[str] | None = None) -> dict:
+    path = os.path.join(workdir, f"bench_{scale.players}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    week_start, _ = week_bounds_naive_utc("Europe/London")
+    t0 = time.perf_counter()
+    async with Session() as session:
+        async with session.begin():
+            pool = await build_pool(session, scale, week_start)
+    build_s = time.perf_counter() - t0
+
+    results = {}
+    for name, (fn, calls, rollback) in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        samples = []
+        async with Session() as session:
+            for i in range(calls):
+                # services print a lot, keep it out of the timings and the terminal
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    await fn(session, pool, i)
+                    samples.append(time.perf_counter() - start)
+                if rollback:
+                    await session.rollback()
+            await session.rollback()
+        results[name] = _summary(samples)
+        print(f"  {name:<28} mean {results[name]['mean_ms']:>10.3f} ms  p95 {results[name]['p95_ms']:>10.3f} ms")
+
+    await engine.dispose()
+    return {"scale": vars(scale), "build_s": round(build_s, 2), "results": results}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def compare(report: dict, baseline: dict) -> None:
+    """Print mean-time ratios (this / baseline) for every scale + benchmark present in both."""
+    base = {r["scale"]["players"]: r["results"] for r in baseline.get("runs", [])}
+    for run in report["runs"]:
+        players = run["scale"]["players"]
+        if players not in base:
+            continue
+        print(f"\n{players:,} players vs {baseline.get('commit')}:")
+        for name, res in run["results"].items():
+            old = base[players].get(name)
+            if not old:
+                continue
+            ratio = res["mean_ms"] / old["mean_ms"] if old["mean_ms"] else float("inf")
+            print(f"  {name:<28} {old['mean_ms']:>10.3f} -> {res['mean_ms']:>10.3f} ms  (x{ratio:.2f})")
+
+
+async def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="1000,10000", help="comma separated player counts, e.g. 1000,10000,100000")
+    ap.add_argument("--guilds", type=int, default=10)
+    ap.add_argument("--games", type=int, default=20, help="games per player")
+    ap.add_argument("--weeks", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--only", default=None, help="comma separated benchmark names")
+    ap.add_argument("--workdir", default=None, help="where to put the sqlite files (default: temp dir)")
+    ap.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    ap.add_argument("--baseline", default=None, help="older JSON report to compare against")
+    args = ap.parse_args(argv)
+
+    only = args.only.split(",") if args.only else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fantasy_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "runs": [],
+    }
+    for players in (int(x) for x in args.scales.split(",")):
+        scale = Scale(players=players, guilds=args.guilds, games_per_player=args.games,
+                      weeks=args.weeks, seed=args.seed)
+        print(f"{players:,} players ({args.guilds} guilds, {args.games} games each)")
+        report["runs"].append(await run_scale(scale, workdir, only))
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print(f"\nReport written to {args.out}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,187 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic data for the benchmarks.
+
+Fills an (empty) database with users, players, matches, player_games, teams, team_players
+and weekly_points shaped like the real thing. Same seed + same scale = same rows, so timings
+from two commits are comparable.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from backend.models import User, Player, Match, PlayerGame, Team, TeamPlayer, WeeklyPoints, TeamWeekState
+from backend.services.market import INITIAL_BUDGET, MAX_TEAM_SIZE
+from backend.services.pricing import _skill_score, _price_from_percentile
+
+DATA_SOURCES = ["matchmaking", "faceit", "renown", "matchmaking_competitive"]
+CHUNK = 5_000
+BASE_DISCORD_ID = 100_000_000_000_000_000
+BASE_STEAM_ID = 76_561_198_000_000_000
+
+
+@dataclass
+class Scale:
+    players: int = 1_000
+    guilds: int = 10
+    games_per_player: int = 20
+    weeks: int = 4
+    seed: int = 1234
+
+    @property
+    def teams(self) -> int:
+        # roughly one manager in five owns a team
+        return max(1, self.players // 5)
+
+
+@dataclass
+class Pool:
+    """What got generated, so the runner knows which ids/keys to benchmark against."""
+    scale: Scale
+    week_start: datetime
+    guild_ids: list[int]
+    user_ids: list[int]
+    steam_ids: list[str]
+    team_ids: list[int]
+
+
+async def _bulk(session, model, rows: list[dict]):
+    for i in range(0, len(rows), CHUNK):
+        await session.execute(insert(model), rows[i:i + CHUNK])
+
+
+async def build_pool(session, scale: Scale, week_start: datetime) -> Pool:
+    """
+    week_start is the current week key (UTC-naive, as week_bounds_naive_utc returns it).
+    Games are spread over `scale.weeks` weeks ending this week; rosters are active from the first one.
+    """
+    rng = random.Random(scale.seed)
+    guild_ids = [1_000 + g for g in range(scale.guilds)]
+    first_week = week_start - timedelta(days=7 * (scale.weeks - 1))
+
+    # users + players (one user row per player, spread over the guilds)
+    users, players = [], []
+    for i in range(scale.players):
+        discord_id = BASE_DISCORD_ID + i
+        users.append({
+            "id": i + 1,
+            "discord_id": discord_id,
+            "discord_guild_id": guild_ids[i % scale.guilds],
+            "steam_id": str(BASE_STEAM_ID + i),
+            "discord_username": f"user{i}",
+            "discord_display_name": f"User {i}",
+            "has_leetify": True,
+        })
+        players.append({
+            "id": i + 1,
+            "user_id": i + 1,
+            "handle": str(discord_id),
+            "renown_elo": rng.randint(3_000, 25_000),
+            "premier_elo": rng.randint(1_000, 33_000),
+            "faceit_elo": rng.randint(400, 3_800),
+            "leetify_l100_avg": round(rng.gauss(0.0, 1.5), 3),
+        })
+    # starting prices the way /pricing update sets them (skill score percentile), no extra rng draws
+    ranked = sorted(players, key=lambda p: _skill_score(p["faceit_elo"], p["premier_elo"], p["renown_elo"],
+                                                        p["leetify_l100_avg"]))
+    for i, p in enumerate(ranked):
+        p["price"] = _price_from_percentile(i / max(1, len(ranked) - 1))
+    await _bulk(session, User, users)
+    await _bulk(session, Player, players)
+
+    # matches: players queue in stacks of 5, each stack plays games_per_player matches together
+    n_stacks = (scale.players + 4) // 5
+    n_matches = n_stacks * scale.games_per_player
+    span_s = int(timedelta(days=7 * scale.weeks).total_seconds())
+    matches = []
+    for m in range(n_matches):
+        matches.append({
+            "id": m + 1,
+            "data_source": DATA_SOURCES[m % len(DATA_SOURCES)],
+            "source_match_id": f"synthetic-{m}",
+            "finished_at": first_week + timedelta(seconds=rng.randrange(span_s)),
+            "map_name": "de_mirage",
+            "team1_number": 2, "team1_score": 13,
+            "team2_number": 3, "team2_score": rng.randint(0, 12),
+        })
+    await _bulk(session, Match, matches)
+
+    games = []
+    for i in range(scale.players):
+        steam = str(BASE_STEAM_ID + i)
+        for g in range(scale.games_per_player):
+            m = matches[(i // 5) * scale.games_per_player + g]
+            games.append({
+                "user_id": i + 1,
+                "steam_id": steam,
+                "match_id": m["id"],
+                "match_game_id": m["source_match_id"],
+                "finished_at": m["finished_at"],
+                "data_source": m["data_source"],
+                "initial_team_number": 2 if rng.random() < 0.5 else 3,
+                "rounds_count": 24,
+                "won": rng.random() < 0.5,
+                "leetify_rating": round(rng.gauss(0.0, 0.05), 4),
+                "ct_leetify_rating": round(rng.gauss(0.0, 0.05), 4),
+                "t_leetify_rating": round(rng.gauss(0.0, 0.05), 4),
+                "total_kills": rng.randint(5, 35),
+                "total_deaths": rng.randint(5, 30),
+                "total_assists": rng.randint(0, 10),
+                "dpr": round(rng.uniform(40, 130), 1),
+                "he_foes_damage_avg": round(rng.uniform(0, 20), 1),
+                "flashbang_leading_to_kill": rng.randint(0, 4),
+                "trade_kills_succeed": rng.randint(0, 5),
+            })
+    await _bulk(session, PlayerGame, games)
+
+    # teams: owners are the first `teams` users, rosters drawn from the same guild
+    by_guild: dict[int, list[int]] = {}
+    for u in users:
+        by_guild.setdefault(u["discord_guild_id"], []).append(u["id"])
+
+    teams, team_players, states = [], [], []
+    for t in range(scale.teams):
+        owner = users[t]
+        guild_id = owner["discord_guild_id"]
+        teams.append({"id": t + 1, "owner_id": owner["id"], "name": f"Team {t}", "guild_id": guild_id,
+                      "build_complete": True})
+        for pid in rng.sample(by_guild[guild_id], min(MAX_TEAM_SIZE, len(by_guild[guild_id]))):
+            team_players.append({
+                "team_id": t + 1,
+                "player_id": pid,
+                "effective_from_week": first_week,
+                "effective_to_week": None,
+            })
+        for w in range(scale.weeks):
+            states.append({"guild_id": guild_id, "team_id": t + 1,
+                           "week_start": first_week + timedelta(days=7 * w),
+                           "budget_remaining": INITIAL_BUDGET - rng.randint(0, 25_000), "transfers_used": 0})
+    await _bulk(session, Team, teams)
+    await _bulk(session, TeamPlayer, team_players)
+    await _bulk(session, TeamWeekState, states)
+
+    # weekly points for every user, every week
+    computed_at = week_start + timedelta(days=1)
+    points = []
+    for w in range(scale.weeks):
+        ws = first_week + timedelta(days=7 * w)
+        for u in users:
+            score = max(0.0, rng.gauss(45, 12))
+            points.append({
+                "week_start": ws, "guild_id": u["discord_guild_id"], "user_id": u["id"], "ruleset_id": 1,
+                "computed_at": computed_at, "sample_size": rng.randint(1, 20), "wins": rng.randint(0, 10),
+                "base_avg": score, "weekly_score": score,
+            })
+    await _bulk(session, WeeklyPoints, points)
+
+    await session.flush()
+    return Pool(
+        scale=scale,
+        week_start=week_start,
+        guild_ids=guild_ids,
+        user_ids=[u["id"] for u in users],
+        steam_ids=[u["steam_id"] for u in users],
+        team_ids=[t["id"] for t in teams],
+    )
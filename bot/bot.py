@@ -12,6 +12,8 @@ from discord import app_commands
 from dotenv import load_dotenv
 
 from backend.db import init_db
+from backend.services.schema import ensure_schema
+from bot import charts
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -43,7 +45,8 @@ def setup_logging():
     root.addHandler(ch)
     root.addHandler(fh)
 
-setup_logging()
+# Nothing at module level may start anything: chart workers (bot/charts.py) are spawned processes
+# that re-import this module as __mp_main__, so logging and the bot are set up in main()
 log = logging.getLogger("fantasy-bot")
 
 intents = discord.Intents.all()
@@ -53,6 +56,7 @@ intents.members = True
 class FantasyBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix="!", intents=intents)
+        self.tree.error(self.on_app_command_error)
 
     async def load_all_cogs(self):
         import os
@@ -71,6 +75,7 @@ class FantasyBot(commands.Bot):
     async def setup_hook(self):
         # init DB first
         await init_db()
+        await ensure_schema()       # columns/indexes added to existing tables since the DB was created
 
         # load cogs
         await self.load_all_cogs()
@@ -86,75 +91,70 @@ class FantasyBot(commands.Bot):
         except Exception:
             log.exception("Slash command sync failed")
 
+    async def close(self):
+        charts.shutdown()           # chart worker processes
+        await super().close()
 
-bot = FantasyBot()
-
-
-@bot.event
-async def on_ready():
-    log.info("READY: %s#%s (latency %.3fs)", bot.user.name, bot.user.discriminator, bot.latency)
+    async def on_ready(self):
+        log.info("READY: %s#%s (latency %.3fs)", self.user.name, self.user.discriminator, self.latency)
 
+    # Command logging
+    async def on_interaction(self, interaction: discord.Interaction):
+        """
+        Logs every *attempted* application command invocation.
+        Then lets discord.py process it normally.
+        """
+        try:
+            if interaction.type == discord.InteractionType.application_command and interaction.command:
+                user = f"{interaction.user} ({interaction.user.id})"
+                guild = f"{interaction.guild.name}" if interaction.guild else "DM"
+                channel = f"{interaction.channel} ({getattr(interaction.channel, 'id', 'n/a')})"
+                cmd = interaction.command.qualified_name  # e.g. "team show"
+                log.info("RUN: %s | %s | %s | /%s", user, guild, channel, cmd)
+        except Exception:
+            log.exception("Failed pre-invoke log")
+        return True
 
-# Command logging
-@bot.event
-async def on_interaction(interaction: discord.Interaction):
-    """
-    Logs every *attempted* application command invocation.
-    Then lets discord.py process it normally.
-    """
-    try:
-        if interaction.type == discord.InteractionType.application_command and interaction.command:
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: app_commands.Command):
+        """Logs successful completions."""
+        try:
             user = f"{interaction.user} ({interaction.user.id})"
             guild = f"{interaction.guild.name}" if interaction.guild else "DM"
             channel = f"{interaction.channel} ({getattr(interaction.channel, 'id', 'n/a')})"
-            cmd = interaction.command.qualified_name  # e.g. "team show"
-            log.info("RUN: %s | %s | %s | /%s", user, guild, channel, cmd)
-    except Exception:
-        log.exception("Failed pre-invoke log")
-    return True
-
-
-@bot.event
-async def on_app_command_completion(interaction: discord.Interaction, command: app_commands.Command):
-    """Logs successful completions."""
-    try:
-        user = f"{interaction.user} ({interaction.user.id})"
-        guild = f"{interaction.guild.name}" if interaction.guild else "DM"
-        channel = f"{interaction.channel} ({getattr(interaction.channel, 'id', 'n/a')})"
-        cmd = command.qualified_name
-        log.info("OK:  %s | %s | %s | /%s", user, guild, channel, cmd)
-    except Exception:
-        log.exception("Failed logging completion")
-
-
-@bot.tree.error
-async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    """Logs slash command errors + traceback and notifies the user generically."""
-    try:
-        user = f"{interaction.user} ({interaction.user.id})" if interaction and interaction.user else "n/a"
-        guild = f"{interaction.guild.name} ({interaction.guild_id})" if interaction and interaction.guild else "DM/n-a"
-        channel = f"{interaction.channel} ({getattr(interaction.channel, 'id', 'n/a')})" if interaction else "n/a"
-        cmd = getattr(interaction.command, "qualified_name", "unknown") if interaction else "unknown"
-        log.error("ERR: %s | %s | %s | /%s | %r", user, guild, channel, cmd, error)
-        tb = "".join(traceback.format_exception(type(error), error, error.__traceback__))
-        log.error("TRACE:\n%s", tb)
-
-        # user-facing message
-        if interaction:
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("Something went wrong running that command. I've stored it in the logs and if alfie isn't lazy he'll check (it'll never be looked at)", ephemeral=True)
-                else:
-                    await interaction.followup.send("Something went wrong running that command. I've stored it in the logs and if alfie isn't lazy he'll check (it'll never be looked at)", ephemeral=True)
-            except Exception:
-                pass
-    except Exception:
-        log.exception("Failed logging app command error")
+            cmd = command.qualified_name
+            log.info("OK:  %s | %s | %s | /%s", user, guild, channel, cmd)
+        except Exception:
+            log.exception("Failed logging completion")
+
+    async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        """Logs slash command errors + traceback and notifies the user generically."""
+        try:
+            user = f"{interaction.user} ({interaction.user.id})" if interaction and interaction.user else "n/a"
+            guild = f"{interaction.guild.name} ({interaction.guild_id})" if interaction and interaction.guild else "DM/n-a"
+            channel = f"{interaction.channel} ({getattr(interaction.channel, 'id', 'n/a')})" if interaction else "n/a"
+            cmd = getattr(interaction.command, "qualified_name", "unknown") if interaction else "unknown"
+            log.error("ERR: %s | %s | %s | /%s | %r", user, guild, channel, cmd, error)
+            tb = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+            log.error("TRACE:\n%s", tb)
+
+            # user-facing message
+            if interaction:
+                try:
+                    if not interaction.response.is_done():
+                        await interaction.response.send_message("Something went wrong running that command. I've stored it in the logs and if alfie isn't lazy he'll check (it'll never be looked at)", ephemeral=True)
+                    else:
+                        await interaction.followup.send("Something went wrong running that command. I've stored it in the logs and if alfie isn't lazy he'll check (it'll never be looked at)", ephemeral=True)
+                except Exception:
+                    pass
+        except Exception:
+            log.exception("Failed logging app command error")
 
 
 def main():
     if not TOKEN:
         raise RuntimeError("DISCORD_TOKEN not set in .env")
+    setup_logging()
+    bot = FantasyBot()
     asyncio.run(bot.start(TOKEN))
 
 
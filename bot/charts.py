@@ -0,0 +1,149 @@
+# bot/charts.py
+"""
+Chart rendering off the event loop.
+
+Building a matplotlib figure and savefig() at dpi=200 takes a few hundred ms of pure CPU, which in
+the bot's coroutine stalls the gateway heartbeat and every other command. Renders go to a small
+process pool instead (processes, not threads: matplotlib holds the GIL while it draws):
+
+  - at most CHART_QUEUE_SIZE renders waiting or running; past that ChartsBusy is raised and the
+    command says so, rather than piling up work nobody will wait for
+  - the PNG bytes are kept in an LRU keyed by what the chart was drawn from (the caller includes
+    the latest computed_at, so a rescore gives a new key); a repeat request is a dict lookup
+  - the same key requested while it's rendering waits for that render instead of starting another
+
+This module imports no discord / database code at the top so worker processes start quickly.
+Spawned workers also re-import the main module (as __mp_main__), which is why bot/bot.py only
+sets up logging and builds the bot inside main().
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Hashable
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_QUEUE_SIZE = int(os.getenv("CHART_QUEUE_SIZE", "8"))     # renders waiting or running
+CHART_CACHE_SIZE = 128                                          # PNGs kept (~50-100 KB each)
+CHART_DPI = 200
+
+# [(label, [(week_start, points), ...]), ...] one line per series
+Series = list[tuple[str, list[tuple[datetime, float]]]]
+
+
+CHARTS_BUSY = "Lots of graphs being drawn right now, try again in a few seconds."
+
+
+class ChartsBusy(Exception):
+    """Too many renders queued; try again in a moment."""
+
+
+_pool: ProcessPoolExecutor | None = None
+_pending = 0
+_png_cache: "OrderedDict[Hashable, bytes]" = OrderedDict()
+_inflight: dict[Hashable, asyncio.Future] = {}
+
+
+def _init_worker() -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401  (pay the import once per worker, not on the first chart)
+
+
+def render_weekly(title: str, series: Series) -> bytes:
+    """Weekly points line chart as PNG bytes. Runs in a worker process."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    fig, ax = plt.subplots(figsize=(8, 4), dpi=CHART_DPI)
+    try:
+        for label, points in series:
+            ax.plot([w for w, _ in points], [p for _, p in points], marker="o", linewidth=2, label=label)
+        ax.set_title(title, pad=10)
+        ax.set_xlabel("Week Start")
+        ax.set_ylabel("Points")
+        ax.grid(True, alpha=0.3)
+        if len(series) > 1:
+            ax.legend(loc="best", fontsize="small")
+
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+        fig.autofmt_xdate()
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: a forked child would inherit the event loop, sockets and DB connections
+        _pool = ProcessPoolExecutor(
+            max_workers=CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _pool
+
+
+def _remember(key: Hashable, png: bytes) -> None:
+    _png_cache[key] = png
+    _png_cache.move_to_end(key)
+    while len(_png_cache) > CHART_CACHE_SIZE:
+        _png_cache.popitem(last=False)
+
+
+async def weekly_chart(key: Hashable, title: str, series: Series) -> bytes:
+    """
+    PNG for `series`, from the cache when `key` has been drawn before, else rendered in the pool.
+    `key` must change whenever the data or title does. Raises ChartsBusy when the queue is full.
+    """
+    global _pool, _pending
+    png = _png_cache.get(key)
+    if png is not None:
+        _png_cache.move_to_end(key)
+        return png
+    if key in _inflight:
+        return await asyncio.shield(_inflight[key])
+    if _pending >= CHART_QUEUE_SIZE:
+        raise ChartsBusy()
+
+    loop = asyncio.get_running_loop()
+    fut = _inflight[key] = loop.create_future()
+    _pending += 1
+    try:
+        png = await loop.run_in_executor(_get_pool(), render_weekly, title, series)
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _pool = None                # a worker died; start a fresh pool on the next render
+        fut.set_exception(e)
+        fut.exception()                 # retrieved, so nobody waiting is fine too
+        raise
+    else:
+        _remember(key, png)
+        fut.set_result(png)
+        return png
+    finally:
+        _pending -= 1
+        del _inflight[key]
+
+
+def shutdown() -> None:
+    """Stop the worker processes (bot shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
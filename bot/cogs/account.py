@@ -3,10 +3,11 @@ from discord import app_commands
 from discord.ext import commands
 from discord.utils import escape_mentions
 import re
+from datetime import datetime, timezone
 
 from backend.db import SessionLocal
 from backend.services.repo import set_user_steam_id, remove_user_steam_id, get_or_create_player, get_or_create_user, create_user
-from backend.services.leetify_api import leetify_profile_exists
+from backend.services.profile_cache import cached_profile_exists, warm_profiles, save_profiles
 
 
 class Account(commands.Cog):
@@ -63,7 +64,12 @@ class Account(commands.Cog):
                 await set_user_steam_id(session, discord_id, steamid, guild_id=guild_id)
                 player, created = await get_or_create_player(session, discord_id)
 
-        exists = await leetify_profile_exists(steamid)
+        # Shared profile cache (same one /pricing update reads), so re-registering doesn't re-hit Leetify.
+        # The Leetify call runs outside any transaction; a fresh answer is saved with the write below.
+        async with SessionLocal() as session:
+            await warm_profiles(session, [steamid])
+        fetched_from = datetime.now(timezone.utc)
+        exists = await cached_profile_exists(steamid)
 
         if exists is not None:
             async with SessionLocal() as session:
@@ -76,6 +82,7 @@ class Account(commands.Cog):
                                                     discord_display_name=discord_display_name
                                                     )
                     user.has_leetify = bool(exists)
+                    await save_profiles(session, [steamid], since=fetched_from)
 
         msg = f"Registered! Linked SteamID `{steamid}` for **{discord_display_name}**."
         if created:
@@ -12,13 +12,33 @@ from sqlalchemy.sql import func as sqlfunc
 from zoneinfo import ZoneInfo
 
 from backend.models import User, WeeklyPoints
-from backend.services.leaderboard import get_team_leaderboard
+from backend.services.leaderboard import read_player_leaderboard, read_team_page, \
+    read_closed_player_leaderboard, read_closed_team_leaderboard, read_global_leaderboard
+from backend.services.history import week_keys
 from backend.services.leetify_api import current_week_start_norm
 from bot.cogs.stats_refresh import week_bounds_naive_utc
+from bot.utils import KeysetPager, resolve_names
 
 
 
 NO_PINGS = discord.AllowedMentions.none()
+MAX_WEEKS_AGO = 52
+
+def _week_key(weeks_ago: int) -> datetime:
+    """Week key (UTC-naive, like week_bounds_naive_utc) of this week or `weeks_ago` weeks back."""
+    if weeks_ago <= 0:
+        return week_bounds_naive_utc("Europe/London")[0]
+    return week_keys(weeks_ago + 1)[0]
+
+def _movement(rank: int, prev_rank: int | None) -> str:
+    """▲n / ▼n places since the last update that changed this entry, = if it held, blank if it's new."""
+    if prev_rank is None:
+        return ""
+    if prev_rank > rank:
+        return f"▲{prev_rank - rank}"
+    if prev_rank < rank:
+        return f"▼{rank - prev_rank}"
+    return "="
 
 def _fmt_1dp(x) -> str:
     try:
@@ -26,25 +46,6 @@ def _fmt_1dp(x) -> str:
     except Exception:
         return "0.0"
 
-async def _resolve_display_name_quick(guild, discord_id: int, fallback: str | None = None) -> str:
-    """
-    Fast, no-ping resolver for a Discord user’s display name.
-    Tries cache first, then fetch; falls back to provided text.
-    """
-    m = guild.get_member(discord_id)
-    if m:
-        return m.display_name
-    try:
-        m = await guild.fetch_member(discord_id)
-        if m:
-            return m.display_name
-    except Exception:
-        pass
-    return fallback or str(discord_id)
-
-
-
-
 class Leaderboards(commands.Cog):
     """Scoring config & queries: view, set weights/multipliers, preview points."""
 
@@ -55,10 +56,12 @@ class Leaderboards(commands.Cog):
 
     @leaderboard.command(name="player", description="Show this week's players leaderboard")
     @app_commands.describe(
-        limit="How many players to show (max 25)",
+        limit="Players per page (max 25)",
         all_guilds="Include players from ALL guilds (default: only this server)",
+        weeks_ago="Show a past week instead (1 = last week)",
     )
-    async def player(self, interaction: discord.Interaction, limit: int = 10, all_guilds: bool = False):
+    async def player(self, interaction: discord.Interaction, limit: int = 10, all_guilds: bool = False,
+                     weeks_ago: app_commands.Range[int, 0, MAX_WEEKS_AGO] = 0):
         guild = interaction.guild
         guild_id = interaction.guild_id
         if not guild_id and not all_guilds:
@@ -68,129 +71,76 @@ class Leaderboards(commands.Cog):
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=False)
 
+        page_size = max(1, min(int(limit), 25))
 
+        # canonical week key, same one the scoring runs write
+        week_start_utc_naive = _week_key(weeks_ago)
+        print(f'Week start: {week_start_utc_naive}')
 
-        # same week key I already use
-        week_norm = current_week_start_norm(datetime.now()) - timedelta(hours=1, minutes=1)
-        week_start_utc_naive, week_end_utc_naive = week_bounds_naive_utc("Europe/London")
-        print(f'Week norm: {week_norm}')
-        print(f'Week Norm 2: {week_start_utc_naive}')
-
-
-        async with SessionLocal() as session:
-            async with session.begin():
-                if not all_guilds:
-                    # Latest row per *user* in THIS guild
-                    latest = (
-                        select(
-                            WeeklyPoints.user_id,
-                            func.max(WeeklyPoints.computed_at).label("latest_ts"),
-                        )
-                        .where(
-                            WeeklyPoints.guild_id == guild_id,
-                            WeeklyPoints.week_start == week_norm,
-                            WeeklyPoints.weekly_score.isnot(None),
-                            WeeklyPoints.computed_at.isnot(None),
-                        )
-                        .group_by(WeeklyPoints.user_id)
-                    ).subquery()
-
-                    q = (
-                        select(
-                            WeeklyPoints.user_id,
-                            WeeklyPoints.weekly_score,
-                            WeeklyPoints.sample_size,
-                            User.discord_id,
+        scope_title = "All Guilds" if all_guilds else "Current Server"
+        if weeks_ago:
+            scope_title += f" — Week starting {week_start_utc_naive:%Y-%m-%d}"
+
+        async def fetch(cursor, page: int):
+            """One page; cursor is the last row's rank."""
+            async with SessionLocal() as session:
+                async with session.begin():
+                    if not all_guilds:
+                        # past weeks never change: served from the closed-week cache
+                        read = read_closed_player_leaderboard if weeks_ago else read_player_leaderboard
+                        ranked = await read(
+                            session, guild_id, week_start_utc_naive, page_size + 1, after_rank=cursor or 0
                         )
-                        .join(latest, and_(
-                            WeeklyPoints.user_id == latest.c.user_id,
-                            WeeklyPoints.computed_at == latest.c.latest_ts,
-                        ))
-                        .join(User, User.id == WeeklyPoints.user_id, isouter=True)
-                        .order_by(WeeklyPoints.weekly_score.desc())
-                        .limit(limit * 2)
-                    )
-                    raw = (await session.execute(q)).all()
-                    rows = [(did, score, (games or 0)) for (_uid, score, games, did) in raw]
+                        rows = [(r.rank, r.discord_id, r.score, r.games, r.prev_rank, r.rank) for r in ranked]
 
-                else:
-                    # ALL guilds: dedupe by *discord_id* (a user can exist in multiple guilds)
-                    base = (
-                        select(
-                            User.discord_id.label("discord_id"),
-                            WeeklyPoints.weekly_score.label("score"),
-                            func.coalesce(WeeklyPoints.sample_size, 0).label("games"),
-                            func.row_number().over(
-                                partition_by=User.discord_id,
-                                order_by=WeeklyPoints.computed_at.desc(),
-                            ).label("rn"),
-                        )
-                        .join(User, User.id == WeeklyPoints.user_id)
-                        .where(
-                            WeeklyPoints.week_start == week_norm,
-                            WeeklyPoints.weekly_score.isnot(None),
-                            WeeklyPoints.computed_at.isnot(None),
+                    else:
+                        # ALL guilds: global_leaderboard is already deduped by discord_id and ranked
+                        ranked = await read_global_leaderboard(
+                            session, week_start_utc_naive, page_size + 1, after_rank=cursor or 0
                         )
-                    ).subquery()
-
-                    q = (
-                        select(base.c.discord_id, base.c.score, base.c.games)
-                        .where(base.c.rn == 1)
-                        .order_by(base.c.score.desc())
-                        .limit(limit * 2)
-                    )
-                    rows = (await session.execute(q)).all()  # [(discord_id, score)]
-
-        if not rows:
-            await interaction.followup.send(
-                f"No scores for week starting {week_norm:%Y-%m-%d}.", allowed_mentions=NO_PINGS
-            )
-            return
+                        rows = [(r.rank, r.discord_id, r.score, r.games, r.prev_rank, r.rank) for r in ranked]
 
-        # Final safety dedupe by discord_id, then cap to limit
-        seen, unique = set(), []
-        for did, score, games in rows:
-            if did is None or did in seen:
-                continue
-            seen.add(did)
-            unique.append((did, score, int(games or 0)))
-            if len(unique) >= limit:
-                break
-
-        def fmt_1dp(x) -> str:
-            try:
-                return f"{float(x):.1f}"
-            except Exception:
-                return "0.0"
-
-        header = f"{'#':<2}  {'Player':<24} {'Score':>7} {'Games':>5}"
-        sep = f"{'–' * 2}  {'–' * 24} {'–' * 7} {'–' * 5}"
-        lines = ["```", header, sep]
-
-        for rank, (discord_id, score, games) in enumerate(unique, start=1):
-            name = await _resolve_display_name_quick(guild, int(discord_id), fallback=str(discord_id))
-            name = "@" + escape_mentions(name)
-            lines.append(f"{rank:<2}  {name[:24]:<24} {fmt_1dp(score):>7} {games:>5}")
-
-        lines.append("```")
+            more = len(rows) > page_size
+            rows = rows[:page_size]
 
-        scope_title = "All Guilds" if all_guilds else "Current Server"
-        embed = discord.Embed(
-            title=f"Leaderboard — {scope_title}",
-            description="\n".join(lines),
-            type="rich",
-        )
-        await interaction.followup.send(embed=embed, allowed_mentions=NO_PINGS)
+            if not rows:
+                embed = discord.Embed(
+                    title=f"Leaderboard — {scope_title}",
+                    description=f"No scores for week starting {week_start_utc_naive:%Y-%m-%d}.",
+                )
+                return embed, None
+
+            header = f"{'#':<3} {'':<4} {'Player':<24} {'Score':>7} {'Games':>5}"
+            sep = f"{'–' * 3} {'–' * 4} {'–' * 24} {'–' * 7} {'–' * 5}"
+            lines = ["```", header, sep]
+            names = await resolve_names(guild, [r[1] for r in rows])
+            for rank, discord_id, score, games, prev_rank, _key in rows:
+                name = "@" + escape_mentions(names[int(discord_id)])
+                lines.append(f"{rank:<3} {_movement(rank, prev_rank):<4} {name[:24]:<24} "
+                             f"{_fmt_1dp(score):>7} {int(games or 0):>5}")
+            lines.append("```")
+
+            embed = discord.Embed(
+                title=f"Leaderboard — {scope_title}",
+                description="\n".join(lines),
+                type="rich",
+            )
+            embed.set_footer(text=f"Page {page + 1} · ▲▼ places moved since the last update")
+            return embed, (rows[-1][5] if more else None)
+
+        await KeysetPager(fetch, author_id=interaction.user.id).start(interaction)
 
 
     @leaderboard.command(name="teams", description="Show this week's team leaderboard")
-    @app_commands.describe(limit="Number of teams to show (max 25)",
-                           top="Also show top N contributors per team (0 to hide)")
-    async def leaderboard_teams(self, interaction: discord.Interaction, limit: int = 10, top: int = 0):
+    @app_commands.describe(limit="Teams per page (max 25)",
+                           top="Also show top N contributors per team (0 to hide)",
+                           weeks_ago="Show a past week instead (1 = last week)")
+    async def leaderboard_teams(self, interaction: discord.Interaction, limit: int = 10, top: int = 0,
+                                weeks_ago: app_commands.Range[int, 0, MAX_WEEKS_AGO] = 0):
         """
            Displays the top teams in the server based on this week's fantasy points.
-           Reads WeeklyPoints for the current game week and sums by team,
-           honoring TeamPlayer effective windows.
+           Reads the ranked team_leaderboard rows for the current game week
+           (written after scoring runs from the locked rosters), one page at a time.
         """
         guild = interaction.guild
         guild_id = interaction.guild_id
@@ -201,82 +151,76 @@ class Leaderboards(commands.Cog):
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=False)
 
-        limit = max(1, min(int(limit), 25))
+        page_size = max(1, min(int(limit), 25))
         top = max(0, min(int(top), 5))  # cap tiny to keep output readable
 
         # Using new function for getting week bounds 23:00 Sunday
-        week_norm, week_end_utc_naive = week_bounds_naive_utc("Europe/London")
-
-        limit = max(1, min(int(limit), 25))
-
-        # Fetch aggregated leaderboard
-        async with SessionLocal() as session:
-            async with session.begin():
-                data = await get_team_leaderboard(
-                    session=session,
-                    guild_id=guild_id,
-                    week_start_norm=week_norm,
-                    limit=limit,
-                    offset=0,
-                )
-
-                # If showing top contributors, map internal user_id -> discord_id for mentions
-                uid_to_discord = {}
-                if top > 0 and data:
-                    user_ids = {uid for row in data for (uid, _) in row["players"][:top]}
-                    if user_ids:
-                        res = await session.execute(
-                            select(User.id, User.discord_id).where(User.id.in_(user_ids))
-                        )
-                        uid_to_discord = dict(res.tuples().all())
+        week_norm = _week_key(weeks_ago)
+        ws_label = week_norm.strftime("%Y-%m-%d")
 
-        if not data:
-            ws_label = week_norm.strftime("%Y-%m-%d")
-            await interaction.followup.send(
-                f"No team scores for week starting {ws_label}.",
-                allowed_mentions=NO_PINGS,
+        async def fetch(cursor, page: int):
+            """One page of teams; cursor is the last team's rank."""
+            async with SessionLocal() as session:
+                async with session.begin():
+                    if weeks_ago:
+                        # past week: ranks and contributors both come from the closed-week cache
+                        data = await read_closed_team_leaderboard(session, guild_id, week_norm, page_size + 1,
+                                                                  after_rank=cursor or 0)
+                        more = len(data) > page_size
+                        data = data[:page_size]
+                        contributors = {row.team_id: row.top[:top] for row in data if top and row.top}
+                    else:
+                        # ranks and each team's top contributors in one query
+                        data = await read_team_page(session, guild_id, week_norm, page_size + 1,
+                                                    after_rank=cursor or 0, top=top)
+                        more = len(data) > page_size
+                        data = data[:page_size]
+                        contributors = {row.team_id: row.top for row in data if row.top}
+
+            if not data:
+                return discord.Embed(
+                    title=f"Team Leaderboard — Week starting {ws_label}",
+                    description=f"No team scores for week starting {ws_label}.",
+                    color=discord.Color.gold(),
+                ), None
+
+            # Build a monospace table like your players command
+            header = f"{'#':<3} {'':<4} {'Team':<24} {'Score':>7}  {'Owner':<10}"
+            sep = f"{'–' * 3} {'–' * 4} {'–' * 24} {'–' * 7}  {'–' * 10}"
+            lines = ["```", header, sep]
+            names = await resolve_names(
+                guild,
+                [row.owner_discord_id for row in data] + [did for ps in contributors.values() for did, _ in ps],
             )
-            return
 
-        # Build a monospace table like your players command
-        header = f"{'#':<2}  {'Team':<24} {'Score':>7}  {'Owner':<10}"
-        sep = f"{'–' * 2}  {'–' * 24} {'–' * 7}  {'–' * 10}"
-        lines = ["```", header, sep]
-
-        for rank, row in enumerate(data, start=1):
-            team = row["team_name"][:24]
-            score = _fmt_1dp(row["points"])
-            if row.get("owner_discord_id"):
-                owner_name = await _resolve_display_name_quick(guild, int(row["owner_discord_id"]),
-                                                               fallback=str(row["owner_discord_id"]))
-                owner_str = "@" + owner_name
-            else:
-                owner_str = "—"
-            lines.append(f"{rank:<2}  {team:<24} {score:>7}  {owner_str[:24]:<10}")
-
-            # Optional: small indented line with top N contributors
-            if top > 0 and row["players"]:
-                tops = []
-                for (uid, pts) in row["players"][:top]:
-                    did = uid_to_discord.get(uid)
-                    if did:
-                        name = await _resolve_display_name_quick(guild, int(did), fallback=str(did))
-                        mentionish = "@" + name
-                    else:
-                        mentionish = f"User {uid}"
-                    tops.append(f"{mentionish} {float(pts):.1f}")
-                if tops:
+            for row in data:
+                team = row.team_name[:24]
+                score = _fmt_1dp(row.points)
+                if row.owner_discord_id:
+                    owner_str = "@" + names[int(row.owner_discord_id)]
+                else:
+                    owner_str = "—"
+                lines.append(f"{row.rank:<3} {_movement(row.rank, row.prev_rank):<4} {team:<24} {score:>7}  "
+                             f"{owner_str[:24]:<10}")
+
+                # Optional: small indented line with top N contributors
+                if contributors.get(row.team_id):
+                    tops = []
+                    for (did, pts) in contributors[row.team_id]:
+                        tops.append(f"@{names[int(did)]} {float(pts):.1f}")
                     lines.append(f"    Top: " + ", ".join(tops))
 
-        lines.append("```")
+            lines.append("```")
 
-        ws_label = week_norm.strftime("%Y-%m-%d")
-        embed = discord.Embed(
-            title=f"Team Leaderboard — Week starting {ws_label}",
-            description="\n".join(lines),
-            color=discord.Color.gold(),
-        )
-        await interaction.followup.send(embed=embed, allowed_mentions=NO_PINGS)
+            embed = discord.Embed(
+                title=f"Team Leaderboard — Week starting {ws_label}",
+                description="\n".join(lines),
+                color=discord.Color.gold(),
+            )
+            embed.set_footer(text=f"Page {page + 1} · ▲▼ places moved since the last update")
+            return embed, (data[-1].rank if more else None)
+
+        await KeysetPager(fetch, author_id=interaction.user.id).start(interaction)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Leaderboards(bot))
\ No newline at end of file
@@ -6,16 +6,13 @@ from typing import Optional
 
 import io
 
-import matplotlib
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-
 
 from backend.db import SessionLocal
+from backend.services.history import points_series
+from bot.charts import weekly_chart, ChartsBusy, CHARTS_BUSY
 from bot.cogs.leaderboard import NO_PINGS
 from bot.cogs.stats_refresh import week_bounds_naive_utc, aggregate_week_from_db
 
-matplotlib.use("Agg")
 from sqlalchemy import select, func, and_
 from backend.models import User, WeeklyPoints, PlayerStats
 
@@ -49,69 +46,83 @@ class Players(commands.Cog):
                     await interaction.followup.send(f'{member.mention} is not registered in this server')
                     return
 
-                latest = (
-                    select(
-                    WeeklyPoints.week_start,
-                        func.max(WeeklyPoints.computed_at).label("latest_ts"),
-                    )
-                    .where(
-                        WeeklyPoints.guild_id == guild_id,
-                        WeeklyPoints.user_id == user_id,
-                        WeeklyPoints.weekly_score.isnot(None),
-                        WeeklyPoints.computed_at.isnot(None),
-                    )
-                    .group_by(WeeklyPoints.week_start)
-                ).subquery()
-
-                q = (
-                    select(WeeklyPoints.week_start, WeeklyPoints.weekly_score)
-                    .join(latest,
-                          and_(
-                              WeeklyPoints.week_start == latest.c.week_start,
-                              WeeklyPoints.computed_at == latest.c.latest_ts,
-                          ),
-                    )
-                    .where(
-                        WeeklyPoints.guild_id == guild_id,
-                        WeeklyPoints.user_id == user_id,
-                    )
-                    .order_by(WeeklyPoints.week_start.desc())
-                )
-                pts = (await session.execute(q)).all()
-
-                if not pts:
-                    await interaction.followup.send(f'No weekly points for {member.mention}')
-                    return
+                series = (await points_series(session, guild_id, [user_id])).get(user_id)
 
-                weeks = [ws for (ws,_) in pts]
-                scores = [float(s) for (_,s) in pts]
+        if not series:
+            await interaction.followup.send(f'No weekly points for {member.mention}')
+            return
 
-                fig, ax = plt.subplots(figsize=(8, 4),dpi=200)
-                ax.plot(weeks,scores, marker="o", linewidth=2)
-                ax.set_title(f'Weekly Points | {member.display_name}', pad=10)
-                ax.set_xlabel('Week Start')
-                ax.set_ylabel('Points')
-                ax.grid(True, alpha=0.3)
+        title = f'Weekly Points | {member.display_name}'
+        version, points = series
+        # a new scoring run changes the latest computed_at, so it's a new chart
+        key = ("weekly", guild_id, user_id, version, title)
+        try:
+            png = await weekly_chart(key, title, [(member.display_name, points)])
+        except ChartsBusy:
+            await interaction.followup.send(CHARTS_BUSY)
+            return
 
-                ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-                ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
-                fig.autofmt_xdate()
+        file = discord.File(io.BytesIO(png), filename="weekly_points.png")
+        embed = discord.Embed(
+            title=title,
+            description=f'Latest scores per gameweek',
+            colour=discord.Colour.green(),
+        )
+        embed.set_image(url="attachment://weekly_points.png")
+        await interaction.followup.send(file=file, embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @player.command(name="compare", description="Weekly points of several players on one chart")
+    @app_commands.describe(
+        member1="Player (@mention)", member2="Player (@mention)", member3="Player (optional)",
+        member4="Player (optional)", member5="Player (optional)",
+    )
+    async def compare(self, interaction: discord.Interaction, member1: discord.User, member2: discord.User,
+                      member3: Optional[discord.User] = None, member4: Optional[discord.User] = None,
+                      member5: Optional[discord.User] = None):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            await interaction.response.send_message("Use this command in a server")
+            return
+        members = list({m.id: m for m in (member1, member2, member3, member4, member5) if m}.values())
+        await interaction.response.defer(ephemeral=False, thinking=True)
 
-                fig.tight_layout()
+        async with SessionLocal() as session:
+            async with session.begin():
+                user_ids = dict((await session.execute(
+                    select(User.discord_id, User.id).where(
+                        User.discord_id.in_([int(m.id) for m in members]),
+                        User.discord_guild_id == guild_id,
+                    )
+                )).all())
+                # every member's line in one query (or none, for lines cached since their last rescore)
+                lines = await points_series(session, guild_id, list(user_ids.values()))
+
+        plotted = [m for m in members if user_ids.get(m.id) in lines]
+        missing = [m for m in members if m not in plotted]
+        if not plotted:
+            await interaction.followup.send("None of those players have weekly points in this server.",
+                                            allowed_mentions=NO_PINGS)
+            return
 
-                buf = io.BytesIO()
-                fig.savefig(buf, format="png", bbox_inches="tight")
-                plt.close(fig)
-                buf.seek(0)
+        title = "Weekly Points | " + " vs ".join(m.display_name for m in plotted)
+        series = [(m.display_name, lines[user_ids[m.id]][1]) for m in plotted]
+        key = ("compare", guild_id, tuple((user_ids[m.id], lines[user_ids[m.id]][0]) for m in plotted), title)
+        try:
+            png = await weekly_chart(key, title, series)
+        except ChartsBusy:
+            await interaction.followup.send(CHARTS_BUSY)
+            return
 
-                file = discord.File(buf, filename="weekly_points.png")
-                embed = discord.Embed(
-                    title=f'Weekly Points | {member.display_name}',
-                    description=f'Latest scores per gameweek',
-                    colour=discord.Colour.green(),
-                )
-                embed.set_image(url="attachment://weekly_points.png")
-                await interaction.followup.send(file=file, embed=embed, allowed_mentions=discord.AllowedMentions.none())
+        file = discord.File(io.BytesIO(png), filename="compare_points.png")
+        embed = discord.Embed(
+            title=title[:256],
+            description="Latest scores per gameweek",
+            colour=discord.Colour.green(),
+        )
+        if missing:
+            embed.set_footer(text="No points yet: " + ", ".join(m.display_name for m in missing))
+        embed.set_image(url="attachment://compare_points.png")
+        await interaction.followup.send(file=file, embed=embed, allowed_mentions=NO_PINGS)
 
     # @player.command(name="remove")
     # async def remove(self, interaction: discord.Interaction, name: str):
@@ -3,14 +3,18 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from sqlalchemy import select, cast, BigInteger
+from typing import Optional
+
+from sqlalchemy import select
 from backend.db import SessionLocal
 
 
-from backend.models import Player, User, PlayerStats
-from backend.services.pricing import refresh_one_player, compute_and_persist_prices
-from backend.services.repo import get_or_create_player
 from backend.models import User
+from backend.services.pricing import refresh_all_players, compute_and_persist_prices, price_diff_pages, GAMMA, \
+    price_page
+from backend.services.repo import get_or_create_player
+from backend.services.market import PRICE_POOL
+from bot.utils import KeysetPager
 
 
 
@@ -28,13 +32,14 @@ class Pricing(commands.Cog):
             Admin Only
             Refreshes ratings and recalculates players pricing
 
-            Iterates over all entries in the 'player' table.
-            For each, it runs refresh_one_player() which updates their current ratings (Leetify, prem etc)
+            Resolves the distinct steam ids behind the 'player' table and runs refresh_all_players(),
+            which fetches each steam account once and updates their current ratings (Leetify, prem etc)
             Once all refreshed it calls compute_and_persist_prices() to recalculate fantasy prices based on rating percentiles
+            (global pool and every guild pool in the same pass)
 
             Writes to via:
-                refresh_one_player(): Player, PlayerStats(Maybe)
-                compute_and_persist_prices(): Player
+                refresh_all_players(): Player, LeetifyProfileCache
+                compute_and_persist_prices(): Player, GuildPlayerPrice
 
 
             Use to keep player prices up to date
@@ -42,20 +47,9 @@ class Pricing(commands.Cog):
         """
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        # First, list all handles with a read-only session
-        async with SessionLocal() as s:
-            handles = [h for h in (await s.execute(select(Player.handle))).scalars().all()]
-
-        results = []
-        for handle in handles:
-            try:
-                async with SessionLocal() as session:
-                    # independent tx per player
-                    r = await refresh_one_player(session, str(handle))
-                    await session.commit()
-                    results.append(r)
-            except Exception as e:
-                results.append({"discord_id": str(handle), "ok": False, "reason": str(e)})
+        # One fetch per unique steam account, written back to every Player row it maps to
+        # (manages its own sessions: no transaction is open while it waits on Leetify)
+        results = await refresh_all_players()
 
         async with SessionLocal() as session:
             updated_prices = await compute_and_persist_prices(session)
@@ -83,8 +77,59 @@ class Pricing(commands.Cog):
         await interaction.followup.send(msg, ephemeral=True)
 
 
+    @pricing.command(name="preview", description="Dry run: show how prices would move without saving anything")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        gamma=f"Curve exponent to try (current: {GAMMA})",
+        w_leetify="Leetify weight to try", w_faceit="Faceit weight to try",
+        w_premier="Premier weight to try", w_renown="Renown weight to try",
+        pages="How many pages of movers to post (1-5)", page_size="Players per page (5-30)",
+    )
+    async def preview(self, interaction: discord.Interaction, gamma: Optional[float] = None,
+                      w_leetify: Optional[float] = None, w_faceit: Optional[float] = None,
+                      w_premier: Optional[float] = None, w_renown: Optional[float] = None,
+                      pages: int = 1, page_size: int = 20):
+        """
+            Admin Only
+            Runs compute_and_persist_prices(dry_run=True) against the current ratings and posts
+            the per-player price deltas, largest movers first, one message per page.
+
+            Writes: nothing
+
+            Use to check a gamma/weight change before committing it with /pricing update
+        """
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        pages = max(1, min(5, pages))
+        page_size = max(5, min(30, page_size))
+        weights = {k: v for k, v in {
+            "leetify": w_leetify, "faceit": w_faceit, "premier": w_premier, "renown": w_renown,
+        }.items() if v is not None}
+
+        async with SessionLocal() as session:
+            diff = await price_diff_pages(session, gamma=gamma, weights=weights, page_size=page_size, pages=pages)
+
+        sent = 0
+        for page in diff:
+            lines = []
+            for r in page:
+                old = r["old_price"]
+                if old is None:
+                    lines.append(f"- <@{r['handle']}> new → **{r['price']:,}**")
+                else:
+                    arrow = "▲" if r["delta"] > 0 else "▼"
+                    lines.append(f"- <@{r['handle']}> {old:,} → **{r['price']:,}** ({arrow}{abs(r['delta']):,})")
+            sent += 1
+            await interaction.followup.send(
+                f"**Price preview — page {sent}** (gamma={gamma if gamma is not None else GAMMA})\n" + "\n".join(lines),
+                ephemeral=True, allowed_mentions=discord.AllowedMentions.none(),
+            )
+
+        if not sent:
+            await interaction.followup.send("No price changes with those settings.", ephemeral=True)
+
     @pricing.command(name="show", description="List all registered players and their prices (highest to lowest")
-    @app_commands.describe(limit="How many players to show (1–50).", all_guilds="Include players from ALL guilds (default: only this server)")
+    @app_commands.describe(limit="Players per page (1–50).", all_guilds="Include players from ALL guilds (default: only this server)")
     async def leaderboard(self, interaction: discord.Interaction, limit: int = 20, all_guilds: bool = False):
 
         guild = interaction.guild
@@ -93,64 +138,45 @@ class Pricing(commands.Cog):
             await interaction.response.send_message("Use this in a server (or pass all_guilds=True).", ephemeral=True)
             return
 
-        limit = max(1, min(50, limit))
+        page_size = max(1, min(50, limit))
         await interaction.response.defer(ephemeral=False, thinking=True)
 
-        # fetch top N by price (ignore NULLs)
-        async with SessionLocal() as session:
-
-            if not all_guilds:
-
-                result = await session.execute(
-                    select(Player.handle, Player.price)
-                    .join(User, cast(Player.handle, BigInteger) == User.discord_id)  # handle == discord_id
-                    .where(
-                        User.discord_guild_id == guild_id,
-                        Player.price.is_not(None),
-                    )
-                    .order_by(Player.price.desc())
-                    .limit(limit)
-                )
-                rows = result.all()
-            else:
-                result = await session.execute(
-                    select(Player.handle, Player.price)
-                    .join(User, cast(Player.handle, BigInteger) == User.discord_id)  # handle == discord_id
-                    .where(Player.price.is_not(None),
-                    )
-                    .order_by(Player.price.desc())
-                    .limit(limit)
-                )
-                rows = result.all()
-
-        if not rows:
-            await interaction.followup.send("No priced players yet. Run `/pricing update` first.", ephemeral=True)
-            return
-
-        seen = set()
-        unique_rows = []
-        for handle, price in rows:
-            if handle in seen:
-                continue
-            seen.add(handle)
-            unique_rows.append((handle, price))
-            if len(unique_rows) >= limit:
-                break
-
-        # build a numbered list, mentioning users via their Discord IDs (handles)
-        lines = []
-        for i, (handle, price) in enumerate(unique_rows, start=1):
-            mention = f"<@{handle}>"  # handle is stored discord_id
-            lines.append(f"**{i}.** {mention} — **{price:,}**")
-
-        embed = discord.Embed(
-            title="Pricing",
-            description="\n".join(lines),
-            color=discord.Color.gold()
+        # this server's own price pool, or Player.price for players in this server / every server
+        scope = dict(
+            guild_id=None if all_guilds else guild_id,
+            guild_pool=not all_guilds and PRICE_POOL == "guild",
         )
-        embed.set_footer(text=f"Top {len(rows)} players by price")
 
-        await interaction.followup.send(embed=embed)
+        async def fetch(cursor, page: int):
+            """One page by price; cursor is the last row's (price, player_id)."""
+            async with SessionLocal() as session:
+                rows = await price_page(session, after=cursor, limit=page_size + 1, **scope)
+            more = len(rows) > page_size
+            rows = rows[:page_size]
+
+            if not rows:
+                return discord.Embed(
+                    title="Pricing",
+                    description="No priced players yet. Run `/pricing update` first.",
+                    color=discord.Color.gold()
+                ), None
+
+            # build a numbered list, mentioning users via their Discord IDs (handles)
+            lines = []
+            for i, (_pid, handle, price) in enumerate(rows, start=page * page_size + 1):
+                mention = f"<@{handle}>"  # handle is stored discord_id
+                lines.append(f"**{i}.** {mention} — **{price:,}**")
+
+            embed = discord.Embed(
+                title="Pricing",
+                description="\n".join(lines),
+                color=discord.Color.gold()
+            )
+            embed.set_footer(text=f"Page {page + 1} · {page_size} players per page")
+            last_pid, _, last_price = rows[-1]
+            return embed, ((last_price, last_pid) if more else None)
+
+        await KeysetPager(fetch, author_id=interaction.user.id).start(interaction)
 
     @pricing.command(name="sync_players", description="Syncs users")
     @app_commands.checks.has_permissions(administrator=True)
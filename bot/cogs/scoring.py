@@ -15,6 +15,7 @@ from backend.services.leetify_api import current_week_start_london
 from backend.services.repo import get_or_create_user, upsert_stats, get_user
 from backend.models import User, Team, Player, TeamPlayer, WeeklyPoints, PlayerGame, Match
 from backend.services.ingest_user import ingest_user_recent_matches
+from backend.services.leaderboard import refresh_leaderboards
 
 
 
@@ -361,6 +362,8 @@ class Scoring(commands.Cog):
                     bd=bd,
                 )
 
+                await refresh_leaderboards(session, week_start_utc.replace(tzinfo=None), [guild_id])
+
         who = f" for **{discord.utils.escape_markdown(member.display_name)}**" if member else ""
         fetched_msg = f" (fetched {ingested} new games)" if fetch else ""
         await interaction.followup.send(
@@ -12,6 +12,7 @@ from sqlalchemy.dialects import sqlite
 
 from backend.db import SessionLocal
 from backend.services.repo import upsert_stats
+from backend.services.leetify_api import week_bounds_naive_utc  # noqa: F401  (cogs import it from here)
 from backend.models import User, PlayerGame, WeeklyPoints
 from backend.services.ingest_user import ingest_user_recent_matches
 
@@ -69,17 +70,6 @@ def breakdown_from_agg(a: dict, *, alpha=10.0, k=0.60, cap=1.15) -> dict:
 def _v(x, d=0.0): return float(x) if x is not None else float(d)
 def _i(x, d=0):   return int(x) if x is not None else int(d)
 
-def week_bounds_naive_utc(tz_name="Europe/London"):
-    now_local = datetime.now(ZoneInfo(tz_name))
-    start_local = (now_local - timedelta(days=now_local.weekday())).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-    end_local = start_local + timedelta(days=7)
-    start_utc = start_local.astimezone(timezone.utc).replace(tzinfo=None)
-    end_utc   = end_local.astimezone(timezone.utc).replace(tzinfo=None)
-    end_utc = end_utc - timedelta(hours=1)
-    return start_utc, end_utc
-
 async def aggregate_week_from_db(
     session,
     *,
@@ -366,6 +356,9 @@ class stats(commands.Cog):
                     else:
                         failed.append((did, msg))
 
+            # imported here: leaderboard -> week_lock -> this module
+            from backend.services.leaderboard import refresh_leaderboards
+            await refresh_leaderboards(session, week_start_utc_naive, None if all_guilds else [scope_guild_id])
             await session.commit()
 
         scope_txt = "all guilds" if all_guilds else f"this server ({scope_guild_id})"
@@ -1,4 +1,7 @@
 # bot/cogs/teams.py
+import io
+import re
+
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -15,30 +18,33 @@ from zoneinfo import ZoneInfo
 from sqlalchemy.sql.functions import user
 
 from backend.db import SessionLocal
-from backend.services.market import already_on_team, roster_count, get_or_create_team_week_state, \
-    get_global_player_price, TRANSFERS_PER_WEEK, buy_player, sell_player, team_has_active_this_week, roster_for_week
+from backend.services.market import TRANSFERS_PER_WEEK, MAX_TEAM_SIZE, validate_transfer_in, apply_transfer_in, \
+    apply_transfers, MarketConflict, transfer_diff, budget_for_week_expr
+from backend.services.db_retry import run_write
 
 from backend.services.repo import get_or_create_user, create_team, ensure_player_for_user, get_user
+from backend.services.week_lock import week_is_locked
+from backend.services.team_card import load_team_card
+from backend.services.history import team_history, week_keys
+from backend.services.optimizer import suggest_for_team
 from backend.models import Team, TeamPlayer, Player, WeeklyPoints, PlayerStats, player, User
 from backend.services.leetify_api import current_week_start_london, next_week_start_london, current_week_start_norm, next_week_start_norm
 from bot.cogs.stats_refresh import week_bounds_naive_utc
+from bot.charts import weekly_chart, ChartsBusy, CHARTS_BUSY
+from bot.utils import resolve_names
 
 
-MAX_TEAM_SIZE = 5  # 5 and a sub
 NO_PINGS = discord.AllowedMentions.none()
+MENTION_RE = re.compile(r"<@!?(\d+)>|\b(\d{15,20})\b")   # user mentions or raw discord ids
 
 
-async def resolve_display_name(guild: discord.Guild | None, user_id: int, fallback: str) -> str:
-    if guild:
-        m = guild.get_member(user_id)
-        if m:
-            return m.display_name
-        try:
-            m = await guild.fetch_member(user_id)
-            return m.display_name
-        except (discord.NotFound, discord.HTTPException, discord.Forbidden):
-            pass
-    return fallback
+def parse_member_ids(text: str | None) -> list[int]:
+    """Discord ids from a string of mentions/ids, in order, without duplicates."""
+    if not text:
+        return []
+    ids = [int(a or b) for a, b in MENTION_RE.findall(text)]
+    return list(dict.fromkeys(ids))
+
 
 def week_start_local_naive(tz: str = "Europe/London", minute: int = 1):
     """
@@ -127,103 +133,47 @@ class Teams(commands.Cog):
 
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        async with SessionLocal() as session:
-            async with session.begin():
-                # fetch
-                owner = await get_user(session, discord_id=interaction.user.id, guild_id=guild_id)
-                team = await session.scalar(
-                    select(Team).where(Team.owner_id == owner.id, Team.guild_id == guild_id)
-                )
-                if not team:
-                    await interaction.followup.send("Create a team first: `/team create`", ephemeral=True)
-                    return
-
-                target_user = await get_user(session, discord_id=member.id, guild_id=guild_id)
-                if not target_user or not target_user.steam_id:
-                    await interaction.followup.send(
-                        f"{member.mention} isn’t registered. Ask them to run `/account register <steamid>` first.",
-                        ephemeral=True, allowed_mentions=NO_PINGS
-                    )
-                    return
-
-                player_row = await ensure_player_for_user(session, target_user)
-
-                #week keys
-                now = datetime.now(tz=timezone.utc)
-                # Using function from stats_refresh (It should be correct)
-                this_week, next_week = week_bounds_naive_utc("Europe/London")
-                print(f'Line 155: this week is {this_week}, next week is {next_week}')
-
-                # State used for transfer counting (this week) and budget (next week)
-                state_this = await get_or_create_team_week_state(session, guild_id, team.id, this_week)
-                state_next = await get_or_create_team_week_state(session, guild_id, team.id, next_week)
-
-                #pricing
-                price = await get_global_player_price(session, player_row.id)
-                if price is None:
-                    await interaction.followup.send(
-                        "No price available for this player. Ask an admin to run `/pricing update`.",
-                        ephemeral=True
-                    )
-                    return
-
-                # Validate
-                # roster for next week (effective_from <= next_week and (to is NULL or to > next_week))
-                next_ids_before = set(await roster_for_week(session, team.id, next_week))
-                if player_row.id in next_ids_before:
-                    await interaction.followup.send(
-                        f"{member.mention} is already queued/active for next week.",
-                        ephemeral=True
-                    )
-                    return
-
-                if len(next_ids_before) >= MAX_TEAM_SIZE:
-                    await interaction.followup.send(
-                        f"Your team is full for next week (max {MAX_TEAM_SIZE}).",
-                        ephemeral=True
-                    )
-                    return
+        # Using function from stats_refresh (It should be correct)
+        this_week, next_week = week_bounds_naive_utc("Europe/London")
 
-                if (state_next.budget_remaining or 0) < price:
-                    await interaction.followup.send(
-                        f"Not enough budget. Price: {price}, remaining: {state_next.budget_remaining}.",
-                        ephemeral=True
-                    )
-                    return
+        async def work(session):
+            # One read: owner, team, target, price, week states and rosters
+            v = await validate_transfer_in(
+                session, guild_id=guild_id, owner_discord_id=interaction.user.id,
+                target_discord_id=member.id, this_week=this_week, next_week=next_week,
+            )
+            if v.problem:
+                return v, v.problem, None
+            # If passed all validations then mutate (one write, guarded against concurrent changes)
+            return v, None, await apply_transfer_in(session, v, role=role)
 
-                post_first_lock = await team_has_active_this_week(session, team.id, this_week)
-                # Only after the first lock can we enforce transfer cap
-                if post_first_lock and TRANSFERS_PER_WEEK and (state_this.transfers_used or 0) >= TRANSFERS_PER_WEEK:
-                    await interaction.followup.send(
-                        f"You’ve already used your {TRANSFERS_PER_WEEK} transfer(s) this week.",
-                        ephemeral=True
-                    )
-                    return
+        try:
+            v, problem, applied = await run_write(work)
+        except MarketConflict as e:
+            v, problem = None, e.problem
+
+        errors = {
+            "no_team": "Create a team first: `/team create`",
+            "not_registered": f"{member.mention} isn’t registered. Ask them to run `/account register <steamid>` first.",
+            "no_price": "No price available for this player. Ask an admin to run `/pricing update`.",
+            "already_queued": f"{member.mention} is already queued/active for next week.",
+            "team_full": f"Your team is full for next week (max {MAX_TEAM_SIZE}).",
+            "budget": f"Not enough budget. Price: {v.price}, remaining: {v.budget_next}." if v
+                      else "Not enough budget (another transfer just went through).",
+            "transfer_cap": f"You’ve already used your {TRANSFERS_PER_WEEK} transfer(s) this week.",
+        }
+        if problem:
+            # every rule lives in TransferValidation.problem / apply_transfer_in, this only words it
+            await interaction.followup.send(errors.get(problem, problem), ephemeral=True,
+                                            allowed_mentions=NO_PINGS)
+            return
 
-                # If passed all validations then mutate
-                session.add(TeamPlayer(
-                    team_id=team.id,
-                    player_id=player_row.id,
-                    role=role,
-                    effective_from_week=next_week,
-                    effective_to_week=None
-                ))
-
-                # Budget applies to next-week’s state (FPL-style)
-                state_next.budget_remaining = (state_next.budget_remaining or 0) - price
-
-                # Count a transfer (this week) only if we weren’t already active this week
-                transfers_used = state_this.transfers_used or 0
-                if post_first_lock:
-                    this_ids = set(await roster_for_week(session, team.id, this_week))
-                    if player_row.id not in this_ids:
-                        state_this.transfers_used = transfers_used + 1
-                        transfers_used = state_this.transfers_used
+        budget_remaining, transfers_used = applied
 
         # If we got to this bit then it was all good
         await interaction.followup.send(
             f"Added {member.mention}{f' as **{role}**' if role else ''}. "
-            f"Price: **{price}**. Budget remaining: **{state_next.budget_remaining}**. "
+            f"Price: **{v.price}**. Budget remaining: **{budget_remaining}**. "
             f"Transfers this week: **{transfers_used}/{TRANSFERS_PER_WEEK}**.",
             ephemeral=True, allowed_mentions=NO_PINGS
         )
@@ -231,9 +181,10 @@ class Teams(commands.Cog):
     @team.command(name="remove", description="Remove a player from your team")
     async def remove(self, interaction: discord.Interaction, member: discord.Member):
         """
-            Removes a player from the caller's team in the current guild.
-            Build phase: immediate removal (this week).
-            Post-build: queued — stops counting from next Monday 00:00 (Europe/London).
+            Removes a player from the caller's team in the current guild, from next Monday 00:00
+            (Europe/London). A one-player sell through apply_transfers, so the refund and transfer
+            rules are the same as /team transfer: the refund goes to next week's budget and a
+            sell on its own doesn't use a transfer.
 
             Writes:
                 TeamPlayer (closes interval or cancels a queued buy)
@@ -246,64 +197,108 @@ class Teams(commands.Cog):
 
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        async with SessionLocal() as session:
-            async with session.begin():
-                # Team ownership
-                owner = await get_user(session, discord_id= interaction.user.id, guild_id=guild_id)
-                team = await session.scalar(select(Team).where(Team.owner_id == owner.id, Team.guild_id == guild_id))
-                if not team:
-                    await interaction.followup.send("Create a team first: `/team create`", ephemeral=True)
-                    return
-
-                # Ensure Player row exists
-                target_user = await get_user(session, discord_id= member.id, guild_id=guild_id)
-                player_row = await ensure_player_for_user(session, target_user)
-
-                # Time keys
-                now = datetime.now(tz=timezone.utc)
-                this_week, next_week = week_bounds_naive_utc("Europe/London")
+        this_week, next_week = week_bounds_naive_utc("Europe/London")
 
-                # Weekly state
-                state = await get_or_create_team_week_state(session, guild_id, team.id, this_week)
-
-                # Pricing (refund amount)
-                price = await get_global_player_price(session, player_row.id)
-                if price is None:
-                    price = 0
+        async def work(session):
+            return await apply_transfers(
+                session, guild_id=guild_id, owner_discord_id=interaction.user.id,
+                sells=[member.id], buys=[], this_week=this_week, next_week=next_week,
+            )
 
-                this_ids_before = set(await roster_for_week(session, team.id, this_week))
-                next_ids_before = set(await roster_for_week(session, team.id, next_week))
+        try:
+            batch = await run_write(work)
+        except MarketConflict as e:
+            await interaction.followup.send(
+                f"No changes made. Your team changed while this was running ({e.problem}), try again.",
+                ephemeral=True
+            )
+            return
+        if batch.problem == "no_team":
+            await interaction.followup.send("Create a team first: `/team create`", ephemeral=True)
+            return
+        if batch.problem:
+            await interaction.followup.send(f"{member.mention} is not in your team.", ephemeral=True,
+                                            allowed_mentions=NO_PINGS)
+            return
 
-                print(f'This IDS {set(this_ids_before)}')
-                print(f'Next IDS {set(next_ids_before)}')
+        await interaction.followup.send(
+            f"Removed {member.mention}. Refunded **{batch.prices[member.id]}**. "
+            f"Budget remaining: **{batch.budget_after}**. "
+            f"Transfers this week: **{batch.transfers_used}/{TRANSFERS_PER_WEEK}**.",
+            ephemeral=True,
+            allowed_mentions=NO_PINGS
+        )
 
-                print(f'PlayerID {player_row.id}')
+    @team.command(name="transfer", description="Sell and buy several players in one go (effective next week)")
+    @app_commands.describe(
+        buys="Players to add, e.g. @a @b @c",
+        sells="Players to remove, e.g. @d",
+    )
+    async def transfer(self, interaction: discord.Interaction, buys: Optional[str] = None,
+                       sells: Optional[str] = None):
+        """
+        Batch version of /team add + /team remove.
+        Budget, team size and the weekly transfer cap are checked against the final roster,
+        then everything is applied in one transaction (or nothing is).
+        """
+        guild_id = interaction.guild_id
+        if not guild_id:
+            await interaction.response.send_message("Use this command in a server.", ephemeral=True)
+            return
 
-                if player_row.id not in this_ids_before and player_row.id not in next_ids_before:
-                    await interaction.followup.send(f"{member.mention} is not in your team.", ephemeral=True)
-                    return
+        buy_ids, sell_ids = parse_member_ids(buys), parse_member_ids(sells)
+        if not buy_ids and not sell_ids:
+            await interaction.response.send_message(
+                "Mention at least one player in `buys` or `sells`.", ephemeral=True
+            )
+            return
 
-                # Queue the sell (or cancel the queued buy if they only had next_week)
-                await sell_player(session, team.id, player_row.id, now=now)
+        await interaction.response.defer(ephemeral=True, thinking=True)
 
-                # Recompute next-week roster to see if they’ll still be there after the sell
-                next_ids_after = set(await roster_for_week(session, team.id, next_week))
+        this_week, next_week = week_bounds_naive_utc("Europe/London")
 
-                # Refund budget now (FPL-style)
-                state.budget_remaining += price
+        async def work(session):
+            # a rejected batch returns before writing anything
+            return await apply_transfers(
+                session, guild_id=guild_id, owner_discord_id=interaction.user.id,
+                sells=sell_ids, buys=buy_ids, this_week=this_week, next_week=next_week,
+            )
 
-                # Count a transfer iff they were in this week's roster and won't be in next week's roster post-sell
-                if player_row.id in this_ids_before and player_row.id not in next_ids_after:
-                    state.transfers_used += 1
+        try:
+            batch = await run_write(work)
+        except MarketConflict as e:
+            await interaction.followup.send(
+                f"No changes made. Your team changed while this was running ({e.problem}), try again.",
+                ephemeral=True
+            )
+            return
 
-                transfers_used = state.transfers_used
+        who = f"<@{batch.problem_member}>" if batch.problem_member else ""
+        errors = {
+            "no_team": "Create a team first: `/team create`",
+            "sell_and_buy": f"{who} is in both `buys` and `sells`.",
+            "not_on_team": f"{who} is not in your team.",
+            "not_registered": f"{who} isn’t registered. Ask them to run `/account register <steamid>` first.",
+            "no_price": f"No price available for {who}. Ask an admin to run `/pricing update`.",
+            "already_queued": f"{who} is already queued/active for next week.",
+            "team_full": f"That would leave you with more than {MAX_TEAM_SIZE} players next week.",
+            "budget": f"Not enough budget. Remaining: {batch.budget_before}, after these transfers: {batch.budget_after}.",
+            "transfer_cap": f"That would use {batch.transfers_used} transfer(s), you get {TRANSFERS_PER_WEEK} per week.",
+        }
+        if batch.problem:
+            await interaction.followup.send(
+                f"No changes made. {errors.get(batch.problem, batch.problem)}",
+                ephemeral=True, allowed_mentions=NO_PINGS
+            )
+            return
 
+        lines = [f"- Sold <@{d}> (+{batch.prices[d]})" for d in batch.sells]
+        lines += [f"+ Bought <@{d}> (-{batch.prices[d]})" for d in batch.buys]
         await interaction.followup.send(
-            f"Removed {member.mention}. Refunded **{price}**. "
-            f"Budget remaining: **{state.budget_remaining}**. "
-            f"Transfers this week: **{transfers_used}/{TRANSFERS_PER_WEEK}**.",
-            ephemeral=True,
-            allowed_mentions=NO_PINGS
+            "Transfers queued for next week:\n" + "\n".join(lines) + "\n"
+            f"Budget remaining: **{batch.budget_after}**. "
+            f"Transfers this week: **{batch.transfers_used}/{TRANSFERS_PER_WEEK}**.",
+            ephemeral=True, allowed_mentions=NO_PINGS
         )
 
     @team.command(name="show", description="Show your current team")
@@ -347,190 +342,53 @@ class Teams(commands.Cog):
 
         async with SessionLocal() as session:
             async with session.begin():
-                # Find the caller's DB user (no create here)
-                target_db_user = await session.scalar(
-                    select(User).where(
-                        User.discord_id == int(target_user.id),
-                        User.discord_guild_id == guild_id
-                    )
-                )
-                if not target_db_user:
-                    await interaction.followup.send(
-                        f"**{escape_mentions(target_user.display_name)}** has no account in this server.",
-                        allowed_mentions=NO_PINGS
-                    )
-                    return
-
-                # Team for this guild
-                team_row = await session.execute(
-                    select(Team.id, Team.name)
-                    .where(Team.owner_id == target_db_user.id, Team.guild_id == guild_id)
+                locked = await week_is_locked(session, selected_start)
+                card = await load_team_card(
+                    session, guild_id=guild_id, discord_id=int(target_user.id),
+                    week_start=selected_start, locked=locked,
                 )
-                row = team_row.first()
-                if not row:
-                    await interaction.followup.send(
-                        f"**{escape_mentions(target_user.display_name)}** has no team in this server.",
-                        allowed_mentions=NO_PINGS
-                    )
-                    return
-                team_id, team_name = row
-                state = await get_or_create_team_week_state(session, guild_id, team_id, selected_start)
-                bud_rem = float(state.budget_remaining)
 
-                # Roster active in the selected week: interval *overlap*
-                roster_rows = await session.execute(
-                    select(Player.id, Player.handle, TeamPlayer.role)
-                    .join(TeamPlayer, TeamPlayer.player_id == Player.id)
-                    .where(
-                        TeamPlayer.team_id == team_id,
-                        TeamPlayer.effective_from_week < selected_end,
-                        or_(
-                            TeamPlayer.effective_to_week.is_(None),
-                            TeamPlayer.effective_to_week > selected_start,
-                        ),
-                    )
-                    .order_by(Player.handle.asc())
-                )
-                roster = roster_rows.all()
+        if not card.found_user:
+            await interaction.followup.send(
+                f"**{escape_mentions(target_user.display_name)}** has no account in this server.",
+                allowed_mentions=NO_PINGS
+            )
+            return
+        if card.team_id is None:
+            await interaction.followup.send(
+                f"**{escape_mentions(target_user.display_name)}** has no team in this server.",
+                allowed_mentions=NO_PINGS
+            )
+            return
 
-                if not roster:
-                    await interaction.followup.send(
-                        f"**{escape_mentions(target_user.display_name)}**’s team **{escape_mentions(team_name)}** "
-                        f"has no players for **{label}**.\n"
-                        f"**Budget remaining:** ${bud_rem:,.0f}",
-                        allowed_mentions=NO_PINGS
-                    )
-                    return
+        team_name, bud_rem = card.team_name, card.budget
+        if not card.players:
+            await interaction.followup.send(
+                f"**{escape_mentions(target_user.display_name)}**’s team **{escape_mentions(team_name)}** "
+                f"has no players for **{label}**.\n"
+                f"**Budget remaining:** ${bud_rem:,.0f}",
+                allowed_mentions=NO_PINGS
+            )
+            return
 
+        names = await resolve_names(
+            guild, [p.discord_id for p in card.players],
+            stored={p.discord_id: p.db_name for p in card.players if p.discord_id is not None},
+        )
 
-                # Map handles
-                handle_ids = [int(h) for _, h, _ in roster if str(h).isdigit()]
-                users_in_guild = await session.execute(
-                    select(User.discord_id, User.id)
-                    .where(User.discord_id.in_(handle_ids), User.discord_guild_id == guild_id)
-                )
-                discord_to_userid = dict(users_in_guild.tuples().all())
-                db_user_ids = [discord_to_userid.get(int(h)) for _, h, _ in roster if str(h).isdigit()]
-                db_user_ids = [uid for uid in db_user_ids if uid is not None]
-
-                # Weekly points for the selected week/guild
-                latest_per_user = (
-                    select(
-                        WeeklyPoints.user_id,
-                        func.max(WeeklyPoints.computed_at).label("latest_ts")
-                    )
-                    .where(
-                        WeeklyPoints.guild_id == guild_id,
-                        WeeklyPoints.user_id.in_(db_user_ids),
-                        WeeklyPoints.weekly_score.isnot(None),
-                        WeeklyPoints.computed_at.isnot(None),
-                        WeeklyPoints.ruleset_id == 1, # Rulset filter for future
-                    )
-                    .group_by(WeeklyPoints.user_id)
-                ).subquery()
-
-                wp_rows = await session.execute(
-                    select(WeeklyPoints.user_id, WeeklyPoints.weekly_score)
-                    .join(
-                        latest_per_user,
-                        and_(
-                            WeeklyPoints.user_id == latest_per_user.c.user_id,
-                            WeeklyPoints.computed_at == latest_per_user.c.latest_ts,
-                        )
-                    )
-                )
-                points_map: dict[int, float] = dict(wp_rows.tuples().all())
-
-                missing_uids = [uid for uid in db_user_ids if uid not in points_map]
-                if missing_uids:
-                    # map missing user_id -> discord_id
-                    uid_to_discord = dict(
-                        (u_id, d_id)
-                        for d_id, u_id in discord_to_userid.items()
-                    )
-                    missing_dids = [uid_to_discord.get(uid) for uid in missing_uids if uid_to_discord.get(uid)]
-                    if missing_dids:
-                        # all user_ids across ANY guild that share these discord_ids
-                        any_user_ids = await session.execute(
-                            select(User.id).where(User.discord_id.in_(missing_dids))
-                        )
-                        any_user_ids = [r[0] for r in any_user_ids.all()]
-                        if any_user_ids:
-                            latest_any = (
-                                select(
-                                    WeeklyPoints.user_id,
-                                    func.max(WeeklyPoints.computed_at).label("latest_ts")
-                                )
-                                .where(
-                                    WeeklyPoints.user_id.in_(any_user_ids),
-                                    WeeklyPoints.weekly_score.isnot(None),
-                                    WeeklyPoints.computed_at.isnot(None),
-                                    WeeklyPoints.ruleset_id == 1,
-                                )
-                                .group_by(WeeklyPoints.user_id)
-                            ).subquery()
-
-                            wp_any = await session.execute(
-                                select(WeeklyPoints.user_id, WeeklyPoints.weekly_score)
-                                .join(
-                                    latest_any,
-                                    and_(
-                                        WeeklyPoints.user_id == latest_any.c.user_id,
-                                        WeeklyPoints.computed_at == latest_any.c.latest_ts,
-                                    )
-                                )
-                            )
-                            rows_any = wp_any.tuples().all()
-
-                            # map those "any guild" user_ids back to this guild's uid via discord_id
-                            id_to_did = dict(
-                                (u_id, d_id)
-                                for u_id, d_id in (await session.execute(
-                                    select(User.id, User.discord_id).where(User.id.in_([u for (u, _) in rows_any]))
-                                )).tuples().all()
-                            )
-                            for uid_any, score in rows_any:
-                                did = id_to_did.get(uid_any)
-                                uid_here = discord_to_userid.get(did)
-                                if uid_here is not None and uid_here not in points_map:
-                                    points_map[uid_here] = score
-
-                # Player averages for display
-                ps_rows = await session.execute(
-                    select(PlayerStats.user_id, PlayerStats.avg_leetify_rating, PlayerStats.sample_size)
-                    .where(PlayerStats.guild_id == guild_id, PlayerStats.user_id.in_(db_user_ids))
-                )
-                stats_map = {uid: (avg, n) for uid, avg, n in ps_rows.all()}
-
-                # Budget/state for the same key
-                state = await get_or_create_team_week_state(session, guild_id, team_id, selected_start)
-
-                # Build table + total
-                stat_rows = []
-                team_total = 0.0
-                for player_id, handle, role in roster:
-                    disp = f"Unknown ({handle})"
-                    avg_txt, score_txt, games_txt = "n/a", "n/a", "0"
-
-                    if str(handle).isdigit():
-                        did = int(handle)
-                        disp_name = await resolve_display_name(guild, did, fallback=f"Unknown ({handle})")
-                        disp = escape_mentions(disp_name)
-                        uid = discord_to_userid.get(did)
-                        if uid:
-                            avg, n = stats_map.get(uid, (None, 0))
-                            if avg is not None:
-                                avg_txt = fmt_2sf(avg)
-                            games_txt = str(n or 0)
-                            pts = points_map.get(uid)
-                            if pts is not None:
-                                score_txt = fmt_1dp(pts)
-                                try:
-                                    team_total += float(pts)
-                                except:
-                                    pass
-
-                    stat_rows.append((disp, role or "-", avg_txt, score_txt, games_txt))
+        # Build table + total
+        stat_rows = []
+        for p in card.players:
+            disp = escape_mentions(names.get(p.discord_id) or f"Unknown ({p.handle})")
+            avg_txt, score_txt, games_txt = "n/a", "n/a", "0"
+            if p.user_id:
+                if p.avg_rating is not None:
+                    avg_txt = fmt_2sf(p.avg_rating)
+                games_txt = str(p.games)
+                if p.points is not None:
+                    score_txt = fmt_1dp(p.points)
+            stat_rows.append((disp, p.role or "-", avg_txt, score_txt, games_txt))
+        team_total = card.total
 
         # Render table
         def fmt_row(cols, widths):
@@ -554,14 +412,174 @@ class Teams(commands.Cog):
             type="rich",
         )
         embed.add_field(
-            name=f"Players (Budget Remaining: {state.budget_remaining})",
+            name=f"Players (Budget Remaining: {bud_rem})",
             value="\n".join(lines) if stat_rows else "_(no players for this week)_",
             inline=False,
         )
         embed.add_field(name="Team Total (this gameweek)", value=f"**{fmt_1dp(team_total)}**", inline=False)
-        embed.set_footer(text="Players shown are those whose [from, to) interval overlaps this gameweek.")
+        embed.set_footer(text="This week's players are locked in at the start of the gameweek." if locked
+                         else "Players shown are those whose [from, to) interval overlaps this gameweek.")
+        await interaction.followup.send(embed=embed, allowed_mentions=NO_PINGS)
+
+    @team.command(name="history", description="Points your team scored in each of the last few weeks")
+    @app_commands.describe(
+        weeks="How many weeks to show (1-20, default 8)",
+        user="Show someone else’s team (optional)",
+    )
+    async def history(self, interaction: discord.Interaction, weeks: app_commands.Range[int, 1, 20] = 8,
+                      user: Optional[discord.User] = None):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            await interaction.response.send_message("Use this in a server (not DMs).", ephemeral=True)
+            return
+        target_user = user or interaction.user
+        await interaction.response.defer(ephemeral=False, thinking=True)
+
+        async with SessionLocal() as session:
+            row = (await session.execute(
+                select(Team.id, Team.name)
+                .join(User, User.id == Team.owner_id)
+                .where(User.discord_id == int(target_user.id), User.discord_guild_id == guild_id,
+                       Team.guild_id == guild_id)
+            )).first()
+            if not row:
+                await interaction.followup.send(
+                    f"**{escape_mentions(target_user.display_name)}** has no team in this server.",
+                    allowed_mentions=NO_PINGS
+                )
+                return
+            team_id, team_name = row
+            series = await team_history(session, team_id, week_keys(weeks))
+
+        lines = [f"{'Week':<7} | {'Players':>7} | {'Points':>7} | {'Total':>7}"]
+        lines.append("-" * len(lines[0]))
+        running = 0.0
+        for w in series:
+            running += w.total
+            lines.append(f"{w.week_start:%d-%b} | {len(w.player_ids):>7} | {w.total:>7.1f} | {running:>7.1f}")
+
+        embed = discord.Embed(
+            title=f"{escape_mentions(target_user.display_name)}’s Team — {escape_mentions(team_name)}",
+            description="```\n" + "\n".join(lines) + "\n```",
+        )
+        embed.set_footer(text="Each week counts the players on the team when that week started.")
         await interaction.followup.send(embed=embed, allowed_mentions=NO_PINGS)
 
+    @team.command(name="graph", description="Chart of weekly team points, optionally against other teams")
+    @app_commands.describe(
+        weeks="How many weeks to show (1-20, default 8)",
+        user="Show someone else’s team (optional)",
+        vs="Team owner to compare with (optional)",
+        vs2="Another team owner to compare with (optional)",
+    )
+    async def graph(self, interaction: discord.Interaction, weeks: app_commands.Range[int, 1, 20] = 8,
+                    user: Optional[discord.User] = None, vs: Optional[discord.User] = None,
+                    vs2: Optional[discord.User] = None):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            await interaction.response.send_message("Use this in a server (not DMs).", ephemeral=True)
+            return
+        owners = list({m.id: m for m in (user or interaction.user, vs, vs2) if m}.values())
+        await interaction.response.defer(ephemeral=False, thinking=True)
+
+        keys = week_keys(weeks)
+        async with SessionLocal() as session:
+            teams = {did: (team_id, name) for did, team_id, name in (await session.execute(
+                select(User.discord_id, Team.id, Team.name)
+                .join(User, User.id == Team.owner_id)
+                .where(User.discord_id.in_([int(m.id) for m in owners]), User.discord_guild_id == guild_id,
+                       Team.guild_id == guild_id)
+            )).all()}
+            series = []
+            for m in owners:
+                if m.id in teams:
+                    team_id, name = teams[m.id]
+                    history = await team_history(session, team_id, keys)
+                    series.append((name, [(w.week_start, w.total) for w in history]))
+
+        if not series:
+            await interaction.followup.send(
+                f"**{escape_mentions(owners[0].display_name)}** has no team in this server.",
+                allowed_mentions=NO_PINGS
+            )
+            return
+
+        title = "Team Points | " + " vs ".join(name for name, _ in series)
+        # keyed on the points themselves, so the same chart is only drawn once until something is rescored
+        key = ("team", guild_id, title, tuple((name, tuple(pts)) for name, pts in series))
+        try:
+            png = await weekly_chart(key, title, series)
+        except ChartsBusy:
+            await interaction.followup.send(CHARTS_BUSY)
+            return
+
+        file = discord.File(io.BytesIO(png), filename="team_points.png")
+        embed = discord.Embed(title=escape_mentions(title)[:256], colour=discord.Colour.green())
+        missing = [m.display_name for m in owners if m.id not in teams]
+        embed.set_footer(text="Each week counts the players on the team when that week started."
+                              + (f" No team: {', '.join(missing)}" if missing else ""))
+        embed.set_image(url="attachment://team_points.png")
+        await interaction.followup.send(file=file, embed=embed, allowed_mentions=NO_PINGS)
+
+    @team.command(name="optimize", description="Suggest the best team you can afford for next week")
+    @app_commands.describe(source="How to project points: recent weekly scores or Leetify L100 rating")
+    @app_commands.choices(source=[
+        app_commands.Choice(name="Recent weekly points", value="recent"),
+        app_commands.Choice(name="Leetify L100 average", value="l100"),
+    ])
+    async def optimize(self, interaction: discord.Interaction, source: Optional[app_commands.Choice[str]] = None):
+        """
+        Best next-week roster under your budget, MAX_TEAM_SIZE and the transfers you have left.
+        Nothing is changed, it prints the /team transfer command that would apply it.
+        """
+        guild_id = interaction.guild_id
+        if not guild_id:
+            await interaction.response.send_message("Use this in a server (not DMs).", ephemeral=True)
+            return
+        source_value = source.value if source else "recent"
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        this_week, next_week = week_bounds_naive_utc("Europe/London")
+        async with SessionLocal() as session:
+            team_id = await session.scalar(
+                select(Team.id)
+                .join(User, User.id == Team.owner_id)
+                .where(User.discord_id == int(interaction.user.id), User.discord_guild_id == guild_id,
+                       Team.guild_id == guild_id)
+            )
+            if team_id is None:
+                await interaction.followup.send("Create a team first: `/team create`", ephemeral=True)
+                return
+            s = await suggest_for_team(session, guild_id=guild_id, team_id=team_id,
+                                       this_week=this_week, next_week=next_week, source=source_value)
+
+        if not s.buys and not s.sells:
+            await interaction.followup.send(
+                f"Your next-week team is already the best {'you can get' if s.optimal else 'found'} "
+                f"(projected **{s.points_after:.1f}** pts, budget **{s.budget:.0f}**).",
+                ephemeral=True
+            )
+            return
+
+        lines = [f"- Sell <@{c.handle}> (+{c.price}, {c.points:.1f} pts)" for c in s.sells]
+        lines += [f"+ Buy <@{c.handle}> (-{c.price}, {c.points:.1f} pts)" for c in s.buys]
+        roster = ", ".join(f"<@{c.handle}>" for c in s.roster)
+        cmd = "/team transfer"
+        if s.buys:
+            cmd += " buys:" + " ".join(f"<@{c.handle}>" for c in s.buys)
+        if s.sells:
+            cmd += " sells:" + " ".join(f"<@{c.handle}>" for c in s.sells)
+        limit = "" if s.max_changes is None else f" (up to {s.max_changes} transfer(s) left this week)"
+        label = "Suggested team" if s.optimal else "Best team found"
+
+        await interaction.followup.send(
+            f"{label}{limit}: {roster}\n" + "\n".join(lines) + "\n"
+            f"Projected points: **{s.points_before:.1f}** → **{s.points_after:.1f}**. "
+            f"Budget after: **{s.budget_after:.0f}**.\n"
+            f"Apply with: `{cmd}`",
+            ephemeral=True, allowed_mentions=NO_PINGS
+        )
+
     @team.command(name="change_name", description="Change the name of your team")
     @app_commands.describe(new_name="The name of the team")
     async def team_change_name(self, interaction: discord.Interaction, new_name: str):
@@ -638,7 +656,7 @@ class Teams(commands.Cog):
         target_user = interaction.user
 
         current_date = now = datetime.now(timezone.utc)
-        base_start, _ = week_bounds_naive_utc("Europe/London")
+        base_start, next_week = week_bounds_naive_utc("Europe/London")
         selected_start = base_start
         selected_end = selected_start + timedelta(days=7)
 
@@ -671,40 +689,16 @@ class Teams(commands.Cog):
                     return
 
                 team_id, team_name = row
-                state = await get_or_create_team_week_state(session, guild_id, team_id, selected_start)
-                bud_rem = float(state.budget_remaining)
-
-                transfer_rows_in = await session.execute(
-                    select(
-                        Player.id,
-                        Player.handle,
-                        TeamPlayer.role,
-                        TeamPlayer.effective_from_week.label("start_at"),
-                        Player.price,
-                    )
-                    .join(TeamPlayer, TeamPlayer.player_id == Player.id)
-                    .where(
-                        TeamPlayer.team_id == team_id,
-                        TeamPlayer.effective_from_week > current_date,
-                    ).order_by(Player.handle.asc())
-                )
-                transfers_in = transfer_rows_in.all()
-
-                transfer_rows_out = await session.execute(
-                    select(
-                        Player.id,
-                        Player.handle,
-                        TeamPlayer.role,
-                        TeamPlayer.effective_to_week.label("leave_at"),
-                        Player.price,
-                    )
-                    .join(TeamPlayer, TeamPlayer.player_id == Player.id)
-                    .where(
-                        TeamPlayer.team_id == team_id,
-                        TeamPlayer.effective_to_week > current_date,
-                    ).order_by(Player.handle.asc())
+                # Buys, sells and refunds land on next week's state, read it without creating it
+                bud_rem = float(await session.scalar(select(budget_for_week_expr(guild_id, team_id, next_week))))
+
+                # Buys/sells = next week's roster vs this week's, one EXCEPT query
+                diff = await transfer_diff(
+                    session, guild_id=guild_id, team_id=team_id,
+                    this_week=selected_start, next_week=next_week,
                 )
-                transfers_out = transfer_rows_out.all()
+                transfers_in = [r for r in diff if r.kind == "buy"]
+                transfers_out = [r for r in diff if r.kind == "sell"]
 
         def _name_from_handle(h: str) -> str:
             return f"<@{h}>" if str(h).isdigit() else f"{h}"
@@ -722,12 +716,12 @@ class Teams(commands.Cog):
                 return "-"
 
         lines_in = []
-        for _pid, handle, _role, start_at, price in transfers_in:
-            lines_in.append(f"{_name_from_handle(handle)} | {_fmt_date(start_at)} | - {_fmt_money(price)}")
+        for r in transfers_in:
+            lines_in.append(f"{_name_from_handle(r.handle)} | {_fmt_date(next_week)} | - {_fmt_money(r.price)}")
 
         lines_out = []
-        for _pid, handle, _role, leave_at, price in transfers_out:
-            lines_out.append(f"{_name_from_handle(handle)} | {_fmt_date(leave_at)} | + {_fmt_money(price)}")
+        for r in transfers_out:
+            lines_out.append(f"{_name_from_handle(r.handle)} | {_fmt_date(next_week)} | + {_fmt_money(r.price)}")
 
         # Fallbacks if empty
         block_in = "\n".join(lines_in) if lines_in else "None"
@@ -742,7 +736,7 @@ class Teams(commands.Cog):
         )
         embed.add_field(name="Transfers In", value="User    | Start Date | - Cost\n" + block_in, inline=True)
         embed.add_field(name="Transfers Out", value="User | Leaving Date | + Cost\n" + block_out, inline=True)
-        embed.add_field(name="Overall Budget Remaining", value=f"**{budget_txt}**", inline=False)
+        embed.add_field(name="Budget Remaining After Transfers", value=f"**{budget_txt}**", inline=False)
 
         await interaction.followup.send(embed=embed, allowed_mentions=NO_PINGS)
 
@@ -6,13 +6,17 @@ from requests.sessions import Session
 
 from sqlalchemy.ext.asyncio import AsyncEngine
 
-from sqlalchemy import text, or_, update, delete, select, update, cast, BigInteger
+from sqlalchemy import text, or_, update, delete, select, update, cast, BigInteger, literal, true, DateTime, Float, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from backend.db import engine as async_engine
 from backend.db import SessionLocal
 from backend.models import TeamPlayer, Team, TeamWeekState, User, PlayerGame
 from backend.services.faceit_api import fetch_faceit_guid_by_steam, fetch_faceit_match_elo_for_player, \
     fetch_faceit_team_avg_elo
-from backend.services.market import get_or_create_team_week_state
+from backend.services.roster_cache import mark_team_dirty
+from backend.services.market import transfer_diff
+from backend.services.week_lock import week_is_locked, relock_teams
+from backend.services.leaderboard import refresh_team_leaderboard
 from bot.cogs.stats_refresh import week_bounds_naive_utc
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -359,6 +363,7 @@ class Util(commands.Cog):
                 )
                 res_del = await session.execute(delete_stmt)
                 total_deleted_future = res_del.rowcount or 0
+                mark_team_dirty(session, None)
 
                 # Reset Team.build_complete
                 if all_guilds:
@@ -368,20 +373,34 @@ class Util(commands.Cog):
                         update(Team).where(team_filter_for_update).values(build_complete=False)
                     )
 
-                # Set TeamWeekState with fresh budget/transfers
-                teams_stmt = select(Team.id, Team.guild_id)
-                if not all_guilds:
-                    teams_stmt = teams_stmt.where(Team.guild_id == guild_id)
-
-                teams = (await session.execute(teams_stmt)).all()
+                # Set TeamWeekState with fresh budget/transfers for every in-scope team in one upsert
+                # (SQLite needs a WHERE on the SELECT before ON CONFLICT, hence true() for all guilds)
+                teams_stmt = select(
+                    Team.guild_id,
+                    Team.id,
+                    literal(week_end, DateTime),
+                    literal(INITIAL_BUDGET, Float),
+                    literal(0, Integer),
+                ).where(Team.guild_id == guild_id if not all_guilds else true())
+
+                upsert = sqlite_insert(TeamWeekState).from_select(
+                    ["guild_id", "team_id", "week_start", "budget_remaining", "transfers_used"], teams_stmt
+                )
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=["guild_id", "team_id", "week_start"],
+                    set_={
+                        "budget_remaining": upsert.excluded.budget_remaining,
+                        "transfers_used": upsert.excluded.transfers_used,
+                    },
+                )
+                res_states = await session.execute(upsert)
+                teams_reset = res_states.rowcount or 0
 
-                for team_id, g_id in teams:
-                    state = await get_or_create_team_week_state(
-                        session, guild_id=g_id, team_id=team_id, week_start=week_end
-                    )
-                    state.budget_remaining = INITIAL_BUDGET
-                    state.transfers_used = 0
-                    teams_reset += 1
+                # Re-snapshot this week's locked rosters from the rewritten intervals, and re-rank them
+                if await week_is_locked(session, week_start):
+                    team_ids = None if all_guilds else list((await session.scalars(select(team_ids_subq))).all())
+                    await relock_teams(session, week_start, team_ids)
+                    await refresh_team_leaderboard(session, week_start, None if all_guilds else [guild_id])
 
         scope = "ALL SERVERS" if all_guilds else "this server"
         await interaction.followup.send(
@@ -474,6 +493,46 @@ class Util(commands.Cog):
             ephemeral=True
         )
 
+    @app_commands.command(
+        name="transfer_audit",
+        description="List every team's queued buys/sells for next week in this server"
+    )
+    @system_admin_only()
+    async def transfer_audit(self, interaction: discord.Interaction):
+        guild_id = interaction.guild_id
+        if not guild_id:
+            await interaction.response.send_message("Use this in a server.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        this_week, next_week = week_bounds_naive_utc("Europe/London")
+        async with SessionLocal() as session:
+            rows = await transfer_diff(session, guild_id=guild_id, this_week=this_week, next_week=next_week)
+
+        if not rows:
+            await interaction.followup.send("No transfers queued for next week.", ephemeral=True)
+            return
+
+        by_team: dict[tuple[int, str], list] = {}
+        for r in rows:
+            by_team.setdefault((r.team_id, r.team_name), []).append(r)
+
+        lines = [f"**Transfers for week starting {next_week:%d-%b}** ({len(by_team)} team(s), {len(rows)} move(s))"]
+        for (_team_id, team_name), moves in by_team.items():
+            ins = " ".join(f"<@{m.handle}>" for m in moves if m.kind == "buy") or "-"
+            outs = " ".join(f"<@{m.handle}>" for m in moves if m.kind == "sell") or "-"
+            lines.append(f"**{team_name}**: in {ins} | out {outs}")
+
+        # 2000 char message limit
+        chunk = ""
+        for line in lines:
+            if len(chunk) + len(line) + 1 > 1900:
+                await interaction.followup.send(chunk, ephemeral=True, allowed_mentions=discord.AllowedMentions.none())
+                chunk = ""
+            chunk += line + "\n"
+        if chunk:
+            await interaction.followup.send(chunk, ephemeral=True, allowed_mentions=discord.AllowedMentions.none())
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(Util(bot))
 
@@ -0,0 +1,186 @@
+# bot/utils.py
+"""Shared Discord UI helpers: batched display-name resolution and keyset paging views."""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable
+
+import discord
+from sqlalchemy import select, func, case
+
+from backend.db import SessionLocal
+from backend.models import User
+
+NO_PINGS = discord.AllowedMentions.none()
+
+NAME_CACHE_TTL_SECONDS = float(os.getenv("NAME_CACHE_TTL_SECONDS", "900"))
+NAME_CACHE_SIZE = 4096
+MEMBER_CHUNK = 100          # query_members accepts at most 100 user ids
+
+# (guild_id, discord_id) -> (expires_at, name), names fetched from Discord; least recently used first
+_name_cache: "OrderedDict[tuple[int, int], tuple[float, str]]" = OrderedDict()
+
+
+def _cached_name(guild_id: int, discord_id: int) -> str | None:
+    hit = _name_cache.get((guild_id, discord_id))
+    if hit is None:
+        return None
+    expires, name = hit
+    if expires < time.monotonic():
+        del _name_cache[(guild_id, discord_id)]
+        return None
+    _name_cache.move_to_end((guild_id, discord_id))
+    return name
+
+def _cache_name(guild_id: int, discord_id: int, name: str) -> None:
+    _name_cache[(guild_id, discord_id)] = (time.monotonic() + NAME_CACHE_TTL_SECONDS, name)
+    _name_cache.move_to_end((guild_id, discord_id))
+    while len(_name_cache) > NAME_CACHE_SIZE:
+        _name_cache.popitem(last=False)
+
+
+async def _stored_names(discord_ids: list[int], guild_id: int | None) -> dict[int, str]:
+    """Names saved on the users rows (this guild's row first, then any other guild's), one query."""
+    name = func.coalesce(User.discord_display_name, User.discord_global_name, User.discord_username)
+    stmt = select(User.discord_id, name).where(User.discord_id.in_(discord_ids), name.isnot(None))
+    if guild_id is not None:
+        stmt = stmt.order_by(case((User.discord_guild_id == guild_id, 0), else_=1))
+    out: dict[int, str] = {}
+    async with SessionLocal() as session:
+        for did, n in (await session.execute(stmt)).all():
+            out.setdefault(int(did), n)
+    return out
+
+
+async def resolve_names(guild: discord.Guild | None, discord_ids: Iterable[int | None], *,
+                        stored: dict[int, str | None] | None = None) -> dict[int, str]:
+    """
+    Display names for every id an embed needs, resolved together instead of once per row:
+      1. the gateway member cache
+      2. the names stored on the users rows (`stored` if the caller already loaded them, else one query)
+      3. names fetched from Discord earlier (TTL'd LRU)
+      4. one query_members request per 100 ids that are still missing
+    Anything left falls back to the raw id.
+    """
+    ids = list(dict.fromkeys(int(d) for d in discord_ids if d is not None))
+    guild_id = guild.id if guild else None
+    names: dict[int, str] = {}
+
+    missing = []
+    for did in ids:
+        m = guild.get_member(did) if guild else None
+        if m:
+            names[did] = m.display_name
+        else:
+            missing.append(did)
+
+    if missing:
+        known = {did: n for did, n in (stored or {}).items() if n}
+        unknown = [did for did in missing if did not in known]
+        if unknown:
+            known.update(await _stored_names(unknown, guild_id))
+        for did in missing:
+            if did in known:
+                names[did] = known[did]
+        missing = [did for did in missing if did not in names]
+
+    if missing and guild:
+        still = []
+        for did in missing:
+            hit = _cached_name(guild.id, did)
+            if hit is not None:
+                names[did] = hit
+            else:
+                still.append(did)
+        for start in range(0, len(still), MEMBER_CHUNK):
+            chunk = still[start:start + MEMBER_CHUNK]
+            try:
+                for m in await guild.query_members(user_ids=chunk, limit=len(chunk)):
+                    names[m.id] = m.display_name
+                    _cache_name(guild.id, m.id, m.display_name)
+            except (discord.HTTPException, discord.ClientException, asyncio.TimeoutError):
+                break
+
+    for did in ids:
+        names.setdefault(did, str(did))
+    return names
+
+# fetch(cursor, page_index) -> (embed, next_cursor); cursor None = first page, next_cursor None = last page
+PageFetch = Callable[[Any, int], Awaitable[tuple[discord.Embed, Any]]]
+
+
+class KeysetPager(discord.ui.View):
+    """
+    Prev / Next buttons over a keyset-paginated query.
+
+    Each page is fetched on demand from the cursor the previous page returned (the last row's
+    sort key), so page 20 costs the same as page 1. Cursors of pages already seen are kept, so
+    Prev is just a re-fetch from the stored cursor.
+    """
+
+    def __init__(self, fetch: PageFetch, *, author_id: int, timeout: float = 180):
+        super().__init__(timeout=timeout)
+        self.fetch = fetch
+        self.author_id = author_id
+        self.cursors: list[Any] = [None]       # cursors[i] = cursor that loads page i
+        self.next_cursor: Any = None
+        self.message: discord.Message | None = None
+
+    @property
+    def page(self) -> int:
+        return len(self.cursors) - 1
+
+    def _sync_buttons(self) -> None:
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.next_cursor is None
+
+    async def _load(self) -> discord.Embed:
+        embed, self.next_cursor = await self.fetch(self.cursors[-1], self.page)
+        self._sync_buttons()
+        return embed
+
+    async def start(self, interaction: discord.Interaction, *, ephemeral: bool = False) -> None:
+        """Send page one as a followup (the interaction must already be deferred)."""
+        embed = await self._load()
+        if self.next_cursor is None:
+            # single page, no buttons needed
+            await interaction.followup.send(embed=embed, ephemeral=ephemeral, allowed_mentions=NO_PINGS)
+            self.stop()
+            return
+        self.message = await interaction.followup.send(
+            embed=embed, view=self, ephemeral=ephemeral, allowed_mentions=NO_PINGS, wait=True
+        )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message(
+                "Only the person who ran the command can change pages.", ephemeral=True
+            )
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await interaction.response.defer()      # page fetch + name lookups can take a moment
+        embed = await self._load()
+        await interaction.edit_original_response(embed=embed, view=self)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.next_cursor is not None:
+            self.cursors.append(self.next_cursor)
+        await interaction.response.defer()
+        embed = await self._load()
+        await interaction.edit_original_response(embed=embed, view=self)
+
+    async def on_timeout(self) -> None:
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
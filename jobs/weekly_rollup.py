@@ -0,0 +1,42 @@
+# jobs/weekly_rollup.py
+"""
+Monday job: lock this week's rosters into team_week_roster and rank the week on them.
+
+    python -m jobs.weekly_rollup                       # lock the current week
+    python -m jobs.weekly_rollup --week 2025-09-28T23:00  # lock / re-rank a specific (past) week key
+
+/leaderboard only reads the ranks scoring runs write, so --week is also how a week scored before
+the ranked tables existed gets onto the leaderboard.
+
+Run it from cron just after Monday 00:00 Europe/London. Safe to run more than once,
+and the next scoring run locks the week anyway if it never runs (/team show reads the
+intervals until then).
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from backend.db import SessionLocal, init_db
+from backend.services.week_lock import lock_week
+from backend.services.leaderboard import refresh_leaderboards
+from backend.services.leetify_api import week_bounds_naive_utc
+
+
+async def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--week", default=None, help="UTC-naive week key (ISO format), default: current week")
+    args = ap.parse_args(argv)
+
+    week_start = datetime.fromisoformat(args.week) if args.week else week_bounds_naive_utc("Europe/London")[0]
+
+    await init_db()
+    async with SessionLocal() as session:
+        async with session.begin():
+            rows = await lock_week(session, week_start)
+            await refresh_leaderboards(session, week_start)
+    print(f"Locked week {week_start}: {rows} roster rows")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
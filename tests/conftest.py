@@ -0,0 +1,27 @@
+# tests/conftest.py
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend import models  # noqa: F401  (registers every table on Base.metadata)
+from backend.db import Base
+from backend.services import roster_cache, week_lock
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh SQLite database with every table; yields a session factory."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    roster_cache.invalidate_team()
+    week_lock._locked_weeks.clear()
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    roster_cache.invalidate_team()
+    week_lock._locked_weeks.clear()
+    asyncio.run(engine.dispose())
@@ -0,0 +1,96 @@
+# tests/test_leaderboard.py
+"""Materialised leaderboards: reads never rank, scoring runs do; /team history adds up the same rosters."""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, delete
+
+from backend.models import User, Player, Team, TeamPlayer, WeeklyPoints, WeekLock, PlayerLeaderboard
+from backend.services.history import team_history
+from backend.services.leaderboard import refresh_leaderboards, read_player_leaderboard, read_team_leaderboard, \
+    read_global_leaderboard, read_team_page
+from backend.services.week_lock import lock_week
+
+GUILD = 1
+WEEK = datetime(2025, 3, 3)
+
+
+async def _scored_week(Session):
+    async with Session() as s, s.begin():
+        owner = User(discord_id=100, discord_guild_id=GUILD)
+        s.add(owner)
+        await s.flush()
+        team = Team(owner_id=owner.id, name="t", guild_id=GUILD)
+        s.add(team)
+        await s.flush()
+        for d, score in ((1, 5.0), (2, 7.0)):
+            u = User(discord_id=d, discord_guild_id=GUILD, steam_id=f"steam{d}")
+            s.add(u)
+            await s.flush()
+            p = Player(user_id=u.id, handle=str(d))
+            s.add(p)
+            await s.flush()
+            s.add(TeamPlayer(team_id=team.id, player_id=p.id, effective_from_week=WEEK))
+            s.add(WeeklyPoints(week_start=WEEK, guild_id=GUILD, user_id=u.id, ruleset_id=1, weekly_score=score))
+
+
+async def _reads(s):
+    return (await read_player_leaderboard(s, GUILD, WEEK), await read_team_leaderboard(s, GUILD, WEEK),
+            await read_global_leaderboard(s, WEEK), await read_team_page(s, GUILD, WEEK, top=3))
+
+
+def test_reads_of_an_unranked_week_are_empty_and_write_nothing(db):
+    async def go():
+        await _scored_week(db)
+        async with db() as s, s.begin():
+            assert await _reads(s) == ([], [], [], [])
+        async with db() as s:
+            assert await s.scalar(select(func.count()).select_from(WeekLock)) == 0
+            assert await s.scalar(select(func.count()).select_from(PlayerLeaderboard)) == 0
+
+        async with db() as s, s.begin():
+            assert await refresh_leaderboards(s, WEEK) == (2, 1)
+        async with db() as s:
+            players, teams, accounts, page = await _reads(s)
+        assert [r.discord_id for r in players] == [2, 1]
+        assert [r.discord_id for r in accounts] == [2, 1]
+        assert [(r.team_name, r.points) for r in teams] == [("t", 12.0)]
+        assert page[0].top == [(2, 7.0), (1, 5.0)]
+
+    asyncio.run(go())
+
+
+def test_ties_go_to_the_lower_discord_id_on_every_board(db):
+    async def go():
+        await _scored_week(db)
+        async with db() as s, s.begin():
+            await s.execute(WeeklyPoints.__table__.update().values(weekly_score=5.0))
+            await refresh_leaderboards(s, WEEK)
+        async with db() as s:
+            players, _, accounts, page = await _reads(s)
+        assert [(r.rank, r.discord_id) for r in players] == [(1, 1), (2, 2)]
+        assert [(r.rank, r.discord_id) for r in accounts] == [(1, 1), (2, 2)]
+        assert page[0].top == [(1, 5.0), (2, 5.0)]
+
+    asyncio.run(go())
+
+
+def test_team_history_matches_the_leaderboard_on_locked_weeks(db):
+    async def go():
+        await _scored_week(db)
+        async with db() as s, s.begin():
+            await lock_week(s, WEEK)
+            await refresh_leaderboards(s, WEEK)
+            # rosters rewritten after the lock: player 2's interval gone, so only the snapshot has them
+            team_id = await s.scalar(select(Team.id))
+            p2 = await s.scalar(select(Player.id).where(Player.handle == "2"))
+            await s.execute(delete(TeamPlayer).where(TeamPlayer.player_id == p2))
+
+        async with db() as s:
+            board = await read_team_leaderboard(s, GUILD, WEEK)
+            locked, unlocked = await team_history(s, team_id, [WEEK, WEEK + timedelta(days=7)])
+        assert locked.total == board[0].points == 12.0
+        assert sorted(locked.points.values()) == [5.0, 7.0]
+        assert len(unlocked.player_ids) == 1           # not locked: the intervals
+
+    asyncio.run(go())
@@ -0,0 +1,200 @@
+# tests/test_market.py
+"""apply_transfers: sells, budget, team size and the weekly transfer cap."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from backend.models import User, Player, Team, TeamPlayer, TeamWeekState
+from backend.services import market
+from backend.services.leetify_api import week_bounds_naive_utc
+from backend.services.market import apply_transfers, INITIAL_BUDGET, MAX_TEAM_SIZE
+
+GUILD = 1
+OWNER = 1000
+THIS_WEEK = datetime(2025, 3, 3)
+NEXT_WEEK = THIS_WEEK + timedelta(days=7)
+LAST_WEEK = THIS_WEEK - timedelta(days=7)
+
+
+async def _setup(Session, *, roster=(), prices=None):
+    """Owner + team, and players 1..8 (discord ids 1..8) priced prices[d] (default 1000)."""
+    prices = prices or {}
+    async with Session() as s, s.begin():
+        owner = User(discord_id=OWNER, discord_guild_id=GUILD, steam_id="owner")
+        s.add(owner)
+        await s.flush()
+        team = Team(owner_id=owner.id, name="t", guild_id=GUILD)
+        s.add(team)
+        for d in range(1, 9):
+            u = User(discord_id=d, discord_guild_id=GUILD, steam_id=f"steam{d}")
+            s.add(u)
+            await s.flush()
+            s.add(Player(user_id=u.id, handle=str(d), price=prices.get(d, 1000)))
+        await s.flush()
+        for d in roster:
+            pid = await s.scalar(select(Player.id).where(Player.handle == str(d)))
+            s.add(TeamPlayer(team_id=team.id, player_id=pid, effective_from_week=LAST_WEEK))
+        return team.id
+
+
+async def _transfer(Session, sells=(), buys=()):
+    async with Session() as s, s.begin():
+        return await apply_transfers(s, guild_id=GUILD, owner_discord_id=OWNER, sells=list(sells),
+                                     buys=list(buys), this_week=THIS_WEEK, next_week=NEXT_WEEK)
+
+
+async def _state(Session, team_id, week):
+    async with Session() as s:
+        return await s.scalar(select(TeamWeekState).where(TeamWeekState.team_id == team_id,
+                                                          TeamWeekState.week_start == week))
+
+
+def test_sell_refunds_once(db):
+    async def go():
+        team_id = await _setup(db, roster=[1, 2])
+        first = await _transfer(db, sells=[1])
+        assert first.problem is None
+        assert first.budget_after == INITIAL_BUDGET + 1000
+
+        # already scheduled out: on this week's roster but not next week's
+        again = await _transfer(db, sells=[1])
+        assert again.problem == "not_on_team" and again.problem_member == 1
+        assert (await _state(db, team_id, NEXT_WEEK)).budget_remaining == INITIAL_BUDGET + 1000
+    asyncio.run(go())
+
+
+def test_sell_does_not_use_a_transfer(db):
+    async def go():
+        team_id = await _setup(db, roster=[1, 2])
+        batch = await _transfer(db, sells=[1])
+        assert batch.transfers_used == 0
+        assert (await _state(db, team_id, THIS_WEEK)).transfers_used == 0
+    asyncio.run(go())
+
+
+def test_selling_a_queued_buy_cancels_it(db):
+    async def go():
+        team_id = await _setup(db, roster=[1])
+        assert (await _transfer(db, buys=[2])).problem is None
+        batch = await _transfer(db, sells=[2])
+        assert batch.problem is None and batch.budget_after == INITIAL_BUDGET
+        async with db() as s:
+            rows = (await s.scalars(select(TeamPlayer).where(TeamPlayer.team_id == team_id))).all()
+        assert len(rows) == 1
+    asyncio.run(go())
+
+
+def test_transfer_cap(db, monkeypatch):
+    monkeypatch.setattr(market, "TRANSFERS_PER_WEEK", 1)
+
+    async def go():
+        team_id = await _setup(db, roster=[1, 2])
+        assert (await _transfer(db, buys=[3, 4])).problem == "transfer_cap"
+
+        one = await _transfer(db, sells=[1], buys=[3])
+        assert one.problem is None and one.transfers_used == 1
+        assert (await _transfer(db, buys=[4])).problem == "transfer_cap"
+        assert (await _state(db, team_id, THIS_WEEK)).transfers_used == 1
+    asyncio.run(go())
+
+
+def test_buying_back_this_weeks_player_is_not_capped(db, monkeypatch):
+    monkeypatch.setattr(market, "TRANSFERS_PER_WEEK", 1)
+
+    async def go():
+        await _setup(db, roster=[1, 2])
+        assert (await _transfer(db, sells=[1], buys=[3])).transfers_used == 1
+        async with db() as s:
+            v = await market.validate_transfer_in(s, guild_id=GUILD, owner_discord_id=OWNER,
+                                                  target_discord_id=1, this_week=THIS_WEEK,
+                                                  next_week=NEXT_WEEK)
+        # 1 still plays this week, so buying them back for next week isn't a transfer
+        assert not v.counts_as_transfer and v.problem is None
+        async with db() as s, s.begin():
+            assert await market.apply_transfer_in(s, v) == (INITIAL_BUDGET - 1000, 1)
+    asyncio.run(go())
+
+
+def test_no_cap_before_first_lock(db, monkeypatch):
+    monkeypatch.setattr(market, "TRANSFERS_PER_WEEK", 1)
+
+    async def go():
+        await _setup(db)
+        batch = await _transfer(db, buys=[1, 2, 3])
+        assert batch.problem is None and batch.transfers_used == 0
+    asyncio.run(go())
+
+
+def test_transfer_count_uses_the_week_of_now(db):
+    async def go():
+        team_id = await _setup(db, roster=[1])
+        now = datetime(2025, 3, 5, 12, tzinfo=timezone.utc)
+        this_week, next_week = week_bounds_naive_utc("Europe/London", now=now)
+        async with db() as s, s.begin():
+            batch = await apply_transfers(s, guild_id=GUILD, owner_discord_id=OWNER, sells=[1], buys=[2],
+                                          this_week=this_week, next_week=next_week)
+        assert batch.problem is None
+        async with db() as s:
+            assert await market.transfer_count_for_next_week(s, team_id, now) == 2
+            assert await market.transfer_count_for_next_week(s, team_id, now + timedelta(days=7)) == 0
+    asyncio.run(go())
+
+
+def test_budget_checked_on_final_roster(db):
+    async def go():
+        await _setup(db, roster=[1], prices={1: 20000, 2: 25000, 3: 20000})
+        assert (await _transfer(db, buys=[2, 3])).problem == "budget"
+
+        # selling 1 pays for 2 in the same batch
+        batch = await _transfer(db, sells=[1], buys=[2])
+        assert batch.problem is None
+        assert batch.budget_after == INITIAL_BUDGET + 20000 - 25000
+    asyncio.run(go())
+
+
+def test_team_size(db):
+    async def go():
+        await _setup(db, roster=range(1, MAX_TEAM_SIZE + 1))
+        assert (await _transfer(db, buys=[MAX_TEAM_SIZE + 1])).problem == "team_full"
+        assert (await _transfer(db, sells=[1], buys=[MAX_TEAM_SIZE + 1])).problem is None
+    asyncio.run(go())
+
+
+@pytest.mark.parametrize("sells,buys,problem", [
+    ([], [], "empty"),
+    ([1], [1], "sell_and_buy"),
+    ([7], [], "not_on_team"),
+    ([], [1], "already_queued"),
+    ([], [99], "not_registered"),
+])
+def test_rejections(db, sells, buys, problem):
+    async def go():
+        await _setup(db, roster=[1])
+        assert (await _transfer(db, sells, buys)).problem == problem
+    asyncio.run(go())
+
+
+async def _register_without_player(Session, discord_id, steam_id="new"):
+    async with Session() as s, s.begin():
+        s.add(User(discord_id=discord_id, discord_guild_id=GUILD, steam_id=steam_id))
+
+
+def test_registered_user_without_player_row(db):
+    async def go():
+        await _setup(db, roster=[1])
+        await _register_without_player(db, 50)
+        await _register_without_player(db, 51, steam_id=None)
+
+        # the Player row is created (so /pricing update can price it), the buy waits for a price
+        assert (await _transfer(db, buys=[50])).problem == "no_price"
+        assert (await _transfer(db, buys=[51])).problem == "not_registered"
+        async with db() as s:
+            handles = set((await s.scalars(select(Player.handle))).all())
+            v = await market.validate_transfer_in(s, guild_id=GUILD, owner_discord_id=OWNER,
+                                                  target_discord_id=50, this_week=THIS_WEEK,
+                                                  next_week=NEXT_WEEK)
+        assert "50" in handles and "51" not in handles
+        assert v.problem == "no_price" and v.player_id is not None
+    asyncio.run(go())
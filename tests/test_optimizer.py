@@ -0,0 +1,76 @@
+# tests/test_optimizer.py
+"""k_skyline and solve against brute force on small random pools."""
+import itertools
+import random
+
+import pytest
+
+from backend.services.optimizer import Candidate, k_skyline, solve
+
+
+def _pool(rng, n, *, int_points=False):
+    return [
+        Candidate(pid, str(pid), rng.choice(range(1000, 6000, 500)),
+                  float(rng.randrange(0, 6)) if int_points else round(rng.uniform(0, 10), 3))
+        for pid in range(1, n + 1)
+    ]
+
+
+def _dominators(c, cands):
+    return sum(1 for d in cands if d is not c and d.price <= c.price and d.points >= c.points)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_k_skyline_matches_brute_force(seed):
+    rng = random.Random(seed)
+    cands = _pool(rng, rng.randrange(1, 25))
+    for k in range(1, 5):
+        kept = {c.player_id for c in k_skyline(cands, k)}
+        assert kept == {c.player_id for c in cands if _dominators(c, cands) < k}
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_k_skyline_with_ties_only_drops_dominated(seed):
+    # equal (price, points) players beat each other; the skyline keeps enough of them, brute force can't say which
+    rng = random.Random(seed)
+    cands = _pool(rng, rng.randrange(1, 25), int_points=True)
+    for k in range(1, 5):
+        kept = k_skyline(cands, k)
+        for c in cands:
+            if c not in kept:
+                assert _dominators(c, kept) >= k
+
+
+def _brute(cands, *, budget, size, current, max_changes):
+    best = 0.0
+    for n in range(size + 1):
+        for combo in itertools.combinations(cands, n):
+            if sum(c.price for c in combo) > budget:
+                continue
+            if max_changes is not None and sum(c.player_id not in current for c in combo) > max_changes:
+                continue
+            best = max(best, sum(c.points for c in combo))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_solve_matches_brute_force(seed):
+    rng = random.Random(seed)
+    cands = _pool(rng, rng.randrange(1, 11), int_points=seed % 2 == 0)
+    size = rng.randrange(1, 6)
+    budget = rng.randrange(0, 20_000, 250)
+    current = frozenset(c.player_id for c in rng.sample(cands, rng.randrange(0, min(size, len(cands)) + 1)))
+    max_changes = rng.choice([None, 0, 1, 2])
+
+    sol = solve(cands, budget=budget, size=size, current=current, max_changes=max_changes)
+
+    by_id = {c.player_id: c for c in cands}
+    picked = [by_id[p] for p in sol.player_ids]
+    assert sol.optimal
+    assert len(set(sol.player_ids)) == len(picked) <= size
+    assert sol.cost == sum(c.price for c in picked) <= budget
+    if max_changes is not None:
+        assert sum(p not in current for p in sol.player_ids) <= max_changes
+    assert sol.points == pytest.approx(sum(c.points for c in picked))
+    assert sol.points == pytest.approx(_brute(cands, budget=budget, size=size, current=current,
+                                              max_changes=max_changes))
@@ -0,0 +1,112 @@
+# tests/test_pricing.py
+"""refresh_all_players: no write lock held while Leetify is fetched, failed fetches keep the old ranks.
+price_diff_pages ordering."""
+import asyncio
+
+from sqlalchemy import select, update
+
+from backend.models import User, Player, LeetifyProfileCache
+from backend.services import pricing, profile_cache, db_retry
+
+
+def _use_db(monkeypatch, Session):
+    monkeypatch.setattr(pricing, "SessionLocal", Session)
+    monkeypatch.setattr(db_retry, "SessionLocal", Session)
+    profile_cache.invalidate_profile()
+
+
+async def _players(Session, n):
+    async with Session() as s, s.begin():
+        for d in range(1, n + 1):
+            u = User(discord_id=d, discord_guild_id=1, steam_id=f"7656{d}")
+            s.add(u)
+            await s.flush()
+            s.add(Player(user_id=u.id, handle=str(d)))
+
+
+def test_fetch_runs_outside_a_transaction(db, monkeypatch):
+    _use_db(monkeypatch, db)
+    monkeypatch.setattr(pricing, "REFRESH_WRITE_BATCH", 2)
+    writes_during_fetch = []
+
+    async def fetch(steam_id):
+        # another command writing while we wait on the network must not hit "database is locked"
+        async with db() as s, s.begin():
+            await s.execute(update(User).where(User.steam_id == steam_id).values(discord_username="x"))
+        writes_during_fetch.append(steam_id)
+        return 200, {"ranks": {"premier": 20000, "faceit_elo": 2000, "renown": 9000}}
+
+    monkeypatch.setattr(profile_cache, "fetch_profile_status", fetch)
+
+    async def go():
+        await _players(db, 5)
+        results = await pricing.refresh_all_players()
+        assert len(writes_during_fetch) == 5
+        assert all(r["ok"] for r in results) and len(results) == 5
+        async with db() as s:
+            assert set((await s.scalars(select(Player.premier_elo))).all()) == {20000}
+            assert len((await s.scalars(select(LeetifyProfileCache))).all()) == 5
+    asyncio.run(go())
+
+
+def test_failed_fetch_is_skipped(db, monkeypatch):
+    _use_db(monkeypatch, db)
+
+    async def fetch(steam_id):
+        if steam_id == "76562":
+            raise RuntimeError("boom")
+        return 200, {"ranks": {"premier": 15000}}
+
+    monkeypatch.setattr(profile_cache, "fetch_profile_status", fetch)
+
+    async def go():
+        await _players(db, 3)
+        results = {r["discord_id"]: r for r in await pricing.refresh_all_players()}
+        assert not results["2"]["ok"] and results["2"]["reason"] == "boom"
+        assert results["1"]["ok"] and results["3"]["ok"]
+        async with db() as s:
+            elo = dict((await s.execute(select(Player.handle, Player.premier_elo))).all())
+        assert elo == {"1": 15000, "2": None, "3": 15000}
+    asyncio.run(go())
+
+
+def test_non_200_answer_keeps_stored_ranks(db, monkeypatch):
+    _use_db(monkeypatch, db)
+
+    async def fetch(steam_id):
+        return {"76561": (200, {"ranks": {"premier": 15000}}), "76562": (429, None),
+                "76563": (None, None), "76564": (404, None)}[steam_id]
+
+    monkeypatch.setattr(profile_cache, "fetch_profile_status", fetch)
+
+    async def go():
+        await _players(db, 4)
+        async with db() as s, s.begin():
+            await s.execute(update(Player).values(premier_elo=12345))
+        results = {r["discord_id"]: r for r in await pricing.refresh_all_players()}
+        assert results["2"]["reason"] == "leetify_status_429" and results["3"]["reason"] == "leetify_unreachable"
+        async with db() as s:
+            elo = dict((await s.execute(select(Player.handle, Player.premier_elo))).all())
+            cached = set((await s.scalars(select(LeetifyProfileCache.steam_id))).all())
+        assert elo == {"1": 15000, "2": 12345, "3": 12345, "4": None}     # a 404 means no account
+        assert cached == {"76561", "76564"}
+    asyncio.run(go())
+
+
+def test_price_diff_pages_match_a_full_sort(db):
+    async def go():
+        async with db() as s, s.begin():
+            for d in range(1, 31):
+                s.add(Player(handle=str(d), faceit_elo=400 + 97 * d, leetify_l100_avg=(d % 7) - 3.0,
+                             price=None if d % 5 == 0 else 1000 + 211 * (d % 9)))
+        async with db() as s:
+            rows = await pricing.compute_and_persist_prices(s, dry_run=True)
+            pages = await pricing.price_diff_pages(s, page_size=4, pages=3)
+            assert await s.scalar(select(Player.price).where(Player.handle == "5")) is None  # nothing written
+
+        movers = sorted((r for r in rows if r["old_price"] != r["price"]),
+                        key=lambda r: (-abs(r["price"] - (r["old_price"] or 0)), r["player_id"]))
+        assert [len(p) for p in pages] == [4, 4, 4]
+        assert [r for p in pages for r in p] == movers[:12]
+
+    asyncio.run(go())
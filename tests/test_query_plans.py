@@ -0,0 +1,223 @@
+# tests/test_query_plans.py
+"""
+Query-plan regression check for the hot leaderboard / scoring / roster queries.
+
+Builds a synthetic pool (benchmarks.synthetic) once per run, runs each hot service call with a
+statement recorder on the engine, then runs EXPLAIN QUERY PLAN on every statement it issued, with
+the same parameters. A statement fails when its plan
+  - scans a whole table (SCAN <table>, with or without an index), or
+  - sorts in a temp b-tree (USE TEMP B-TREE FOR ORDER BY / GROUP BY / DISTINCT)
+unless that hot call lists it under `allow` with the reason. Scans of CTEs and subqueries are fine,
+they're over rows the query already narrowed down.
+"""
+import asyncio
+import contextlib
+import io
+import re
+from datetime import timedelta
+
+import pytest
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from backend.db import Base
+from backend.models import Team, User
+from backend.services import history
+from backend.services.history import team_history, points_series
+from backend.services.leaderboard import refresh_leaderboards, read_player_leaderboard, read_team_leaderboard, \
+    read_team_page, read_closed_team_leaderboard, read_global_leaderboard
+from backend.services.market import transfer_diff
+from backend.services.optimizer import load_candidates
+from backend.services.pricing import price_page
+from backend.services.repo import leetify_l100_avg_for_steam
+from backend.services.schema import ensure_schema
+from backend.services.team_card import load_team_card
+from backend.services.week_lock import lock_week
+from backend.services.leetify_api import week_bounds_naive_utc
+from bot.cogs.stats_refresh import aggregate_week_from_db
+from benchmarks.synthetic import Scale, build_pool
+
+# name -> (async fn(session, pool), {plan problem: reason it's acceptable})
+HOT_QUERIES = {}
+
+# ranking a week, once per scoring run rather than per read: teams are sorted on a sum and global
+# accounts on their latest score across guilds, neither of which an index can hold
+RANKING = {
+    "USE TEMP B-TREE FOR GROUP BY": "groups the week's roster rows into one row per team",
+    "USE TEMP B-TREE FOR ORDER BY": "sorts per-team sums / each account's latest score into rank order",
+}
+# a page of teams with their top players: sorts only the page's handful of roster rows
+CONTRIBUTORS = {
+    "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY": "numbers each page team's roster rows by points",
+    "USE TEMP B-TREE FOR ORDER BY": "orders the page's contributor rows under their team",
+}
+LOCK = {"SCAN teams": "the weekly lock snapshots every team's roster"}
+
+
+def hot(name: str, allow: dict[str, str] | None = None):
+    def deco(fn):
+        HOT_QUERIES[name] = (fn, allow or {})
+        return fn
+    return deco
+
+
+@hot("refresh_leaderboards", allow=RANKING)
+async def _refresh(session, pool):
+    await refresh_leaderboards(session, pool.week_start, [pool.guild_ids[0]])
+
+@hot("refresh_leaderboards_all_guilds", allow=RANKING)
+async def _refresh_all(session, pool):
+    await refresh_leaderboards(session, pool.week_start)
+
+@hot("read_player_leaderboard")
+async def _read_player(session, pool):
+    await read_player_leaderboard(session, pool.guild_ids[0], pool.week_start, 26, after_rank=25)
+
+@hot("read_team_leaderboard")
+async def _read_team(session, pool):
+    await read_team_leaderboard(session, pool.guild_ids[0], pool.week_start, 26, after_rank=25)
+
+@hot("read_global_leaderboard")
+async def _read_global(session, pool):
+    await read_global_leaderboard(session, pool.week_start, 26, after_rank=25)
+
+@hot("read_team_page", allow=CONTRIBUTORS)
+async def _team_page(session, pool):
+    await read_team_page(session, pool.guild_ids[0], pool.week_start, 26, after_rank=25, top=3)
+
+@hot("read_closed_team_leaderboard", allow=CONTRIBUTORS)
+async def _read_closed(session, pool):
+    await read_closed_team_leaderboard(session, pool.guild_ids[0], pool.week_start - timedelta(days=7), 25)
+
+@hot("aggregate_week_from_db")
+async def _aggregate(session, pool):
+    await aggregate_week_from_db(session, steam_id=int(pool.steam_ids[0]), week_start_utc=pool.week_start)
+
+@hot("leetify_l100_avg")
+async def _l100(session, pool):
+    await leetify_l100_avg_for_steam(session, pool.steam_ids[0])
+
+@hot("team_history")
+async def _history(session, pool):
+    weeks = [pool.week_start - timedelta(days=7 * k) for k in range(pool.scale.weeks)]
+    await team_history(session, pool.team_ids[0], weeks)
+
+@hot("points_series")
+async def _points_series(session, pool):
+    history._series.clear()         # cold: versions and lines
+    user_ids = (await session.scalars(select(User.id).where(User.discord_guild_id == pool.guild_ids[0]).limit(5))).all()
+    await points_series(session, pool.guild_ids[0], list(user_ids))
+
+@hot("load_team_card", allow={
+    "USE TEMP B-TREE FOR ORDER BY": "orders the team's handful of roster rows by handle",
+    "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY": "picks each roster player's latest score from their few weeks",
+})
+async def _team_card(session, pool):
+    team = await session.get(Team, pool.team_ids[0])
+    owner = await session.get(User, team.owner_id)
+    await load_team_card(session, guild_id=team.guild_id, discord_id=owner.discord_id,
+                         week_start=pool.week_start, locked=True)
+
+@hot("lock_week", allow=LOCK)
+async def _lock(session, pool):
+    await lock_week(session, pool.week_start + timedelta(days=7))
+
+@hot("transfer_diff", allow={"USE TEMP B-TREE FOR ORDER BY": "orders the guild's buys and sells for display"})
+async def _transfer_diff(session, pool):
+    await transfer_diff(session, guild_id=pool.guild_ids[0], this_week=pool.week_start,
+                        next_week=pool.week_start + timedelta(days=7))
+
+@hot("price_page")
+async def _price_page(session, pool):
+    first = await price_page(session, limit=20)
+    await price_page(session, after=(first[-1][2], first[-1][0]), limit=20)
+
+@hot("load_candidates", allow={"SCAN players": "every priced player is a candidate"})
+async def _candidates(session, pool):
+    await load_candidates(session, pool.guild_ids[0], source="recent")
+
+
+_SKIP = re.compile(r"^\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)", re.I)
+_SCAN = re.compile(r"^SCAN (\w+)")
+_TEMP = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY|LAST TERM OF ORDER BY)")
+
+
+def problems(plan: list[str], tables: set[str]) -> list[str]:
+    """The plan lines this check objects to."""
+    out = []
+    for detail in plan:
+        m = _SCAN.match(detail)
+        if m and m.group(1) in tables:
+            out.append(f"SCAN {m.group(1)}")
+        m = _TEMP.search(detail)
+        if m:
+            out.append(m.group(0))
+    return out
+
+
+@pytest.fixture(scope="module")
+def plan_db(tmp_path_factory):
+    """(database url, pool): 2,000 players in 5 guilds, every week ranked, ANALYZEd."""
+    url = f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    scale = Scale(players=2000, guilds=5, games_per_player=10, weeks=6)
+
+    async def build():
+        engine = create_async_engine(url)
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await ensure_schema(conn)
+        week_start, _ = week_bounds_naive_utc("Europe/London")
+        with contextlib.redirect_stdout(io.StringIO()):
+            async with Session() as session, session.begin():
+                pool = await build_pool(session, scale, week_start)
+                # every week materialised, like a database that's been running a while
+                for w in range(scale.weeks):
+                    await refresh_leaderboards(session, week_start - timedelta(days=7 * w))
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("ANALYZE")
+        await engine.dispose()
+        return pool
+
+    return url, asyncio.run(build())
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_query_uses_indexes(plan_db, name):
+    url, pool = plan_db
+    fn, allow = HOT_QUERIES[name]
+    tables = set(Base.metadata.tables)
+
+    async def go():
+        engine = create_async_engine(url)
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        recorded: list[tuple[str, object]] = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and not _SKIP.match(statement):
+                recorded.append((statement, parameters))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            async with Session() as session:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    await fn(session, pool)
+                statements = list(recorded)
+                event.remove(engine.sync_engine, "before_cursor_execute", record)
+                bad = []
+                for sql, params in statements:
+                    conn = await session.connection()
+                    plan = [r[-1] for r in (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params)).all()]
+                    issues = [p for p in problems(plan, tables) if p not in allow]
+                    if issues:
+                        bad.append(f"{', '.join(issues)}\n  in: {' '.join(sql.split())[:200]}\n    "
+                                   + "\n    ".join(plan))
+                await session.rollback()
+        finally:
+            await engine.dispose()
+        return statements, bad
+
+    statements, bad = asyncio.run(go())
+    assert statements, f"{name} issued no statements"
+    assert not bad, "full scan or temp b-tree sort:\n" + "\n".join(bad)
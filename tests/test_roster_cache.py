@@ -0,0 +1,102 @@
+# tests/test_roster_cache.py
+"""Roster cache: invalidation races, and sweep_rosters / roster_at against the SQL predicate."""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, or_
+
+from backend.models import User, Player, Team, TeamPlayer
+from backend.services import roster_cache
+from backend.services.history import sweep_rosters
+from backend.services.roster_cache import team_intervals, roster_at, mark_team_dirty
+
+WEEK0 = datetime(2025, 1, 6)
+WEEKS = [WEEK0 + timedelta(days=7 * k) for k in range(12)]
+
+
+async def _team(Session, intervals):
+    async with Session() as s, s.begin():
+        owner = User(discord_id=1, discord_guild_id=1)
+        s.add(owner)
+        await s.flush()
+        team = Team(owner_id=owner.id, name="t", guild_id=1)
+        s.add(team)
+        await s.flush()
+        for handle, frm, to in intervals:
+            player = await s.scalar(select(Player).where(Player.handle == handle))
+            if player is None:
+                player = Player(handle=handle)
+                s.add(player)
+                await s.flush()
+            s.add(TeamPlayer(team_id=team.id, player_id=player.id, effective_from_week=frm, effective_to_week=to))
+        return team.id
+
+
+def _random_intervals(rng, players=8):
+    out = []
+    for p in range(players):
+        at = rng.randrange(len(WEEKS))
+        while at < len(WEEKS) and len(out) < 40:
+            to = at + rng.randrange(1, 5)
+            out.append((str(p), WEEKS[at], WEEKS[to] if to < len(WEEKS) and rng.random() < 0.8 else None))
+            if out[-1][2] is None:
+                break
+            at = to + rng.randrange(0, 3)
+    return out
+
+
+async def _sql_roster(session, team_id, week):
+    return sorted((await session.scalars(
+        select(TeamPlayer.player_id).where(
+            TeamPlayer.team_id == team_id,
+            TeamPlayer.effective_from_week <= week,
+            or_(TeamPlayer.effective_to_week.is_(None), TeamPlayer.effective_to_week > week),
+        )
+    )).all())
+
+
+def test_roster_at_and_sweep_match_sql(db):
+    async def go():
+        for seed in range(5):
+            roster_cache.invalidate_team()
+            async with db() as s, s.begin():
+                for model in (TeamPlayer, Team, Player, User):
+                    await s.execute(model.__table__.delete())
+            team_id = await _team(db, _random_intervals(random.Random(seed)))
+            async with db() as s:
+                intervals = await team_intervals(s, team_id)
+                swept = sweep_rosters(intervals, WEEKS)
+                for week, roster in zip(WEEKS, swept):
+                    expected = await _sql_roster(s, team_id, week)
+                    assert sorted(roster_at(intervals, week)) == expected, (seed, week)
+                    assert roster == expected, (seed, week)
+    asyncio.run(go())
+
+
+def test_load_racing_an_invalidation_is_not_cached(db, monkeypatch):
+    async def go():
+        team_id = await _team(db, [("a", WEEK0, None)])
+        real_load = roster_cache._load_intervals
+
+        async def load_then_commit_elsewhere(session, tid):
+            stale = await real_load(session, tid)
+            # another session commits a roster change while this read is in flight
+            async with db() as other, other.begin():
+                tp = await other.scalar(select(TeamPlayer).where(TeamPlayer.team_id == tid))
+                tp.effective_to_week = WEEKS[1]
+                mark_team_dirty(other, tid)
+            return stale
+
+        monkeypatch.setattr(roster_cache, "_load_intervals", load_then_commit_elsewhere)
+        async with db() as s:
+            stale = await team_intervals(s, team_id)
+        assert stale[0][2] is None                      # that reader saw the old roster once...
+        assert team_id not in roster_cache._intervals   # ...but didn't cache it
+
+        monkeypatch.setattr(roster_cache, "_load_intervals", real_load)
+        async with db() as s:
+            fresh = await team_intervals(s, team_id)
+        assert fresh[0][2] == WEEKS[1]
+        assert roster_cache._intervals[team_id] == fresh
+    asyncio.run(go())
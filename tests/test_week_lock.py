@@ -0,0 +1,166 @@
+# tests/test_week_lock.py
+"""Weekly lock: which intervals a week snapshots, reads that don't write, and re-snapshots after admin changes."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from backend.models import User, Player, Team, TeamPlayer, TeamWeekRoster, WeekLock
+from backend.services.leaderboard import refresh_team_leaderboard
+from backend.services.market import apply_transfers
+from backend.services.team_card import load_team_card
+from backend.services.repo import remove_user_steam_id
+from backend.services.week_lock import lock_week, week_is_locked, relock_teams, week_end_of
+from backend.services.leetify_api import week_bounds_naive_utc
+
+GUILD = 1
+
+
+def _keys(now):
+    """(this week, next week) keys as the market writes them."""
+    return week_bounds_naive_utc("Europe/London", now=now)
+
+
+# clocks go forward during this week; NEXT_WEEK is the key buys are queued at
+WEEK, NEXT_WEEK = _keys(datetime(2025, 3, 26, 12, tzinfo=timezone.utc))
+
+
+async def _team(Session, name, owner, intervals):
+    """Team owned by discord id `owner`; intervals are (discord id, from, to) for registered players."""
+    async with Session() as s, s.begin():
+        user = User(discord_id=owner, discord_guild_id=GUILD)
+        s.add(user)
+        await s.flush()
+        team = Team(owner_id=user.id, name=name, guild_id=GUILD)
+        s.add(team)
+        await s.flush()
+        for d, frm, to in intervals:
+            player = await s.scalar(select(Player).where(Player.handle == str(d)))
+            if player is None:
+                member = User(discord_id=d, discord_guild_id=GUILD, steam_id=f"steam{d}")
+                s.add(member)
+                await s.flush()
+                player = Player(user_id=member.id, handle=str(d), price=1000)
+                s.add(player)
+                await s.flush()
+            s.add(TeamPlayer(team_id=team.id, player_id=player.id, effective_from_week=frm, effective_to_week=to))
+        return team.id
+
+
+async def _snapshot(Session, week, team_id=None):
+    async with Session() as s:
+        stmt = (select(Player.handle).join(TeamWeekRoster, TeamWeekRoster.player_id == Player.id)
+                .where(TeamWeekRoster.week_start == week))
+        if team_id is not None:
+            stmt = stmt.where(TeamWeekRoster.team_id == team_id)
+        return sorted((await s.scalars(stmt)).all())
+
+
+def test_week_end_is_the_queued_transfer_key():
+    assert (WEEK, NEXT_WEEK) == (datetime(2025, 3, 24), datetime(2025, 3, 30, 22))
+    assert week_end_of(WEEK) == NEXT_WEEK
+    assert week_end_of(datetime(2025, 10, 19, 23)) == datetime(2025, 10, 26, 23)
+    assert week_end_of(datetime(2025, 10, 26, 23)) == datetime(2025, 11, 2, 23)   # a queued key is next week's
+
+
+def test_lock_takes_intervals_overlapping_the_week(db):
+    async def go():
+        await _team(db, "t", 100, [
+            (1, WEEK - timedelta(days=7), None),                    # running
+            (2, WEEK + timedelta(days=3), None),                    # started mid-week
+            (3, WEEK - timedelta(days=7), WEEK + timedelta(days=3)),  # ended mid-week
+            (4, WEEK - timedelta(days=7), WEEK),                    # ended as the week began
+            (5, NEXT_WEEK, None),                                   # next week's buy
+        ])
+        async with db() as s, s.begin():
+            assert await lock_week(s, WEEK) == 3
+            assert await lock_week(s, WEEK) == 0
+        assert await _snapshot(db, WEEK) == ["1", "2", "3"]
+
+    asyncio.run(go())
+
+
+@pytest.mark.parametrize("now", [datetime(2025, 3, 5, 12, tzinfo=timezone.utc),
+                                 datetime(2025, 3, 26, 12, tzinfo=timezone.utc),
+                                 datetime(2025, 10, 22, 12, tzinfo=timezone.utc)])
+def test_queued_buy_is_not_in_this_weeks_roster(db, now):
+    async def go():
+        this_week, next_week = _keys(now)
+        await _team(db, "t", 100, [(1, this_week - timedelta(days=7), None),
+                                   (2, this_week - timedelta(days=7), this_week)])     # player 2, sold earlier
+        async with db() as s, s.begin():
+            batch = await apply_transfers(s, guild_id=GUILD, owner_discord_id=100, sells=[1], buys=[2],
+                                          this_week=this_week, next_week=next_week)
+            assert batch.problem is None
+
+        async def card(week, locked):
+            async with db() as s:
+                c = await load_team_card(s, guild_id=GUILD, discord_id=100, week_start=week, locked=locked)
+                return sorted(p.handle for p in c.players)
+
+        assert await card(this_week, locked=False) == ["1"]
+        async with db() as s, s.begin():
+            await lock_week(s, this_week)
+        assert await _snapshot(db, this_week) == ["1"]
+        assert await card(this_week, locked=True) == ["1"]
+        assert await card(this_week + timedelta(days=7), locked=False) == ["2"]     # what /team show week=2 reads
+
+    asyncio.run(go())
+
+
+def test_reads_do_not_lock(db):
+    async def go():
+        this_week = week_bounds_naive_utc("Europe/London")[0]
+        await _team(db, "t", 100, [(1, this_week - timedelta(days=7), None)])
+        async with db() as s, s.begin():
+            assert not await week_is_locked(s, this_week)
+        async with db() as s:
+            assert await s.scalar(select(WeekLock.week_start)) is None
+
+        # scoring runs lock the week they rank (the weekly job didn't run), future weeks stay open
+        async with db() as s, s.begin():
+            assert await refresh_team_leaderboard(s, week_end_of(this_week)) == 0
+            assert await refresh_team_leaderboard(s, this_week) == 1
+        async with db() as s:
+            assert await week_is_locked(s, this_week)
+            assert not await week_is_locked(s, week_end_of(this_week))
+
+    asyncio.run(go())
+
+
+def test_relock_rebuilds_only_the_given_teams(db):
+    async def go():
+        a = await _team(db, "a", 100, [(1, WEEK, None), (2, WEEK, None)])
+        b = await _team(db, "b", 200, [(3, WEEK, None)])
+        async with db() as s, s.begin():
+            await lock_week(s, WEEK)
+            # an admin fix to both teams, only a is re-snapshotted
+            for row in (await s.scalars(select(TeamPlayer))).all():
+                if row.team_id == a and row.player_id == 2 or row.team_id == b:
+                    await s.delete(row)
+            await s.flush()
+            assert await relock_teams(s, WEEK, [a]) == 1
+        assert await _snapshot(db, WEEK, a) == ["1"]
+        assert await _snapshot(db, WEEK, b) == ["3"]
+        async with db() as s:
+            assert await s.scalar(select(WeekLock.rows).where(WeekLock.week_start == WEEK)) == 2
+            assert await relock_teams(s, NEXT_WEEK) == 0         # not locked, nothing to rebuild
+
+    asyncio.run(go())
+
+
+def test_removing_a_steam_id_drops_them_from_this_weeks_snapshot(db):
+    async def go():
+        this_week = week_bounds_naive_utc("Europe/London")[0]
+        team_id = await _team(db, "t", 100, [(1, this_week - timedelta(days=7), None),
+                                             (2, this_week - timedelta(days=7), None)])
+        async with db() as s, s.begin():
+            await lock_week(s, this_week)
+            await lock_week(s, this_week - timedelta(days=7))
+        async with db() as s, s.begin():
+            await remove_user_steam_id(s, 2, guild_id=GUILD)
+        assert await _snapshot(db, this_week, team_id) == ["1"]
+        assert await _snapshot(db, this_week - timedelta(days=7), team_id) == ["1", "2"]   # already scored
+
+    asyncio.run(go())